@@ -370,6 +370,7 @@ async def admin_stats_command(client: Client, message: Message, queue_manager=No
             "⚙️ **Quick Admin Actions:**\n"
             "• `/killall` - Cancel all downloads\n"
             "• `/broadcast` - Send message to all\n"
+            "• `/dbstats` - Database query stats\n"
             "• `/logs` - View bot logs"
         )
 
@@ -379,6 +380,67 @@ async def admin_stats_command(client: Client, message: Message, queue_manager=No
         await message.reply(f"❌ **Error getting stats: {str(e)}**")
         LOGGER(__name__).error(f"Error in admin_stats_command: {e}")
 
+@admin_only
+async def db_stats_command(client: Client, message: Message):
+    """Show database query latency statistics and slow queries
+
+    Usage:
+    - /dbstats - Per-command latency and recent slow queries
+    - /dbstats indexes - Explain known query shapes and report missing indexes
+    """
+    try:
+        if len(message.command) > 1 and message.command[1].lower() == "indexes":
+            reports = db.check_indexes()
+            index_text = "🗂 **INDEX REPORT**\n——————————————————————————\n\n"
+            for report in reports:
+                status = "❌ COLLSCAN" if report['missing_index'] else "✅"
+                if report.get('error'):
+                    status = "⚠️ error"
+                index_text += f"{status} `{report['collection']}` `{report['shape']}`\n"
+            missing = sum(1 for r in reports if r['missing_index'])
+            index_text += f"\n**Missing indexes:** `{missing}`"
+            if missing:
+                index_text += "\n💡 Run `python db_profiler.py --create` or set `DB_AUTO_CREATE_INDEXES=true`"
+            await message.reply(index_text)
+            return
+
+        stats = db.get_query_stats()
+        stats_text = (
+            "🗄 **DATABASE QUERY STATS**\n"
+            "——————————————————————————\n\n"
+        )
+
+        if not stats['commands']:
+            stats_text += "No queries recorded yet.\n"
+        for entry in stats['commands'][:10]:
+            stats_text += (
+                f"• `{entry['command']}` ×{entry['count']}\n"
+                f"   avg `{entry['avg_ms']}ms` | p95 ≤`{entry['p95_ms']:.0f}ms` | max `{entry['max_ms']}ms`\n"
+            )
+
+        slow_queries = stats['slow_queries'][:5]
+        stats_text += f"\n🐢 **Slow queries (≥{stats['slow_query_ms']}ms):** `{len(stats['slow_queries'])}`\n"
+        for entry in slow_queries:
+            stats_text += f"• [{entry['time']}] `{entry['command']}` `{entry['shape']}` {entry['duration_ms']}ms\n"
+
+        flights = stats['single_flight']
+        stats_text += f"\n🔀 **Coalesced cache misses:** `{flights['coalesced']}` (fetches: `{flights['calls']}`)\n"
+
+        file_cache = db.get_file_cache_stats()
+        stats_text += (
+            f"📦 **File cache:** `{file_cache['cached_files']}` files | hit rate `{file_cache['hit_rate']}` "
+            f"(`{file_cache['hits']}` hits, `{file_cache['misses']}` misses, `{file_cache['invalidations']}` invalidated)\n"
+        )
+        for entry in file_cache['top_files']:
+            stats_text += f"   • `{entry['chat_id']}/{entry['message_id']}` {entry['media_type']} ×{entry['hits']}\n"
+
+        stats_text += "\n💡 `/dbstats indexes` - Check for missing indexes"
+        await message.reply(stats_text)
+
+    except Exception as e:
+        await message.reply(f"❌ **Error getting database stats: {str(e)}**")
+        LOGGER(__name__).error(f"Error in db_stats_command: {e}")
+
 @register_user
 async def user_info_command(client: Client, message: Message):
     """Show user information"""
@@ -7,83 +7,246 @@ Especially important on Render's 512MB RAM limit
 """
 
 import os
+import sys
 import time
-from typing import Optional, Dict, Any
+import json
+import heapq
+import asyncio
+import itertools
+import threading
+from typing import Optional, Dict, Any, Iterable, Callable
+from datetime import datetime
 from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from logger import LOGGER
+from user_record import UserRecord
+
+
+class _Missing:
+    """Negative-cache marker: the key was looked up and does not exist"""
+    __slots__ = ()
+    
+    def __repr__(self):
+        return "MISSING"
+    
+    def __reduce__(self):
+        return "MISSING"
+
+
+# Cache this instead of None for lookups that found nothing (None means "not cached")
+MISSING = _Missing()
+
+# Background refreshes for stale-while-revalidate (created on first use)
+_refresh_executor: Optional[ThreadPoolExecutor] = None
+_refresh_lock = threading.Lock()
+# (cache, key) the current refresh thread is re-filling, so set() can drop a superseded fill
+_refresh_local = threading.local()
+
+
+def _get_refresh_executor() -> ThreadPoolExecutor:
+    global _refresh_executor
+    with _refresh_lock:
+        if _refresh_executor is None:
+            _refresh_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="cache-refresh")
+        return _refresh_executor
+
 
 class LRUCache:
     """Simple LRU cache with TTL (Time To Live) support"""
     
-    def __init__(self, max_size: int = 1000, default_ttl: int = 300):
+    def __init__(self, max_size: int = 1000, default_ttl: int = 300, log: bool = True, stale_ttl: int = 0):
         """
         Initialize cache
         
         Args:
             max_size: Maximum number of items to cache
             default_ttl: Default time-to-live in seconds (5 minutes)
+            log: Log the cache configuration
+            stale_ttl: Grace period after expiry during which get(key, refresh=...) still
+                serves the old value while refreshing it in the background (0 = off)
         """
         self.cache: OrderedDict = OrderedDict()
         self.max_size = max_size
         self.default_ttl = default_ttl
+        self.stale_ttl = stale_ttl
         self.hits = 0
         self.misses = 0
-        LOGGER(__name__).info(f"Cache initialized: max_size={max_size}, ttl={default_ttl}s")
+        self.stale_hits = 0
+        self.reclaimed = 0
+        # Keys with a background refresh running -> invalidations seen since it was scheduled
+        self._refreshing: Dict[Any, int] = {}
+        # Min-heap of (dead_at, seq, key) so expired entries can be reclaimed without a scan.
+        # Overwritten/deleted keys leave outdated records that are skipped when popped
+        self._expiry_heap: list = []
+        self._expiry_seq = itertools.count()
+        # The cache is shared by the event loop, Flask workers and to_thread() helpers
+        self._lock = threading.RLock()
+        if log:
+            LOGGER(__name__).info(f"Cache initialized: max_size={max_size}, ttl={default_ttl}s")
     
     def _is_expired(self, entry: Dict[str, Any]) -> bool:
         """Check if cache entry is expired"""
         return time.time() > entry['expires_at']
     
-    def get(self, key: str) -> Optional[Any]:
-        """Get value from cache"""
-        if key in self.cache:
-            entry = self.cache[key]
-            
-            # Check if expired
-            if self._is_expired(entry):
-                del self.cache[key]
-                self.misses += 1
-                return None
-            
-            # Move to end (most recently used)
-            self.cache.move_to_end(key)
-            self.hits += 1
-            return entry['value']
+    def get(self, key: str, refresh: Optional[Callable[[], Any]] = None) -> Optional[Any]:
+        """Get value from cache
         
-        self.misses += 1
-        return None
+        Args:
+            key: Cache key
+            refresh: Loader that re-fills this key. If given and the entry expired less
+                than stale_ttl seconds ago, the stale value is returned immediately and
+                refresh() runs in the background (stale-while-revalidate)
+        """
+        with self._lock:
+            if key in self.cache:
+                entry = self.cache[key]
+                
+                # Check if expired
+                if self._is_expired(entry):
+                    if refresh is not None and time.time() < entry['expires_at'] + self.stale_ttl:
+                        self.cache.move_to_end(key)
+                        self.stale_hits += 1
+                        self._schedule_refresh(key, refresh)
+                        return entry['value']
+                    self._remove(key)
+                    self.misses += 1
+                    return None
+                
+                # Move to end (most recently used)
+                self.cache.move_to_end(key)
+                self.hits += 1
+                return entry['value']
+            
+            self.misses += 1
+            return None
     
     def set(self, key: str, value: Any, ttl: Optional[int] = None):
         """Set value in cache with optional custom TTL"""
         if ttl is None:
             ttl = self.default_ttl
         
-        # Remove oldest if at capacity
-        if len(self.cache) >= self.max_size and key not in self.cache:
-            self.cache.popitem(last=False)
+        with self._lock:
+            if self._refresh_superseded(key):
+                return
+            
+            # Remove oldest if at capacity
+            if len(self.cache) >= self.max_size and key not in self.cache:
+                self._remove(next(iter(self.cache)))
+            
+            self.cache[key] = {
+                'value': value,
+                'expires_at': time.time() + ttl
+            }
+            self.cache.move_to_end(key)
+            self._track_expiry(key, self.cache[key])
+    
+    def _track_expiry(self, key: str, entry: Dict[str, Any]):
+        """Schedule an entry for the expiry sweeper (caller holds the lock)"""
+        heapq.heappush(self._expiry_heap, (entry['expires_at'] + self.stale_ttl, next(self._expiry_seq), key))
+        # Rebuild when outdated records dominate (many overwrites of long-TTL keys)
+        if len(self._expiry_heap) > 4 * len(self.cache) + 1024:
+            self._expiry_heap = [
+                (e['expires_at'] + self.stale_ttl, next(self._expiry_seq), k) for k, e in self.cache.items()
+            ]
+            heapq.heapify(self._expiry_heap)
+    
+    def sweep_expired(self, max_items: int = 200) -> int:
+        """Reclaim entries that are past expiry (and past the stale grace period)
+        
+        Args:
+            max_items: Maximum heap records to process in this slice
         
-        self.cache[key] = {
-            'value': value,
-            'expires_at': time.time() + ttl
-        }
-        self.cache.move_to_end(key)
+        Returns:
+            int: Number of entries removed
+        """
+        now = time.time()
+        removed = 0
+        processed = 0
+        with self._lock:
+            heap = self._expiry_heap
+            while heap and processed < max_items and heap[0][0] <= now:
+                processed += 1
+                _, _, key = heapq.heappop(heap)
+                entry = self.cache.get(key)
+                # Skip records of keys that were deleted or re-set with a later expiry
+                if entry is not None and entry['expires_at'] + self.stale_ttl <= now:
+                    self._remove(key)
+                    removed += 1
+            self.reclaimed += removed
+        return removed
+    
+    def has_expired_entries(self) -> bool:
+        """Check if the sweeper has work due"""
+        with self._lock:
+            return bool(self._expiry_heap) and self._expiry_heap[0][0] <= time.time()
+    
+    def _schedule_refresh(self, key: str, refresh: Callable[[], Any]):
+        """Run refresh() in the background unless one is already running for key"""
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing[key] = 0
+        
+        def run():
+            _refresh_local.target = (self, key)
+            try:
+                refresh()
+            except Exception as e:
+                LOGGER(__name__).error(f"Background cache refresh failed for {key}: {e}")
+            finally:
+                _refresh_local.target = None
+                with self._lock:
+                    self._refreshing.pop(key, None)
+        
+        _get_refresh_executor().submit(run)
+    
+    def _refresh_superseded(self, key: str) -> bool:
+        """Check if this set() is a background refresh of key that an invalidation overtook
+        
+        The refresh may have read the old value before the invalidation; storing
+        it would undo the invalidation. Caller holds the lock.
+        """
+        target = getattr(_refresh_local, 'target', None)
+        return target is not None and target[0] is self and target[1] == key and self._refreshing.get(key, 0) > 0
+    
+    def _invalidate_refreshes(self, keys: Optional[Iterable[Any]] = None):
+        """Mark running refreshes of keys (all if None) as superseded (caller holds the lock)"""
+        for key in (list(self._refreshing) if keys is None else keys):
+            if key in self._refreshing:
+                self._refreshing[key] += 1
+    
+    def _remove(self, key: str):
+        """Drop a key that is known to be in the cache (caller holds the lock)"""
+        del self.cache[key]
     
     def delete(self, key: str):
         """Remove specific key from cache"""
-        if key in self.cache:
-            del self.cache[key]
+        with self._lock:
+            self._invalidate_refreshes([key])
+            if key in self.cache:
+                self._remove(key)
     
     def clear_pattern(self, pattern: str):
         """Clear all keys matching pattern (e.g., 'user_123_*')"""
-        keys_to_delete = [k for k in self.cache.keys() if pattern in k]
-        for key in keys_to_delete:
-            del self.cache[key]
+        with self._lock:
+            self._invalidate_refreshes([k for k in self._refreshing if pattern in k])
+            keys_to_delete = [k for k in self.cache.keys() if pattern in k]
+            for key in keys_to_delete:
+                self._remove(key)
     
     def clear(self):
         """Clear entire cache"""
-        self.cache.clear()
-        self.hits = 0
-        self.misses = 0
+        with self._lock:
+            self._invalidate_refreshes()
+            self.cache.clear()
+            self._expiry_heap.clear()
+            self.hits = 0
+            self.misses = 0
+    
+    def items(self) -> list:
+        """Snapshot of (key, entry) pairs, safe to iterate while other threads write"""
+        with self._lock:
+            return list(self.cache.items())
     
     def get_stats(self) -> Dict[str, Any]:
         """Get cache statistics"""
@@ -94,10 +257,430 @@ class LRUCache:
             'max_size': self.max_size,
             'hits': self.hits,
             'misses': self.misses,
+            'stale_hits': self.stale_hits,
+            'reclaimed': self.reclaimed,
             'hit_rate': f"{hit_rate:.1f}%"
         }
 
 
+def _snapshot_default(value: Any) -> Any:
+    """json.dumps hook for the cached value types that aren't plain JSON"""
+    if value is MISSING:
+        return {'__missing__': True}
+    if isinstance(value, datetime):
+        return {'__datetime__': value.isoformat()}
+    if isinstance(value, UserRecord):
+        # subscription_end_at is re-parsed from subscription_end on load
+        return {'__user_record__': {slot: getattr(value, slot) for slot in UserRecord.__slots__
+                                    if slot != 'subscription_end_at'}}
+    raise TypeError(f"Can't snapshot {type(value).__name__}")
+
+
+def _snapshot_object_hook(obj: Dict[str, Any]) -> Any:
+    """json.loads hook reversing _snapshot_default"""
+    if '__missing__' in obj:
+        return MISSING
+    if '__datetime__' in obj:
+        return datetime.fromisoformat(obj['__datetime__'])
+    if '__user_record__' in obj:
+        return UserRecord(**obj['__user_record__'])
+    return obj
+
+
+def estimate_size(value: Any) -> int:
+    """Approximate memory footprint of a cached value in bytes (containers are walked)"""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(estimate_size(v) for v in value)
+    elif hasattr(type(value), '__slots__'):
+        size += sum(estimate_size(getattr(value, slot, None)) for slot in type(value).__slots__)
+    return size
+
+
+class WeightedLRUCache(LRUCache):
+    """LRU cache bounded by the estimated byte size of its entries
+    
+    A cached user document with a long session string costs far more than a
+    cached boolean, so evicting by a byte budget lets many small entries fit
+    where a count limit would have to assume the worst case.
+    """
+    
+    # Per-entry bookkeeping (entry dict, key, OrderedDict slot) on top of the value
+    ENTRY_OVERHEAD = 250
+    
+    def __init__(self, max_bytes: int = 1024 * 1024, max_size: int = 10000, default_ttl: int = 300,
+                 log: bool = True, stale_ttl: int = 0):
+        """
+        Initialize cache
+        
+        Args:
+            max_bytes: Total estimated size budget for all entries
+            max_size: Hard cap on the number of items (safety net)
+            default_ttl: Default time-to-live in seconds (5 minutes)
+            log: Log the cache configuration
+            stale_ttl: Stale-while-revalidate grace period (see LRUCache)
+        """
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        super().__init__(max_size=max_size, default_ttl=default_ttl, log=log, stale_ttl=stale_ttl)
+        if log:
+            LOGGER(__name__).info(f"Cache byte budget: {max_bytes // 1024}KB")
+    
+    def set(self, key: str, value: Any, ttl: Optional[int] = None):
+        """Set value in cache with optional custom TTL, evicting LRU entries over budget"""
+        if ttl is None:
+            ttl = self.default_ttl
+        
+        size = estimate_size(key) + estimate_size(value) + self.ENTRY_OVERHEAD
+        if size > self.max_bytes:
+            # Never let one value flush the whole cache
+            self.delete(key)
+            return
+        
+        with self._lock:
+            if self._refresh_superseded(key):
+                return
+            if key in self.cache:
+                self._remove(key)
+            
+            while self.cache and (self.total_bytes + size > self.max_bytes or len(self.cache) >= self.max_size):
+                self._remove(next(iter(self.cache)))
+            
+            self.cache[key] = {
+                'value': value,
+                'expires_at': time.time() + ttl,
+                'size': size
+            }
+            self.total_bytes += size
+            self._track_expiry(key, self.cache[key])
+    
+    def _remove(self, key: str):
+        """Drop a key that is known to be in the cache (caller holds the lock)"""
+        self.total_bytes -= self.cache.pop(key)['size']
+    
+    def clear(self):
+        """Clear entire cache"""
+        with self._lock:
+            super().clear()
+            self.total_bytes = 0
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get cache statistics"""
+        stats = super().get_stats()
+        stats['bytes'] = self.total_bytes
+        stats['max_bytes'] = self.max_bytes
+        return stats
+
+
+class NamespacedCache:
+    """Cache split into named regions, each a WeightedLRUCache with its own TTL and byte cap
+    
+    Keys live in their region (e.g. namespace 'admin', key 123) instead of being
+    built as 'admin_123' strings in one shared dict, so a whole region can be
+    dropped at once and a user's entries are found with one lookup per region.
+    """
+    
+    def __init__(self, max_bytes: int = 1024 * 1024, max_size: int = 10000, default_ttl: int = 300):
+        """
+        Initialize cache
+        
+        Args:
+            max_bytes: Total byte budget, shared out to namespaces that don't set their own
+            max_size: Item cap per namespace
+            default_ttl: TTL for namespaces that don't set their own
+        """
+        self.max_bytes = max_bytes
+        self.max_size = max_size
+        self.default_ttl = default_ttl
+        self.namespaces: Dict[str, WeightedLRUCache] = {}
+        self._register_lock = threading.Lock()
+        self.bus = None
+        LOGGER(__name__).info(f"Namespaced cache initialized: {max_bytes // 1024}KB, ttl={default_ttl}s")
+    
+    def register(self, namespace: str, ttl: Optional[int] = None, share: float = 0.1,
+                 stale_ttl: int = 0) -> WeightedLRUCache:
+        """Create (or return) a namespace
+        
+        Args:
+            namespace: Region name
+            ttl: Default TTL for the region (cache default if None)
+            share: Fraction of the total byte budget the region may use
+            stale_ttl: Stale-while-revalidate grace period for the region (0 = off)
+        """
+        region = self.namespaces.get(namespace)
+        if region is None:
+            with self._register_lock:
+                region = self.namespaces.get(namespace)
+                if region is None:
+                    region = WeightedLRUCache(
+                        max_bytes=int(self.max_bytes * share),
+                        max_size=self.max_size,
+                        default_ttl=ttl if ttl is not None else self.default_ttl,
+                        log=False,
+                        stale_ttl=stale_ttl
+                    )
+                    self.namespaces[namespace] = region
+        return region
+    
+    def get(self, namespace: str, key: Any, refresh: Optional[Callable[[], Any]] = None) -> Optional[Any]:
+        """Get value from a namespace (refresh enables stale-while-revalidate, see LRUCache.get)"""
+        return self.register(namespace).get(key, refresh)
+    
+    def set(self, namespace: str, key: Any, value: Any, ttl: Optional[int] = None):
+        """Set value in a namespace (namespace TTL if ttl is None)"""
+        self.register(namespace).set(key, value, ttl)
+    
+    def attach_bus(self, bus):
+        """Broadcast invalidations over a cache_bus.InvalidationBus and apply other processes' ones
+        
+        The bus is only used once it has started; if start() raises, the cache stays local.
+        """
+        bus.start(self._apply_remote)
+        self.bus = bus
+    
+    def _publish(self, message: Dict[str, Any]):
+        if self.bus is not None:
+            self.bus.publish(message)
+    
+    def _apply_remote(self, message: Dict[str, Any]):
+        """Apply an invalidation received from another process (not re-broadcast)"""
+        if message.get('op') == 'namespace':
+            for namespace in message['namespaces']:
+                self._drop_namespace(namespace)
+        elif message.get('op') == 'key':
+            for namespace in message['namespaces'] or list(self.namespaces):
+                self._drop(namespace, message['key'])
+    
+    def _drop(self, namespace: str, key: Any):
+        region = self.namespaces.get(namespace)
+        if region is not None:
+            region.delete(key)
+    
+    def _drop_namespace(self, namespace: str):
+        region = self.namespaces.get(namespace)
+        if region is not None:
+            with region._lock:
+                region._invalidate_refreshes()
+                region.cache = OrderedDict()
+                region.total_bytes = 0
+                region._expiry_heap = []
+    
+    def delete(self, namespace: str, key: Any):
+        """Remove a key from a namespace"""
+        self._drop(namespace, key)
+        self._publish({'op': 'key', 'namespaces': [namespace], 'key': key})
+    
+    def invalidate_namespace(self, namespace: str):
+        """Drop every entry of a namespace (no key scan, statistics are kept)"""
+        self._drop_namespace(namespace)
+        self._publish({'op': 'namespace', 'namespaces': [namespace]})
+    
+    def invalidate_key(self, key: Any, namespaces: Optional[Iterable[str]] = None):
+        """Remove a key (e.g. a user ID) from several namespaces - one lookup per namespace
+        
+        Args:
+            key: Key to remove
+            namespaces: Namespaces to search (all if None)
+        """
+        namespaces = list(namespaces) if namespaces is not None else None
+        for namespace in (namespaces if namespaces is not None else list(self.namespaces)):
+            self._drop(namespace, key)
+        self._publish({'op': 'key', 'namespaces': namespaces, 'key': key})
+    
+    SNAPSHOT_VERSION = 2
+    
+    def save_snapshot(self, path: str, namespaces: Iterable[str]) -> int:
+        """Write unexpired entries of the given namespaces to a local JSON file
+        
+        Only pass namespaces without sensitive data - the file is not encrypted.
+        Values may be JSON types, datetimes, UserRecords or MISSING.
+        
+        Returns:
+            int: Number of entries written
+        """
+        now = time.time()
+        data = {}
+        count = 0
+        for namespace in namespaces:
+            region = self.namespaces.get(namespace)
+            if region is None:
+                continue
+            entries = [(key, entry['value'], entry['expires_at'])
+                       for key, entry in region.items() if entry['expires_at'] > now]
+            data[namespace] = entries
+            count += len(entries)
+        
+        # Entries are [key, value, expires_at] lists so integer keys survive the round trip
+        payload = json.dumps(
+            {'version': self.SNAPSHOT_VERSION, 'saved_at': now, 'namespaces': data},
+            default=_snapshot_default, separators=(',', ':')
+        ).encode()
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+        LOGGER(__name__).info(f"Cache snapshot saved: {count} entries, {len(payload) // 1024}KB -> {path}")
+        return count
+    
+    def load_snapshot(self, path: str, max_ttl: int = 60) -> int:
+        """Reload a snapshot written by save_snapshot()
+        
+        Entries keep their original expiry but live at most max_ttl seconds from now,
+        so writes missed while the process was down can't linger. Expired entries
+        and namespaces that aren't registered are skipped. A corrupt or outdated
+        snapshot is logged and ignored - the cache just starts cold.
+        
+        Returns:
+            int: Number of entries loaded
+        """
+        if not os.path.exists(path):
+            return 0
+        try:
+            with open(path, 'rb') as f:
+                snapshot = json.loads(f.read(), object_hook=_snapshot_object_hook)
+            if snapshot.get('version') != self.SNAPSHOT_VERSION:
+                return 0
+            
+            now = time.time()
+            restored = []
+            for namespace, entries in snapshot['namespaces'].items():
+                region = self.namespaces.get(namespace)
+                if region is None:
+                    continue
+                for key, value, expires_at in entries:
+                    remaining = expires_at - now
+                    if remaining > 0:
+                        restored.append((region, key, value, min(remaining, max_ttl)))
+        except Exception as e:
+            LOGGER(__name__).warning(f"Ignoring unreadable cache snapshot {path}: {e}")
+            return 0
+        
+        # Only fill the cache once the whole file has parsed
+        for region, key, value, ttl in restored:
+            region.set(key, value, ttl=ttl)
+        count = len(restored)
+        
+        LOGGER(__name__).info(f"Cache snapshot loaded: {count} entries from {path}")
+        return count
+    
+    async def periodic_sweep(self, interval: int = 30, slice_items: int = 200):
+        """Reclaim expired entries on the event loop
+        
+        Every interval seconds, each namespace is swept in slices of at most
+        slice_items entries, yielding to the loop between slices so a large
+        backlog never blocks update handling.
+        """
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                reclaimed = 0
+                for region in list(self.namespaces.values()):
+                    while region.has_expired_entries():
+                        reclaimed += region.sweep_expired(slice_items)
+                        await asyncio.sleep(0)
+                if reclaimed:
+                    LOGGER(__name__).debug(f"Cache sweeper reclaimed {reclaimed} expired entries")
+            except Exception as e:
+                LOGGER(__name__).error(f"Cache sweeper error: {e}")
+    
+    def clear(self):
+        """Clear every namespace"""
+        for region in self.namespaces.values():
+            region.clear()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get cache statistics (totals plus one entry per namespace)"""
+        namespaces = {name: region.get_stats() for name, region in self.namespaces.items()}
+        hits = sum(stats['hits'] for stats in namespaces.values())
+        stale_hits = sum(stats['stale_hits'] for stats in namespaces.values())
+        reclaimed = sum(stats['reclaimed'] for stats in namespaces.values())
+        misses = sum(stats['misses'] for stats in namespaces.values())
+        total = hits + misses
+        return {
+            'size': sum(stats['size'] for stats in namespaces.values()),
+            'bytes': sum(stats['bytes'] for stats in namespaces.values()),
+            'max_bytes': self.max_bytes,
+            'hits': hits,
+            'misses': misses,
+            'stale_hits': stale_hits,
+            'reclaimed': reclaimed,
+            'bus': self.bus.get_stats() if self.bus is not None else None,
+            'hit_rate': f"{(hits / total * 100) if total > 0 else 0:.1f}%",
+            'namespaces': namespaces
+        }
+
+
+class SingleFlight:
+    """Coalesce concurrent cache-miss fetches for the same key into one call
+    
+    The first caller for a key runs the fetch; callers that arrive while it
+    is in flight block until it finishes and share its result (or exception).
+    Works across threads - the database layer is synchronous and is called
+    from the event loop, Flask workers and to_thread() helpers alike.
+    
+    Thread-level coalescing is enough for the event loop too. Handlers call
+    the DB synchronously, so two loop-thread callers never overlap: a
+    loop-thread caller only ever joins a fetch led by another thread, and
+    blocks for at most the rest of that one fetch - no longer than running
+    the fetch itself, which it would otherwise do on the loop anyway. fn()
+    never needs the loop, so a loop-thread wait can't deadlock. Code that
+    must not block the loop already wraps the DB call in to_thread().
+    """
+    
+    class _Call:
+        __slots__ = ('event', 'result', 'error')
+        
+        def __init__(self):
+            self.event = threading.Event()
+            self.result = None
+            self.error = None
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Any, 'SingleFlight._Call'] = {}
+        self.calls = 0
+        self.coalesced = 0
+    
+    def do(self, key: Any, fn: Callable[[], Any]) -> Any:
+        """Run fn() for key unless a call for key is already in flight, then share its result"""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                call = self._calls[key] = self._Call()
+                self.calls += 1
+                leader = True
+        
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+    
+    def get_stats(self) -> Dict[str, int]:
+        """Get number of fetches run and callers that joined one already in flight"""
+        return {
+            'calls': self.calls,
+            'coalesced': self.coalesced,
+            'in_flight': len(self._calls)
+        }
+
+
 # Global cache instance
 # Using smaller cache for Render's 512MB RAM
 # Detect constrained environments (Render, Replit) and reduce cache size
@@ -108,12 +691,14 @@ IS_CONSTRAINED = bool(
     os.getenv('REPL_ID')
 )
 
-# ULTRA-aggressive cache reduction for Render's 512MB RAM
-# Each cache entry can be 1-10KB, so 50 items = ~50-500KB max
-CACHE_SIZE = 50 if IS_CONSTRAINED else 500
-_cache = LRUCache(max_size=CACHE_SIZE, default_ttl=120)  # Shorter TTL (2 min) to free memory faster
+# Bounded by bytes instead of item count: 512KB on Render's 512MB RAM holds thousands
+# of small entries (is_admin/is_banned flags, projected user views) but only a
+# few hundred full user documents
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(512 * 1024 if IS_CONSTRAINED else 4 * 1024 * 1024)))
+CACHE_SIZE = 5000 if IS_CONSTRAINED else 50000
+_cache = NamespacedCache(max_bytes=CACHE_MAX_BYTES, max_size=CACHE_SIZE, default_ttl=120)  # Shorter TTL (2 min) to free memory faster
 
 
-def get_cache() -> LRUCache:
+def get_cache() -> NamespacedCache:
     """Get global cache instance"""
     return _cache
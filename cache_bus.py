@@ -0,0 +1,201 @@
+# Copyright (C) @Wolfy004
+# Channel: https://t.me/Wolfy004
+
+"""
+Cross-process cache invalidation
+When the Flask verifier and bot workers run as separate processes, each one
+has its own in-memory cache. Invalidations are broadcast over a bus so a
+write in one process drops the stale entries in the others.
+
+Backends (CACHE_INVALIDATION_BUS):
+- "" / "none" (default): single process, nothing is broadcast
+- "local": in-process stand-in that delivers between bus instances (testing)
+- "mongodb": capped collection tailed by a background thread
+"""
+
+import os
+import abc
+import uuid
+import socket
+import threading
+from typing import Callable, Dict, Any, List, Optional
+from logger import LOGGER
+
+# Identifies this process so it ignores its own messages
+ORIGIN_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class InvalidationBus(abc.ABC):
+    """Base bus: publish invalidation messages and deliver other origins' messages to a handler"""
+
+    def __init__(self, origin: str = ORIGIN_ID):
+        self.origin = origin
+        self.handler: Optional[Callable[[Dict[str, Any]], None]] = None
+        self.published = 0
+        self.received = 0
+
+    def start(self, handler: Callable[[Dict[str, Any]], None]):
+        """Start delivering messages from other origins to handler"""
+        self.handler = handler
+
+    def stop(self):
+        """Stop delivering messages"""
+        self.handler = None
+
+    @abc.abstractmethod
+    def publish(self, message: Dict[str, Any]):
+        """Broadcast a message ({'op': ..., 'namespaces': [...], 'key': ...})"""
+
+    def _deliver(self, message: Dict[str, Any]):
+        if message.get('origin') == self.origin or self.handler is None:
+            return
+        self.received += 1
+        try:
+            self.handler(message)
+        except Exception as e:
+            LOGGER(__name__).error(f"Error applying cache invalidation {message}: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'backend': type(self).__name__,
+            'origin': self.origin,
+            'published': self.published,
+            'received': self.received
+        }
+
+
+class LocalBus(InvalidationBus):
+    """In-process stand-in: every LocalBus on the same channel receives every other one's messages"""
+
+    _channels: Dict[str, List['LocalBus']] = {}
+    _lock = threading.Lock()
+
+    def __init__(self, channel: str = "default", origin: Optional[str] = None):
+        # Each instance plays a separate process, so it gets its own origin by default
+        super().__init__(origin or uuid.uuid4().hex)
+        self.channel = channel
+
+    def start(self, handler: Callable[[Dict[str, Any]], None]):
+        super().start(handler)
+        with self._lock:
+            self._channels.setdefault(self.channel, []).append(self)
+
+    def stop(self):
+        with self._lock:
+            members = self._channels.get(self.channel, [])
+            if self in members:
+                members.remove(self)
+        super().stop()
+
+    def publish(self, message: Dict[str, Any]):
+        message = dict(message, origin=self.origin)
+        self.published += 1
+        with self._lock:
+            members = list(self._channels.get(self.channel, []))
+        for bus in members:
+            bus._deliver(message)
+
+
+class MongoCappedBus(InvalidationBus):
+    """Broadcast through a capped collection, tailed with a TAILABLE_AWAIT cursor
+
+    Delivery is best effort (a reconnect may skip messages); cache TTLs still
+    bound how long a missed invalidation can leave an entry stale.
+    
+    The tailing cursor keeps one connection of the database's client busy for
+    as long as the bus runs, so give the bus a client of its own (see
+    DatabaseManager._create_bus_client) rather than the query pool's.
+    """
+
+    def __init__(self, database, collection: str = "cache_invalidations", size_bytes: int = 1024 * 1024):
+        """
+        Args:
+            database: pymongo Database instance
+            collection: Capped collection name (created if missing)
+            size_bytes: Capped collection size
+        """
+        super().__init__()
+        self.database = database
+        self.collection_name = collection
+        self.size_bytes = size_bytes
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.collection = None
+        self._last_id = None
+
+    def _ensure_collection(self):
+        from pymongo.errors import CollectionInvalid
+        if self.collection_name not in self.database.list_collection_names():
+            try:
+                self.database.create_collection(self.collection_name, capped=True, size=self.size_bytes)
+            except CollectionInvalid:
+                pass  # Created by another process in the meantime
+        collection = self.database[self.collection_name]
+        # A tailable cursor on an empty capped collection dies at once - seed it
+        last = collection.find_one(sort=[("$natural", -1)])
+        if last is None:
+            collection.insert_one({'op': 'init', 'origin': self.origin})
+            last = collection.find_one(sort=[("$natural", -1)])
+        return collection, last['_id']
+
+    def start(self, handler: Callable[[Dict[str, Any]], None]):
+        self.collection, self._last_id = self._ensure_collection()
+        super().start(handler)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._listen, name="cache-bus", daemon=True)
+        self._thread.start()
+        LOGGER(__name__).info(f"Cache invalidation bus listening on {self.collection_name} (origin {self.origin})")
+
+    def stop(self):
+        self._stop.set()
+        super().stop()
+
+    def _listen(self):
+        from pymongo import CursorType
+        while not self._stop.is_set():
+            try:
+                cursor = self.collection.find(
+                    {"_id": {"$gt": self._last_id}},
+                    cursor_type=CursorType.TAILABLE_AWAIT
+                ).max_await_time_ms(1000)
+                while cursor.alive and not self._stop.is_set():
+                    for message in cursor:
+                        self._last_id = message['_id']
+                        if message.get('op') != 'init':
+                            self._deliver(message)
+            except Exception as e:
+                LOGGER(__name__).error(f"Cache invalidation bus error: {e}")
+                self._stop.wait(5)
+
+    def publish(self, message: Dict[str, Any]):
+        if self.collection is None:
+            return  # Not started
+        try:
+            self.collection.insert_one(dict(message, origin=self.origin))
+            self.published += 1
+        except Exception as e:
+            LOGGER(__name__).error(f"Error publishing cache invalidation: {e}")
+
+
+def create_bus(backend: str, database=None) -> Optional[InvalidationBus]:
+    """Create the bus selected by CACHE_INVALIDATION_BUS
+
+    Args:
+        backend: "", "none", "local" or "mongodb"
+        database: pymongo Database (required for "mongodb")
+
+    Returns:
+        InvalidationBus or None if disabled
+    """
+    backend = (backend or "").lower()
+    if backend in ("", "none"):
+        return None
+    if backend == "local":
+        return LocalBus()
+    if backend == "mongodb":
+        if database is None:
+            LOGGER(__name__).warning("MongoDB cache invalidation bus needs a database, bus disabled")
+            return None
+        return MongoCappedBus(database)
+    LOGGER(__name__).warning(f"Unknown cache invalidation bus '{backend}', bus disabled")
+    return None
@@ -2,70 +2,273 @@
 # Channel: https://t.me/Wolfy004
 
 import os
+import time
+import asyncio
+import threading
 from datetime import datetime, timedelta
 from typing import Optional, List, Dict
 from pymongo import MongoClient
 from pymongo.errors import ConnectionFailure, OperationFailure
 from logger import LOGGER
-from cache import get_cache
+from cache import get_cache, SingleFlight, MISSING
+from cache_bus import create_bus
+from user_record import UserRecord
+from db_profiler import query_profiler, IndexAdvisor
+
+# Cache namespaces: (TTL seconds, share of the cache byte budget, stale-while-revalidate grace)
+# Quota counters are never served stale; writes invalidate every namespace they touch
+CACHE_NAMESPACES = {
+    'user': (180, 0.25, 60),
+    'user_role': (180, 0.10, 60),
+    'user_quota': (180, 0.10, 0),
+    'user_session': (180, 0.25, 60),
+    'user_thumb': (180, 0.05, 60),
+    'admin': (300, 0.10, 60),
+    'banned': (300, 0.10, 60),
+}
+
+# Namespaces written to the warm-restart snapshot (never full documents or session strings;
+# quota counters change too often to be worth restoring)
+SNAPSHOT_NAMESPACES = ['user_role', 'user_thumb', 'admin', 'banned']
+
+# Save the snapshot well inside the shortest snapshotted TTL, so a killed process
+# leaves entries that are still worth restoring
+SNAPSHOT_INTERVAL = min(CACHE_NAMESPACES[ns][0] for ns in SNAPSHOT_NAMESPACES) // 2
+
+# How long a "user doesn't exist" lookup is cached
+NEGATIVE_CACHE_TTL = 30
+
+# After a failed connect, calls fail fast for this long (doubling per failure, capped)
+CONNECT_RETRY_BACKOFF = 5
+CONNECT_RETRY_BACKOFF_MAX = 60
+
+# Projected views of a user document: hot paths fetch and cache only the fields they read
+# instead of the whole document (session strings and other fields grow over time)
+USER_PROJECTIONS = {
+    'role': ("user_type", "subscription_end", "premium_source"),
+    'quota': ("ad_downloads", "ad_downloads_reset_date", "shortener_index"),
+    'session': ("session_string",),
+    'thumb': ("custom_thumbnail",),
+}
+
+
+USER_NAMESPACES = ['user'] + [f"user_{view}" for view in USER_PROJECTIONS]
 
 class DatabaseManager:
-    def __init__(self, connection_string: Optional[str] = None):
-        if not connection_string:
+    """User, quota and ad-session storage
+
+    Backends (DATABASE_BACKEND):
+    - "mongodb" (default): MongoDB/Atlas via MONGODB_URI
+    - "sqlite": embedded SQLite file (SQLITE_PATH, default bot.db) for single-node
+      deployments and offline benchmarking - see sqlite_backend.py
+    Both expose the same pymongo-style collection API used below.
+    """
+
+    def __init__(self, connection_string: Optional[str] = None, backend: Optional[str] = None):
+        self.backend = (backend or os.getenv("DATABASE_BACKEND", "mongodb")).lower()
+        
+        if self.backend == "sqlite":
+            connection_string = connection_string or os.getenv("SQLITE_PATH", "bot.db")
+        elif not connection_string:
             connection_string = os.getenv("MONGODB_URI", "")
         
         if not connection_string:
             raise ValueError("MongoDB connection string is required. Set MONGODB_URI environment variable.")
         
-        try:
-            # Optimized connection settings for Render/Replit
-            # Detect constrained environments
-            IS_CONSTRAINED = bool(
-                os.getenv('RENDER') or 
-                os.getenv('RENDER_EXTERNAL_URL') or 
-                os.getenv('REPLIT_DEPLOYMENT') or 
-                os.getenv('REPL_ID')
-            )
-            
-            # ULTRA-aggressive pool reduction for Render's 512MB (saves ~50-60MB)
-            # 2 connections is enough for light concurrent usage
-            pool_size = 2 if IS_CONSTRAINED else 10
-            
-            self.client = MongoClient(
-                connection_string,
-                maxPoolSize=pool_size,  # 3 for Render, 10 for VPS
-                minPoolSize=1,
-                maxIdleTimeMS=30000,  # Close idle connections faster (30s vs 45s)
-                serverSelectionTimeoutMS=5000,  # Faster timeout
-                connectTimeoutMS=10000,
-                socketTimeoutMS=10000,
-                retryWrites=True,
-                w='majority'
-            )
-            self.client.admin.command('ping')
-            LOGGER(__name__).info("Successfully connected to MongoDB!")
-            
-            self.db = self.client.get_database("telegram_bot")
-            self.cache = get_cache()
+        # Connection is opened lazily on first use so importing this module
+        # (and starting the bot) never waits on the database
+        self._connection_string = connection_string
+        self._client = None
+        self._db = None
+        self._connect_lock = threading.Lock()
+        self._connect_failures = 0
+        self._connect_retry_at = 0.0
+        self.cache = get_cache()
+        for namespace, (ttl, share, stale_ttl) in CACHE_NAMESPACES.items():
+            self.cache.register(namespace, ttl=ttl, share=share, stale_ttl=stale_ttl)
+        # Concurrent misses for the same key share one find_one
+        self._flights = SingleFlight()
+        # File cache counters since start (per-entry hit counts are stored in file_cache)
+        self.file_cache_stats = {'hits': 0, 'misses': 0, 'stores': 0, 'invalidations': 0}
+        
+        # Warm restart: reload the cache saved at the last shutdown (empty path disables).
+        # Relative paths are resolved against the app directory, not the working directory
+        self.snapshot_path = os.getenv("CACHE_SNAPSHOT_PATH", "cache_snapshot.json")
+        if self.snapshot_path:
+            self.snapshot_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), self.snapshot_path)
+            self.cache.load_snapshot(self.snapshot_path)
+
+    def connect(self):
+        """Connect to the database if not connected yet (thread-safe)
+        
+        Index creation runs in a background thread after the first connect. After a
+        failure, calls within the retry backoff raise ConnectionFailure at once
+        instead of each waiting out the server selection timeout again.
+        
+        Returns:
+            Database: pymongo-style database handle
+        """
+        if self._db is not None:
+            return self._db
+        
+        with self._connect_lock:
+            if self._db is not None:
+                return self._db
             
-            self.users = self.db['users']
-            self.daily_usage = self.db['daily_usage']
-            self.admins = self.db['admins']
-            self.broadcasts = self.db['broadcasts']
-            self.ad_sessions = self.db['ad_sessions']
-            self.ad_verifications = self.db['ad_verifications']
+            name = 'SQLite' if self.backend == 'sqlite' else 'MongoDB'
+            retry_in = self._connect_retry_at - time.monotonic()
+            if retry_in > 0:
+                raise ConnectionFailure(f"{name} unavailable, next connection attempt in {retry_in:.0f}s")
             
-            self.init_database()
+            client = None
+            try:
+                if self.backend == "sqlite":
+                    from sqlite_backend import SQLiteClient
+                    client = SQLiteClient(self._connection_string)
+                else:
+                    client = self._create_mongo_client(self._connection_string)
+                client.admin.command('ping')
+                LOGGER(__name__).info(f"Successfully connected to {name}!")
+            except Exception as e:
+                if isinstance(e, ConnectionFailure):
+                    LOGGER(__name__).error(f"Failed to connect to {name}: {e}")
+                else:
+                    LOGGER(__name__).error(f"{name} initialization error: {e}")
+                # Don't leak the client's pool and monitor threads on every failed attempt
+                if client is not None:
+                    try:
+                        client.close()
+                    except Exception:
+                        pass
+                self._connect_failures += 1
+                backoff = min(CONNECT_RETRY_BACKOFF * 2 ** (self._connect_failures - 1), CONNECT_RETRY_BACKOFF_MAX)
+                self._connect_retry_at = time.monotonic() + backoff
+                raise
             
-        except ConnectionFailure as e:
-            LOGGER(__name__).error(f"Failed to connect to MongoDB: {e}")
-            raise
+            self._connect_failures = 0
+            self._client = client
+            self._db = client.get_database("telegram_bot")
+        
+        threading.Thread(target=self.init_database, name="db-index-init", daemon=True).start()
+        self._attach_cache_bus()
+        return self._db
+
+    def save_cache_snapshot(self):
+        """Save the non-sensitive cache namespaces for the next start"""
+        if not self.snapshot_path:
+            return
+        try:
+            self.cache.save_snapshot(self.snapshot_path, SNAPSHOT_NAMESPACES)
         except Exception as e:
-            LOGGER(__name__).error(f"MongoDB initialization error: {e}")
-            raise
+            LOGGER(__name__).error(f"Error saving cache snapshot: {e}")
+
+    async def periodic_cache_snapshot(self, interval: int = SNAPSHOT_INTERVAL):
+        """Save the cache snapshot every interval seconds (the process may be killed without a clean shutdown)"""
+        while True:
+            await asyncio.sleep(interval)
+            await asyncio.to_thread(self.save_cache_snapshot)
+
+    def _attach_cache_bus(self):
+        """Share cache invalidations with other processes (CACHE_INVALIDATION_BUS)"""
+        backend = os.getenv("CACHE_INVALIDATION_BUS", "")
+        if backend.lower() == "mongodb" and self.backend != "mongodb":
+            LOGGER(__name__).warning("CACHE_INVALIDATION_BUS=mongodb needs the MongoDB backend, bus disabled")
+            return
+        # The bus's tailable cursor holds a connection for good - keep it out of the
+        # query pool (only 2 connections on constrained hosts)
+        bus_client = self._create_bus_client(self._connection_string) if backend.lower() == "mongodb" else None
+        try:
+            bus = create_bus(backend, bus_client.get_database("telegram_bot") if bus_client else self._db)
+            if bus is not None:
+                self.cache.attach_bus(bus)
+        except Exception as e:
+            LOGGER(__name__).error(f"Error starting cache invalidation bus: {e}")
+            if bus_client is not None:
+                bus_client.close()
+
+    @property
+    def client(self):
+        self.connect()
+        return self._client
+
+    @property
+    def db(self):
+        return self._db if self._db is not None else self.connect()
+
+    @property
+    def users(self):
+        return self.db['users']
+
+    @property
+    def daily_usage(self):
+        return self.db['daily_usage']
+
+    @property
+    def admins(self):
+        return self.db['admins']
+
+    @property
+    def broadcasts(self):
+        return self.db['broadcasts']
+
+    @property
+    def ad_sessions(self):
+        return self.db['ad_sessions']
+
+    @property
+    def ad_verifications(self):
+        return self.db['ad_verifications']
+
+    @property
+    def file_cache(self):
+        return self.db['file_cache']
+
+    @staticmethod
+    def _create_mongo_client(connection_string: str) -> MongoClient:
+        """Create MongoClient with settings optimized for Render/Replit"""
+        # Detect constrained environments
+        IS_CONSTRAINED = bool(
+            os.getenv('RENDER') or 
+            os.getenv('RENDER_EXTERNAL_URL') or 
+            os.getenv('REPLIT_DEPLOYMENT') or 
+            os.getenv('REPL_ID')
+        )
+        
+        # ULTRA-aggressive pool reduction for Render's 512MB (saves ~50-60MB)
+        # 2 connections is enough for light concurrent usage
+        pool_size = 2 if IS_CONSTRAINED else 10
+        
+        return MongoClient(
+            connection_string,
+            maxPoolSize=pool_size,  # 3 for Render, 10 for VPS
+            minPoolSize=1,
+            maxIdleTimeMS=30000,  # Close idle connections faster (30s vs 45s)
+            serverSelectionTimeoutMS=5000,  # Faster timeout
+            connectTimeoutMS=10000,
+            socketTimeoutMS=10000,
+            retryWrites=True,
+            w='majority',
+            event_listeners=[query_profiler]  # Per-command latency + slow-query log
+        )
+
+    @staticmethod
+    def _create_bus_client(connection_string: str) -> MongoClient:
+        """Create the cache invalidation bus's own MongoClient
+        
+        One connection for the tailing cursor, one for publishing. Not profiled -
+        the cursor's 1s awaits would all show up as slow queries.
+        """
+        return MongoClient(
+            connection_string,
+            maxPoolSize=2,
+            minPoolSize=0,
+            serverSelectionTimeoutMS=5000,
+            connectTimeoutMS=10000,
+            retryWrites=True
+        )
 
     def init_database(self):
-        """Initialize database indexes"""
+        """Initialize database indexes (runs in the background after the first connect)"""
         try:
             self.users.create_index("user_id", unique=True)
             self.daily_usage.create_index([("user_id", 1), ("date", 1)], unique=True)
@@ -74,10 +277,46 @@ class DatabaseManager:
             self.ad_sessions.create_index("created_at", expireAfterSeconds=300)
             self.ad_verifications.create_index("code", unique=True)
             self.ad_verifications.create_index("created_at", expireAfterSeconds=1800)
+            self.file_cache.create_index([("chat_id", 1), ("message_id", 1), ("file_unique_id", 1)], unique=True)
+            # Bot-side file_ids nobody asked for in 30 days are dropped
+            self.file_cache.create_index("last_used", expireAfterSeconds=30 * 24 * 3600)
+            # Used by get_stats, get_premium_users and the expiry sweeper
+            self.users.create_index([("user_type", 1), ("subscription_end", 1)])
+            
+            if self.backend == "sqlite":
+                # Local indexes are cheap - cover every query shape the advisor knows about
+                self.users.create_index("is_banned")
+                self.users.create_index("last_activity")
+                self.users.create_index("joined_date")
+                self.daily_usage.create_index("date")
             
             LOGGER(__name__).info("Database indexes created successfully")
         except Exception as e:
             LOGGER(__name__).error(f"Error creating indexes: {e}")
+        
+        # Opt-in: create any index the advisor finds missing for known query shapes
+        if os.getenv("DB_AUTO_CREATE_INDEXES", "").lower() in ("1", "true", "yes"):
+            self.check_indexes(auto_create=True)
+
+    def check_indexes(self, auto_create: bool = False) -> List[Dict]:
+        """Explain known query shapes and report (optionally create) missing indexes"""
+        reports = IndexAdvisor(self.db).analyze(auto_create=auto_create)
+        missing = [r for r in reports if r['missing_index'] and not r['created']]
+        if missing:
+            LOGGER(__name__).warning(
+                f"{len(missing)} query shape(s) without index: "
+                + ", ".join(f"{r['collection']} {r['shape']}" for r in missing)
+            )
+        return reports
+
+    def get_query_stats(self) -> Dict:
+        """Get query profiler statistics (per-command latency and slow queries)"""
+        return {
+            'commands': query_profiler.get_stats(),
+            'slow_queries': query_profiler.get_slow_queries(),
+            'slow_query_ms': query_profiler.slow_query_ms,
+            'single_flight': self._flights.get_stats()
+        }
 
     def add_user(self, user_id: int, username: Optional[str] = None, first_name: Optional[str] = None,
                  last_name: Optional[str] = None, user_type: str = 'free') -> bool:
@@ -85,7 +324,7 @@ class DatabaseManager:
         try:
             now = datetime.now()
             
-            existing_user = self.users.find_one({"user_id": user_id})
+            existing_user = self.users.find_one({"user_id": user_id}, {"_id": 1})
             
             if not existing_user:
                 user_doc = {
@@ -105,6 +344,9 @@ class DatabaseManager:
                     "ad_downloads_reset_date": now.strftime('%Y-%m-%d')
                 }
                 self.users.insert_one(user_doc)
+                # Drop "doesn't exist" entries cached before the insert
+                self._invalidate_user(user_id)
+                self.cache.delete('banned', user_id)
             else:
                 update_fields = {
                     "last_activity": now
@@ -128,65 +370,100 @@ class DatabaseManager:
 
     def get_user(self, user_id: int) -> Optional[Dict]:
         """Get user information (with caching)"""
-        cache_key = f"user_{user_id}"
-        cached = self.cache.get(cache_key)
-        if cached is not None:
-            return cached
-        
-        try:
+        def fetch():
             user = self.users.find_one({"user_id": user_id})
             if user:
                 user.pop('_id', None)
-                self.cache.set(cache_key, user, ttl=180)  # Cache for 3 minutes
+                self.cache.set('user', user_id, user)  # Cache for 3 minutes
+            else:
+                self.cache.set('user', user_id, MISSING, ttl=NEGATIVE_CACHE_TTL)
             return user
+        
+        def load():
+            return self._flights.do(('user', user_id), fetch)
+        
+        cached = self.cache.get('user', user_id, refresh=load)
+        if cached is not None:
+            return None if cached is MISSING else cached
+        
+        try:
+            return load()
         except Exception as e:
             LOGGER(__name__).error(f"Error getting user {user_id}: {e}")
             return None
 
+    def _get_user_view(self, user_id: int, view: str) -> Optional[UserRecord]:
+        """Get a projected view of a user document (with caching)
+        
+        Args:
+            user_id: User ID
+            view: Key of USER_PROJECTIONS ('role', 'quota', 'session', 'thumb')
+        
+        Returns:
+            UserRecord: Only the view's fields are loaded (others keep defaults), None if user doesn't exist
+        """
+        namespace = f"user_{view}"
+        
+        def fetch():
+            projection = {field: 1 for field in USER_PROJECTIONS[view]}
+            projection['_id'] = 0
+            doc = self.users.find_one({"user_id": user_id}, projection)
+            if doc is None:
+                self.cache.set(namespace, user_id, MISSING, ttl=NEGATIVE_CACHE_TTL)
+                return None
+            # subscription_end is parsed once per cache fill so get_user_type is a plain comparison
+            record = UserRecord.from_doc(user_id, doc)
+            self.cache.set(namespace, user_id, record)  # Cache for 3 minutes
+            return record
+        
+        def load():
+            return self._flights.do((namespace, user_id), fetch)
+        
+        cached = self.cache.get(namespace, user_id, refresh=load)
+        if cached is not None:
+            return None if cached is MISSING else cached
+        
+        try:
+            return load()
+        except Exception as e:
+            LOGGER(__name__).error(f"Error getting {view} for user {user_id}: {e}")
+            return None
+
+    def _invalidate_user(self, user_id: int):
+        """Drop the cached user document and all of its projected views"""
+        self.cache.invalidate_key(user_id, USER_NAMESPACES)
+
     def get_user_type(self, user_id: int) -> str:
         """Get user type (free, paid, admin)"""
-        user = self.get_user(user_id)
-        if not user:
+        user = self._get_user_view(user_id, 'role')
+        if user is None:
             return 'free'
 
         if self.is_admin(user_id):
             return 'admin'
 
-        if user.get('user_type') == 'paid' and user.get('subscription_end'):
-            if isinstance(user['subscription_end'], str):
-                # Try parsing with time first, fallback to date only
-                try:
-                    sub_end = datetime.strptime(user['subscription_end'], '%Y-%m-%d %H:%M:%S')
-                except ValueError:
-                    sub_end = datetime.strptime(user['subscription_end'], '%Y-%m-%d')
-            else:
-                sub_end = user['subscription_end']
-            
-            if sub_end > datetime.now():
-                return 'paid'
-            else:
-                # Premium expired, downgrade to free and clear subscription_end and premium_source
-                premium_source = user.get('premium_source', 'unknown')
-                self.users.update_one(
-                    {"user_id": user_id},
-                    {"$set": {"user_type": "free", "subscription_end": None, "premium_source": None}}
-                )
-                LOGGER(__name__).info(f"User {user_id} {premium_source} premium expired, downgraded to free")
+        # Expired subscriptions are downgraded in bulk by expire_subscriptions()
+        if user.is_paid_active():
+            return 'paid'
 
         return 'free'
 
     def is_admin(self, user_id: int) -> bool:
         """Check if user is admin (with caching)"""
-        cache_key = f"admin_{user_id}"
-        cached = self.cache.get(cache_key)
+        def fetch():
+            is_admin = self.admins.find_one({"user_id": user_id}, {"_id": 1}) is not None
+            self.cache.set('admin', user_id, is_admin)  # Cache for 5 minutes
+            return is_admin
+        
+        def load():
+            return self._flights.do(('admin', user_id), fetch)
+        
+        cached = self.cache.get('admin', user_id, refresh=load)
         if cached is not None:
             return cached
         
         try:
-            admin = self.admins.find_one({"user_id": user_id})
-            is_admin = admin is not None
-            self.cache.set(cache_key, is_admin, ttl=300)  # Cache for 5 minutes
-            return is_admin
+            return load()
         except Exception as e:
             LOGGER(__name__).error(f"Error checking admin status for {user_id}: {e}")
             return False
@@ -205,8 +482,8 @@ class DatabaseManager:
                 upsert=True
             )
             # Invalidate cache
-            self.cache.delete(f"admin_{user_id}")
-            self.cache.delete(f"user_{user_id}")
+            self.cache.delete('admin', user_id)
+            self._invalidate_user(user_id)
             return True
         except Exception as e:
             LOGGER(__name__).error(f"Error adding admin {user_id}: {e}")
@@ -217,8 +494,8 @@ class DatabaseManager:
         try:
             result = self.admins.delete_one({"user_id": user_id})
             # Invalidate cache
-            self.cache.delete(f"admin_{user_id}")
-            self.cache.delete(f"user_{user_id}")
+            self.cache.delete('admin', user_id)
+            self._invalidate_user(user_id)
             return result.deleted_count > 0
         except Exception as e:
             LOGGER(__name__).error(f"Error removing admin {user_id}: {e}")
@@ -241,6 +518,7 @@ class DatabaseManager:
                 {"user_id": user_id},
                 {"$set": update_data}
             )
+            self._invalidate_user(user_id)
             return result.modified_count > 0 or result.matched_count > 0
         except Exception as e:
             LOGGER(__name__).error(f"Error setting user type for {user_id}: {e}")
@@ -258,21 +536,14 @@ class DatabaseManager:
             bool: Success status
         """
         try:
-            user = self.get_user(user_id)
-            
-            if user and user.get('user_type') == 'paid':
-                existing_end = user.get('subscription_end')
-                if existing_end:
-                    if isinstance(existing_end, str):
-                        try:
-                            existing_expiry = datetime.strptime(existing_end, '%Y-%m-%d %H:%M:%S')
-                        except ValueError:
-                            existing_expiry = datetime.strptime(existing_end, '%Y-%m-%d')
-                    else:
-                        existing_expiry = existing_end
-                    
+            user = self._get_user_view(user_id, 'role')
+            
+            if user and user.user_type == 'paid':
+                existing_end = user.subscription_end
+                existing_expiry = user.subscription_end_at
+                if existing_expiry:
                     if existing_expiry > datetime.now():
-                        existing_source = user.get('premium_source')
+                        existing_source = user.premium_source
                         
                         if source == 'ads' and existing_source != 'ads':
                             LOGGER(__name__).warning(
@@ -291,11 +562,53 @@ class DatabaseManager:
                 {"user_id": user_id},
                 {"$set": update_data}
             )
+            self._invalidate_user(user_id)
             return result.modified_count > 0 or result.matched_count > 0
         except Exception as e:
             LOGGER(__name__).error(f"Error setting premium for {user_id}: {e}")
             return False
 
+    def expire_subscriptions(self) -> int:
+        """Downgrade every expired paid subscription to free in one update_many
+        
+        Returns:
+            int: Number of users downgraded
+        """
+        try:
+            now = datetime.now()
+            # subscription_end is stored as '%Y-%m-%d %H:%M:%S' / '%Y-%m-%d' strings (both sort
+            # lexicographically like the date they encode) or, for old documents, as datetime
+            expired = {
+                "user_type": "paid",
+                "$or": [
+                    {"subscription_end": {"$lte": now.strftime('%Y-%m-%d %H:%M:%S')}},
+                    {"subscription_end": {"$lte": now}}
+                ]
+            }
+            user_ids = [u['user_id'] for u in self.users.find(expired, {"user_id": 1, "_id": 0})]
+            if not user_ids:
+                return 0
+            
+            # Re-check the expiry filter so a renewal between find and update is kept
+            result = self.users.update_many(
+                {**expired, "user_id": {"$in": user_ids}},
+                {"$set": {"user_type": "free", "subscription_end": None, "premium_source": None}}
+            )
+            for user_id in user_ids:
+                self._invalidate_user(user_id)
+            
+            LOGGER(__name__).info(f"Expired {result.modified_count} premium subscription(s), downgraded to free")
+            return result.modified_count
+        except Exception as e:
+            LOGGER(__name__).error(f"Error expiring subscriptions: {e}")
+            return 0
+
+    async def periodic_expiry_sweep(self, interval: int = 300):
+        """Run expire_subscriptions() every interval seconds (off the event loop)"""
+        while True:
+            await asyncio.to_thread(self.expire_subscriptions)
+            await asyncio.sleep(interval)
+
     def get_daily_usage(self, user_id: int, date: Optional[str] = None) -> int:
         """Get daily file download count"""
         if not date:
@@ -332,8 +645,8 @@ class DatabaseManager:
             self.reset_ad_downloads_if_needed(user_id)
             
             # Check if user has ad downloads
-            user = self.get_user(user_id)
-            ad_downloads = user.get('ad_downloads', 0) if user else 0
+            user = self._get_user_view(user_id, 'quota')
+            ad_downloads = user.ad_downloads if user else 0
             
             if ad_downloads > 0:
                 # PRE-VALIDATE: Check if user has enough ad downloads BEFORE deducting
@@ -351,7 +664,7 @@ class DatabaseManager:
                 if result.modified_count > 0:
                     LOGGER(__name__).info(f"User {user_id} used {count} ad download(s), {ad_downloads - count} remaining")
                     # CRITICAL: Clear cache to prevent stale ad_downloads from being reused
-                    self.cache.delete(f"user_{user_id}")
+                    self._invalidate_user(user_id)
                     # Increment shortener rotation for each file downloaded
                     for _ in range(count):
                         self.increment_shortener_rotation()
@@ -402,8 +715,8 @@ class DatabaseManager:
         self.reset_ad_downloads_if_needed(user_id)
 
         # Check ad downloads first
-        user = self.get_user(user_id)
-        ad_downloads = user.get('ad_downloads', 0) if user else 0
+        user = self._get_user_view(user_id, 'quota')
+        ad_downloads = user.ad_downloads if user else 0
         
         if ad_downloads > 0:
             if ad_downloads < count:
@@ -455,8 +768,8 @@ class DatabaseManager:
                 {"$set": {"is_banned": True}}
             )
             # Invalidate cache
-            self.cache.delete(f"banned_{user_id}")
-            self.cache.delete(f"user_{user_id}")
+            self.cache.delete('banned', user_id)
+            self._invalidate_user(user_id)
             return result.modified_count > 0
         except Exception as e:
             LOGGER(__name__).error(f"Error banning user {user_id}: {e}")
@@ -470,8 +783,8 @@ class DatabaseManager:
                 {"$set": {"is_banned": False}}
             )
             # Invalidate cache
-            self.cache.delete(f"banned_{user_id}")
-            self.cache.delete(f"user_{user_id}")
+            self.cache.delete('banned', user_id)
+            self._invalidate_user(user_id)
             return result.modified_count > 0
         except Exception as e:
             LOGGER(__name__).error(f"Error unbanning user {user_id}: {e}")
@@ -479,15 +792,24 @@ class DatabaseManager:
 
     def is_banned(self, user_id: int) -> bool:
         """Check if user is banned (with caching)"""
-        cache_key = f"banned_{user_id}"
-        cached = self.cache.get(cache_key)
+        def fetch():
+            user = self.users.find_one({"user_id": user_id}, {"is_banned": 1, "_id": 0})
+            is_banned = bool(user and user.get('is_banned', False))
+            self.cache.set('banned', user_id, is_banned)  # Cache for 5 minutes
+            return is_banned
+        
+        def load():
+            return self._flights.do(('banned', user_id), fetch)
+        
+        cached = self.cache.get('banned', user_id, refresh=load)
         if cached is not None:
             return cached
         
-        user = self.get_user(user_id)
-        is_banned = bool(user and user.get('is_banned', False))
-        self.cache.set(cache_key, is_banned, ttl=300)  # Cache for 5 minutes
-        return is_banned
+        try:
+            return load()
+        except Exception as e:
+            LOGGER(__name__).error(f"Error checking ban status for {user_id}: {e}")
+            return False
 
     def set_user_session(self, user_id: int, session_string: Optional[str] = None) -> bool:
         """Set user's session string for accessing restricted content (None to logout)"""
@@ -497,7 +819,7 @@ class DatabaseManager:
                 {"$set": {"session_string": session_string}}
             )
             # IMPORTANT: Invalidate cache so get_user_session returns updated data
-            self.cache.delete(f"user_{user_id}")
+            self._invalidate_user(user_id)
             return result.modified_count > 0 or result.matched_count > 0
         except Exception as e:
             LOGGER(__name__).error(f"Error setting session for {user_id}: {e}")
@@ -505,8 +827,8 @@ class DatabaseManager:
 
     def get_user_session(self, user_id: int) -> Optional[str]:
         """Get user's session string"""
-        user = self.get_user(user_id)
-        return user.get('session_string') if user else None
+        user = self._get_user_view(user_id, 'session')
+        return user.session_string if user else None
 
     def get_stats(self) -> Dict:
         """Get bot statistics"""
@@ -557,6 +879,7 @@ class DatabaseManager:
                 {"user_id": user_id},
                 {"$set": {"custom_thumbnail": file_id}}
             )
+            self._invalidate_user(user_id)
             return result.modified_count > 0
         except Exception as e:
             LOGGER(__name__).error(f"Error setting custom thumbnail for {user_id}: {e}")
@@ -564,8 +887,8 @@ class DatabaseManager:
     
     def get_custom_thumbnail(self, user_id: int) -> Optional[str]:
         """Get user's custom thumbnail file_id"""
-        user = self.get_user(user_id)
-        return user.get('custom_thumbnail') if user else None
+        user = self._get_user_view(user_id, 'thumb')
+        return user.custom_thumbnail if user else None
     
     def delete_custom_thumbnail(self, user_id: int) -> bool:
         """Delete custom thumbnail for user"""
@@ -574,6 +897,7 @@ class DatabaseManager:
                 {"user_id": user_id},
                 {"$set": {"custom_thumbnail": None}}
             )
+            self._invalidate_user(user_id)
             return result.modified_count > 0
         except Exception as e:
             LOGGER(__name__).error(f"Error deleting custom thumbnail for {user_id}: {e}")
@@ -695,6 +1019,101 @@ class DatabaseManager:
             LOGGER(__name__).error(f"Error deleting verification code {code}: {e}")
             return False
     
+    def get_cached_file(self, chat_id: int, message_id: int, file_unique_id: str) -> Optional[Dict]:
+        """Get the bot-side file_id of a source file we already uploaded
+        
+        Args:
+            chat_id: Source chat ID
+            message_id: Source message ID
+            file_unique_id: Source file's file_unique_id (changes if the post is edited)
+        
+        Returns:
+            dict: {'file_id', 'media_type'} or None if not cached
+        
+        A found entry only counts as a hit once it was sent - see record_cached_file_hit()
+        and delete_cached_file().
+        """
+        try:
+            entry = self.file_cache.find_one(
+                {"chat_id": chat_id, "message_id": message_id, "file_unique_id": file_unique_id},
+                {"_id": 0, "file_id": 1, "media_type": 1}
+            )
+            if entry:
+                return {'file_id': entry['file_id'], 'media_type': entry['media_type']}
+            self.file_cache_stats['misses'] += 1
+            return None
+        except Exception as e:
+            LOGGER(__name__).error(f"Error getting cached file {chat_id}/{message_id}: {e}")
+            return None
+    
+    def record_cached_file_hit(self, chat_id: int, message_id: int, file_unique_id: str) -> bool:
+        """Count a cached file_id that was sent successfully"""
+        try:
+            self.file_cache.update_one(
+                {"chat_id": chat_id, "message_id": message_id, "file_unique_id": file_unique_id},
+                {"$inc": {"hits": 1}, "$set": {"last_used": datetime.now()}}
+            )
+            self.file_cache_stats['hits'] += 1
+            return True
+        except Exception as e:
+            LOGGER(__name__).error(f"Error recording cached file hit {chat_id}/{message_id}: {e}")
+            return False
+    
+    def save_cached_file(self, chat_id: int, message_id: int, file_unique_id: str,
+                         file_id: str, media_type: str) -> bool:
+        """Remember the bot-side file_id of an uploaded source file"""
+        try:
+            now = datetime.now()
+            self.file_cache.update_one(
+                {"chat_id": chat_id, "message_id": message_id, "file_unique_id": file_unique_id},
+                {
+                    "$set": {"file_id": file_id, "media_type": media_type, "last_used": now},
+                    "$setOnInsert": {"hits": 0, "created_at": now}
+                },
+                upsert=True
+            )
+            self.file_cache_stats['stores'] += 1
+            return True
+        except Exception as e:
+            LOGGER(__name__).error(f"Error caching file {chat_id}/{message_id}: {e}")
+            return False
+    
+    def delete_cached_file(self, chat_id: int, message_id: int, file_unique_id: str) -> bool:
+        """Forget a cached file_id Telegram rejected - the request falls back to a download,
+        so the lookup counts as a miss"""
+        try:
+            result = self.file_cache.delete_one(
+                {"chat_id": chat_id, "message_id": message_id, "file_unique_id": file_unique_id}
+            )
+            self.file_cache_stats['invalidations'] += 1
+            self.file_cache_stats['misses'] += 1
+            return result.deleted_count > 0
+        except Exception as e:
+            LOGGER(__name__).error(f"Error deleting cached file {chat_id}/{message_id}: {e}")
+            return False
+    
+    def get_file_cache_stats(self, top: int = 5) -> Dict:
+        """Get file cache hit/miss counters since start, the number of cached files
+        and the most reused entries (persistent per-entry hit counts)
+        
+        Args:
+            top: Number of most-hit entries to include
+        """
+        stats = dict(self.file_cache_stats)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = f"{(stats['hits'] / lookups * 100) if lookups else 0:.1f}%"
+        try:
+            stats['cached_files'] = self.file_cache.count_documents({})
+            stats['top_files'] = list(self.file_cache.find(
+                {"hits": {"$gt": 0}},
+                {"_id": 0, "chat_id": 1, "message_id": 1, "media_type": 1, "hits": 1}
+            ).sort("hits", -1).limit(top))
+        except Exception as e:
+            LOGGER(__name__).error(f"Error counting cached files: {e}")
+            stats['cached_files'] = 0
+            stats['top_files'] = []
+        return stats
+    
     def add_ad_downloads(self, user_id: int, count: int) -> bool:
         """Add ad downloads to user account (resets to 0 first if it's a new day)"""
         try:
@@ -709,7 +1128,7 @@ class DatabaseManager:
             if result.modified_count > 0:
                 LOGGER(__name__).info(f"Added {count} ad downloads to user {user_id}")
                 # Clear cache to ensure fresh data on next read
-                self.cache.delete(f"user_{user_id}")
+                self._invalidate_user(user_id)
                 return True
             return False
         except Exception as e:
@@ -719,8 +1138,8 @@ class DatabaseManager:
     def reset_ad_downloads_if_needed(self, user_id: int) -> None:
         """Reset ad downloads to 0 if it's a new day"""
         try:
-            user = self.users.find_one({"user_id": user_id})
-            if not user:
+            user = self.users.find_one({"user_id": user_id}, {"ad_downloads_reset_date": 1, "_id": 0})
+            if user is None:
                 return
             
             today = datetime.now().strftime('%Y-%m-%d')
@@ -739,7 +1158,7 @@ class DatabaseManager:
                 )
                 LOGGER(__name__).info(f"Reset ad downloads for user {user_id} (new day: {today})")
                 # Clear cache so next get_user call fetches fresh data
-                self.cache.delete(f"user_{user_id}")
+                self._invalidate_user(user_id)
         except Exception as e:
             LOGGER(__name__).error(f"Error resetting ad downloads for {user_id}: {e}")
     
@@ -749,8 +1168,8 @@ class DatabaseManager:
             # Reset ad downloads if it's a new day
             self.reset_ad_downloads_if_needed(user_id)
             
-            user = self.get_user(user_id)
-            return user.get('ad_downloads', 0) if user else 0
+            user = self._get_user_view(user_id, 'quota')
+            return user.ad_downloads if user else 0
         except Exception as e:
             LOGGER(__name__).error(f"Error getting ad downloads for {user_id}: {e}")
             return 0
@@ -759,11 +1178,9 @@ class DatabaseManager:
         """Get user's current shortener index for per-user rotation
         Returns: 0=droplink, 1=gplinks, 2=arlinks, 3=upshrink"""
         try:
-            user = self.get_user(user_id)
-            if user and 'shortener_index' in user:
-                return user['shortener_index']
-            # First time user - start with droplink (index 0)
-            return 0
+            user = self._get_user_view(user_id, 'quota')
+            # First time user (no shortener_index yet) - start with droplink (index 0)
+            return user.shortener_index if user else 0
         except Exception as e:
             LOGGER(__name__).error(f"Error getting shortener index for user {user_id}: {e}")
             return 0  # Default to droplink on error
@@ -785,7 +1202,7 @@ class DatabaseManager:
             )
             
             # Clear cache to ensure fresh data
-            self.cache.delete(f"user_{user_id}")
+            self._invalidate_user(user_id)
             
             service_names = {0: 'droplink', 1: 'gplinks', 2: 'arlinks', 3: 'upshrink'}
             LOGGER(__name__).info(f"User {user_id}: Next ad link will use {service_names.get(next_index)} (rotated from {service_names.get(current_index)})")
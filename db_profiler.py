@@ -0,0 +1,288 @@
+# Copyright (C) @Wolfy004
+# Channel: https://t.me/Wolfy004
+
+"""
+MongoDB query profiler and index advisor
+Records per-command latency histograms and a slow-query log, and checks the
+query shapes used by DatabaseManager for collection scans
+"""
+
+import os
+import threading
+from collections import deque
+from datetime import datetime
+from bisect import bisect_left
+from typing import List, Dict, Any
+from pymongo import monitoring
+from logger import LOGGER
+
+# Histogram bucket upper bounds in milliseconds (last bucket catches everything above)
+LATENCY_BUCKETS_MS = [1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500]
+
+# Driver/handshake commands that say nothing about our queries
+IGNORED_COMMANDS = {
+    'ping', 'hello', 'ismaster', 'isMaster', 'buildInfo', 'buildinfo', 'endSessions',
+    'saslStart', 'saslContinue', 'getnonce', 'authenticate', 'killCursors', 'explain'
+}
+
+# Collections whose commands are expected to be slow (tailable cursors wait for data)
+IGNORED_COLLECTIONS = {'cache_invalidations'}
+
+
+def query_shape(value: Any) -> Any:
+    """Strip values from a filter, keeping field names and operators
+
+    {"user_id": 123, "date": {"$gt": "2025-01-01"}} -> {"user_id": "?", "date": {"$gt": "?"}}
+    Shapes never contain user data (session strings, codes) so they are safe to log.
+    """
+    if isinstance(value, dict):
+        return {k: query_shape(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [query_shape(v) for v in value[:1]]
+    return "?"
+
+
+class QueryProfiler(monitoring.CommandListener):
+    """pymongo command listener that keeps latency statistics per command and collection"""
+
+    def __init__(self, slow_query_ms: int = 100, max_slow_queries: int = 50):
+        """
+        Args:
+            slow_query_ms: Commands slower than this are recorded in the slow-query log
+            max_slow_queries: Number of slow queries to keep (oldest are dropped)
+        """
+        self.slow_query_ms = slow_query_ms
+        self.slow_queries: deque = deque(maxlen=max_slow_queries)
+        self.stats: Dict[str, Dict[str, Any]] = {}
+        self._pending: Dict[tuple, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def _describe(self, event: monitoring.CommandStartedEvent) -> Dict[str, Any]:
+        """Extract collection and filter shape from a started command"""
+        command = event.command
+        collection = command.get(event.command_name)
+        if not isinstance(collection, str):
+            # getMore names the collection separately
+            collection = command.get('collection', "")
+
+        if 'filter' in command:
+            query = command['filter']
+        elif 'query' in command:
+            query = command['query']
+        elif command.get('updates'):
+            query = command['updates'][0].get('q', {})
+        elif command.get('deletes'):
+            query = command['deletes'][0].get('q', {})
+        elif command.get('pipeline'):
+            query = next((stage['$match'] for stage in command['pipeline'] if '$match' in stage), {})
+        else:
+            query = {}
+
+        return {
+            'command': event.command_name,
+            'collection': collection,
+            'shape': query_shape(query)
+        }
+
+    def started(self, event: monitoring.CommandStartedEvent):
+        if event.command_name in IGNORED_COMMANDS:
+            return
+        info = self._describe(event)
+        if info['collection'] in IGNORED_COLLECTIONS:
+            return
+        with self._lock:
+            self._pending[(event.connection_id, event.request_id)] = info
+
+    def _record(self, event, failed: bool = False):
+        with self._lock:
+            info = self._pending.pop((event.connection_id, event.request_id), None)
+            if info is None:
+                return
+
+            duration_ms = event.duration_micros / 1000
+            key = f"{info['command']} {info['collection']}".strip()
+            entry = self.stats.get(key)
+            if entry is None:
+                entry = {
+                    'count': 0,
+                    'failed': 0,
+                    'total_ms': 0.0,
+                    'max_ms': 0.0,
+                    'histogram': [0] * (len(LATENCY_BUCKETS_MS) + 1)
+                }
+                self.stats[key] = entry
+
+            entry['count'] += 1
+            entry['total_ms'] += duration_ms
+            entry['max_ms'] = max(entry['max_ms'], duration_ms)
+            entry['histogram'][bisect_left(LATENCY_BUCKETS_MS, duration_ms)] += 1
+            if failed:
+                entry['failed'] += 1
+
+            if duration_ms >= self.slow_query_ms:
+                self.slow_queries.append({
+                    'time': datetime.now().strftime('%H:%M:%S'),
+                    'command': key,
+                    'shape': info['shape'],
+                    'duration_ms': round(duration_ms, 1)
+                })
+
+        if duration_ms >= self.slow_query_ms:
+            LOGGER(__name__).warning(f"Slow query ({duration_ms:.1f} ms): {key} {info['shape']}")
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent):
+        self._record(event)
+
+    def failed(self, event: monitoring.CommandFailedEvent):
+        self._record(event, failed=True)
+
+    def percentile(self, key: str, pct: float) -> float:
+        """Approximate latency percentile (bucket upper bound) for a command key"""
+        entry = self.stats.get(key)
+        if not entry or not entry['count']:
+            return 0.0
+
+        target = entry['count'] * pct / 100
+        seen = 0
+        for idx, count in enumerate(entry['histogram']):
+            seen += count
+            if seen >= target:
+                if idx < len(LATENCY_BUCKETS_MS):
+                    return min(float(LATENCY_BUCKETS_MS[idx]), entry['max_ms'])
+                return entry['max_ms']
+        return entry['max_ms']
+
+    def get_stats(self) -> List[Dict[str, Any]]:
+        """Get per-command statistics, slowest (by total time) first"""
+        with self._lock:
+            keys = list(self.stats.keys())
+
+        result = []
+        for key in keys:
+            entry = self.stats[key]
+            result.append({
+                'command': key,
+                'count': entry['count'],
+                'failed': entry['failed'],
+                'avg_ms': round(entry['total_ms'] / entry['count'], 2) if entry['count'] else 0,
+                'p95_ms': self.percentile(key, 95),
+                'max_ms': round(entry['max_ms'], 1),
+                'total_ms': entry['total_ms']
+            })
+        return sorted(result, key=lambda s: s['total_ms'], reverse=True)
+
+    def get_slow_queries(self) -> List[Dict[str, Any]]:
+        """Get recorded slow queries, newest first"""
+        with self._lock:
+            return list(reversed(self.slow_queries))
+
+    def reset(self):
+        """Clear all statistics"""
+        with self._lock:
+            self.stats.clear()
+            self.slow_queries.clear()
+
+
+def _known_query_shapes() -> List[Dict[str, Any]]:
+    """Query shapes issued by DatabaseManager and the index each one needs"""
+    now = datetime.now()
+    today = now.strftime('%Y-%m-%d')
+    return [
+        {'collection': 'users', 'filter': {"user_id": 0}, 'index': [("user_id", 1)]},
+        {'collection': 'users', 'filter': {"is_banned": False}, 'index': [("is_banned", 1)]},
+        {'collection': 'users', 'filter': {"last_activity": {"$gt": now}}, 'index': [("last_activity", 1)]},
+        {'collection': 'users', 'filter': {"user_type": "paid", "subscription_end": {"$gt": today}},
+         'index': [("user_type", 1), ("subscription_end", 1)]},
+        {'collection': 'users', 'filter': {"joined_date": {"$gte": now}}, 'index': [("joined_date", 1)]},
+        {'collection': 'daily_usage', 'filter': {"user_id": 0, "date": today}, 'index': [("user_id", 1), ("date", 1)]},
+        {'collection': 'daily_usage', 'filter': {"date": today}, 'index': [("date", 1)]},
+        {'collection': 'admins', 'filter': {"user_id": 0}, 'index': [("user_id", 1)]},
+        {'collection': 'ad_sessions', 'filter': {"session_id": ""}, 'index': [("session_id", 1)]},
+        {'collection': 'ad_verifications', 'filter': {"code": ""}, 'index': [("code", 1)]},
+    ]
+
+
+def _plan_stages(plan: Dict[str, Any]) -> List[str]:
+    """Collect every stage name in a (possibly nested) winning plan"""
+    stages = [plan.get('stage', '')]
+    if 'inputStage' in plan:
+        stages.extend(_plan_stages(plan['inputStage']))
+    for child in plan.get('inputStages', []):
+        stages.extend(_plan_stages(child))
+    # Slot-based engine wraps the classic plan in queryPlan
+    if 'queryPlan' in plan:
+        stages.extend(_plan_stages(plan['queryPlan']))
+    return stages
+
+
+class IndexAdvisor:
+    """Runs explain() on known DatabaseManager query shapes and reports missing indexes"""
+
+    def __init__(self, database):
+        """
+        Args:
+            database: pymongo Database instance
+        """
+        self.database = database
+
+    def analyze(self, auto_create: bool = False) -> List[Dict[str, Any]]:
+        """
+        Explain every known query shape
+
+        Args:
+            auto_create: Create the suggested index for shapes that do a collection scan
+
+        Returns:
+            list: One report dict per query shape
+        """
+        reports = []
+        for shape in _known_query_shapes():
+            collection = self.database[shape['collection']]
+            report = {
+                'collection': shape['collection'],
+                'shape': query_shape(shape['filter']),
+                'suggested_index': shape['index'],
+                'stages': [],
+                'missing_index': False,
+                'created': False
+            }
+
+            try:
+                explain = collection.find(shape['filter']).explain()
+                winning_plan = explain.get('queryPlanner', {}).get('winningPlan', {})
+                report['stages'] = _plan_stages(winning_plan)
+                report['missing_index'] = 'COLLSCAN' in report['stages']
+            except Exception as e:
+                LOGGER(__name__).error(f"Error explaining {shape['collection']} {report['shape']}: {e}")
+                report['error'] = str(e)
+                reports.append(report)
+                continue
+
+            if report['missing_index'] and auto_create:
+                try:
+                    collection.create_index(shape['index'])
+                    report['created'] = True
+                    LOGGER(__name__).info(f"Created index {shape['index']} on {shape['collection']}")
+                except Exception as e:
+                    LOGGER(__name__).error(f"Error creating index {shape['index']} on {shape['collection']}: {e}")
+                    report['error'] = str(e)
+
+            reports.append(report)
+        return reports
+
+
+# Global profiler instance, registered on the MongoClient by DatabaseManager
+query_profiler = QueryProfiler(slow_query_ms=int(os.getenv("DB_SLOW_QUERY_MS", "100")))
+
+
+if __name__ == "__main__":
+    # Index report tool: python db_profiler.py [--create]
+    import sys
+    from database import db
+
+    create = "--create" in sys.argv
+    for report in IndexAdvisor(db.db).analyze(auto_create=create):
+        status = "MISSING INDEX" if report['missing_index'] else "ok"
+        if report['created']:
+            status += " (created)"
+        print(f"{report['collection']:<18} {str(report['shape']):<60} {status:<24} {' > '.join(report['stages'])}")
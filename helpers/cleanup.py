@@ -7,6 +7,17 @@ import time
 import asyncio
 from logger import LOGGER
 
+# Download folders in use outside the in-flight registry (e.g. media group items)
+_active_folders = set()
+
+def register_active_folder(path):
+    """Protect a download folder from the periodic cleanup until it is unregistered"""
+    _active_folders.add(os.path.abspath(path))
+
+def unregister_active_folder(path):
+    """Let the periodic cleanup remove a download folder again"""
+    _active_folders.discard(os.path.abspath(path))
+
 async def cleanup_old_downloads(max_age_minutes=30):
     """
     Clean up download folders older than max_age_minutes
@@ -18,14 +29,18 @@ async def cleanup_old_downloads(max_age_minutes=30):
         return
     
     try:
+        from helpers.inflight import inflight_downloads
+        
         current_time = time.time()
         max_age_seconds = max_age_minutes * 60
         cleaned_count = 0
+        # Long downloads don't touch the folder mtime - never remove one that is still in use
+        active_folders = inflight_downloads.active_folders() | _active_folders
         
         for folder_name in os.listdir(downloads_dir):
             folder_path = os.path.join(downloads_dir, folder_name)
             
-            if not os.path.isdir(folder_path):
+            if not os.path.isdir(folder_path) or os.path.abspath(folder_path) in active_folders:
                 continue
             
             # Check folder age
@@ -0,0 +1,126 @@
+# Background dump-channel dispatcher
+# Mirroring to DUMP_CHANNEL_ID runs on its own bounded queue and workers, so a
+# download job (and its queue slot) is done as soon as the user has the file
+
+import os
+import asyncio
+from typing import Awaitable, Callable, Dict, Optional
+from pyrogram.errors import FloodWait
+from logger import LOGGER
+
+IS_CONSTRAINED = bool(
+    os.getenv('RENDER') or os.getenv('RENDER_EXTERNAL_URL') or
+    os.getenv('REPLIT_DEPLOYMENT') or os.getenv('REPL_ID')
+)
+
+DUMP_QUEUE_SIZE = int(os.getenv("DUMP_QUEUE_SIZE", "100" if IS_CONSTRAINED else "500"))
+DUMP_WORKERS = int(os.getenv("DUMP_WORKERS", "1" if IS_CONSTRAINED else "2"))
+# Attempts per mirror for errors other than FloodWait
+DUMP_ATTEMPTS = 3
+# FloodWaits honoured per mirror before giving up on it
+DUMP_MAX_FLOOD_WAITS = 5
+
+
+class DumpDispatcher:
+    """Bounded queue of dump-channel sends drained by background workers
+
+    submit() never waits: when the queue is full the mirror is dropped (and
+    counted) rather than holding up a user's download.
+    """
+
+    def __init__(self, max_queue: int = DUMP_QUEUE_SIZE, workers: int = DUMP_WORKERS):
+        self.max_queue = max_queue
+        self.worker_count = max(workers, 1)
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers = []
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+        self.flood_waits = 0
+
+    def _ensure_started(self):
+        # Workers are created on first use so they run on the bot's event loop
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._workers = [worker for worker in self._workers if not worker.done()]
+        while len(self._workers) < self.worker_count:
+            self._workers.append(asyncio.ensure_future(self._worker()))
+
+    def submit(self, send: Callable[[], Awaitable], description: str) -> bool:
+        """Queue a dump-channel send
+
+        Args:
+            send: Coroutine function doing the send (called again on retry)
+            description: What is being mirrored, for logs
+
+        Returns:
+            bool: True if queued, False if the queue was full
+        """
+        self._ensure_started()
+        try:
+            self._queue.put_nowait((send, description))
+            return True
+        except asyncio.QueueFull:
+            self.dropped += 1
+            LOGGER(__name__).warning(f"Dump queue full ({self.max_queue}), dropped {description}")
+            return False
+
+    async def _worker(self):
+        while True:
+            send, description = await self._queue.get()
+            try:
+                await self._deliver(send, description)
+            finally:
+                self._queue.task_done()
+
+    async def _deliver(self, send: Callable[[], Awaitable], description: str):
+        attempt = 0
+        flood_waits = 0
+        while True:
+            try:
+                await send()
+                self.sent += 1
+                LOGGER(__name__).info(f"Sent {description} to dump channel")
+                return
+            except FloodWait as e:
+                flood_waits += 1
+                self.flood_waits += 1
+                if flood_waits > DUMP_MAX_FLOOD_WAITS:
+                    self.failed += 1
+                    LOGGER(__name__).warning(f"Giving up on {description} after {flood_waits - 1} FloodWaits")
+                    return
+                # The whole worker waits: the next send would hit the same limit
+                LOGGER(__name__).warning(f"FloodWait {e.value}s while mirroring {description}")
+                await asyncio.sleep(e.value)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                attempt += 1
+                if attempt >= DUMP_ATTEMPTS:
+                    # Silently log errors - don't interrupt user's download
+                    self.failed += 1
+                    LOGGER(__name__).warning(f"Failed to send {description} to dump channel: {e}")
+                    return
+                await asyncio.sleep(2 ** attempt)
+
+    async def drain(self, timeout: float = 15):
+        """Wait (up to timeout seconds) for queued mirrors to go out, e.g. before shutdown"""
+        if self._queue is None:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            LOGGER(__name__).warning(f"Dump queue not drained, {self._queue.qsize()} mirror(s) left")
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            'queued': self._queue.qsize() if self._queue else 0,
+            'sent': self.sent,
+            'failed': self.failed,
+            'dropped': self.dropped,
+            'flood_waits': self.flood_waits
+        }
+
+
+# Global dispatcher instance
+dump_dispatcher = DumpDispatcher()
@@ -21,6 +21,9 @@ def cleanup_download(path: str) -> None:
             os.remove(path)
         if os.path.exists(path + ".temp"):
             os.remove(path + ".temp")
+        # Thumbnail written next to the file by media analysis
+        if os.path.exists(path + ".thumb.jpg"):
+            os.remove(path + ".thumb.jpg")
 
         folder = os.path.dirname(path)
         if os.path.isdir(folder) and not os.listdir(folder):
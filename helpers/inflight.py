@@ -0,0 +1,146 @@
+# In-flight download registry
+# Concurrent requests for the same source file share one download instead of
+# each pulling the whole file through its own user session
+
+import os
+import asyncio
+import inspect
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+from logger import LOGGER
+from helpers.files import cleanup_download
+
+
+# Progress callback (current, total, *progress_args), as taken by Pyrogram's download()
+Progress = Callable[..., Optional[Awaitable[None]]]
+
+
+class _InFlight:
+    __slots__ = ('task', 'refs', 'path_hint', 'listeners')
+
+    def __init__(self, path_hint: Optional[str]):
+        self.task: Optional[asyncio.Task] = None
+        self.refs = 0
+        self.path_hint = path_hint
+        # (progress, progress_args) of every attached consumer
+        self.listeners: List[Tuple[Progress, tuple]] = []
+
+    async def report(self, current: int, total: int):
+        """Fan the shared download's progress out to every attached consumer"""
+        for progress, progress_args in list(self.listeners):
+            try:
+                result = progress(current, total, *progress_args)
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                LOGGER(__name__).debug(f"Progress listener failed: {e}")
+
+    def failed(self) -> bool:
+        """Finished without a file (cancelled or raised) - the next requester starts over"""
+        return self.task.done() and (self.task.cancelled() or self.task.exception() is not None)
+
+
+async def _download_file(download: Callable[..., Awaitable[str]], progress: Optional[Progress],
+                         progress_args: tuple) -> str:
+    # download() returns None when nothing was written (e.g. Pyrogram gave up);
+    # turn that into an error so no consumer is handed a missing path
+    path = await download(progress, progress_args)
+    if not path:
+        raise IOError("Download finished without writing a file")
+    return path
+
+
+class InFlightDownloads:
+    """Registry of running downloads keyed by source (chat_id, message_id, file_unique_id)
+
+    The first requester starts the download; later requesters attach to the
+    same task and get the same local path. Progress is reported to every
+    attached consumer, not just the one that started it. The file is cleaned
+    up when the last consumer leaves, and an unfinished download is cancelled
+    if every consumer gave up on it.
+    """
+
+    def __init__(self):
+        self._entries: Dict[Hashable, _InFlight] = {}
+        self.started = 0
+        self.shared = 0
+
+    @asynccontextmanager
+    async def acquire(self, key: Optional[Hashable], download: Callable[..., Awaitable[str]],
+                      path_hint: Optional[str] = None, progress: Optional[Progress] = None,
+                      progress_args: tuple = ()):
+        """Download (or attach to the running download of) a source file
+
+        Args:
+            key: Source key, None to download without sharing
+            download: Coroutine function download(progress, progress_args) that downloads
+                the file (reporting like Pyrogram's download()) and returns its path
+            path_hint: Where the file is being written (protects it from the periodic cleanup)
+            progress: This consumer's progress callback (current, total, *progress_args)
+            progress_args: Extra arguments for this consumer's progress callback
+
+        Yields:
+            str: Local path of the downloaded file (valid until the block exits)
+
+        Raises:
+            IOError: The download finished without writing a file
+        """
+        if key is None:
+            path = await _download_file(download, progress, progress_args)
+            try:
+                yield path
+            finally:
+                cleanup_download(path)
+            return
+
+        entry = self._entries.get(key)
+        if entry is None or entry.failed():
+            entry = _InFlight(path_hint)
+            entry.task = asyncio.ensure_future(_download_file(download, entry.report, ()))
+            self._entries[key] = entry
+            self.started += 1
+        else:
+            self.shared += 1
+            LOGGER(__name__).info(f"Attached to in-flight download of {key} ({entry.refs} consumer(s) already)")
+
+        listener = (progress, progress_args)
+        if progress is not None:
+            entry.listeners.append(listener)
+        entry.refs += 1
+        try:
+            # shield: one consumer being cancelled must not cancel the shared download
+            path = await asyncio.shield(entry.task)
+            yield path
+        finally:
+            if progress is not None:
+                entry.listeners.remove(listener)
+            entry.refs -= 1
+            if entry.refs == 0:
+                if self._entries.get(key) is entry:
+                    del self._entries[key]
+                if not entry.task.done():
+                    entry.task.cancel()
+                elif not entry.failed():
+                    cleanup_download(entry.task.result())
+
+    def active_folders(self) -> set:
+        """Download folders still in use (running downloads and finished files with consumers)"""
+        folders = set()
+        for entry in list(self._entries.values()):
+            path = entry.path_hint
+            if entry.task.done() and not entry.failed():
+                path = entry.task.result()
+            if path:
+                folders.add(os.path.dirname(os.path.abspath(path)))
+        return folders
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            'in_flight': len(self._entries),
+            'started': self.started,
+            'shared': self.shared
+        }
+
+
+# Global registry instance
+inflight_downloads = InFlightDownloads()
@@ -0,0 +1,195 @@
+# Single-pass media analysis
+# One ffmpeg run reads duration, video dimensions and title/artist tags from the
+# container header and (optionally) writes a thumbnail frame. Results are cached
+# per file, so retries and later consumers of the same download never re-run it.
+
+import os
+import re
+import asyncio
+from collections import OrderedDict
+from asyncio.subprocess import PIPE
+from typing import Dict, Optional, Tuple
+from logger import LOGGER
+
+ANALYSIS_TIMEOUT = 60
+ANALYSIS_CACHE_SIZE = 128
+
+_DURATION_RE = re.compile(r"Duration: (\d+):(\d{2}):(\d{2}(?:\.\d+)?)")
+_VIDEO_RE = re.compile(r"Stream #\d+:\d+.*?: Video: .*?\b(\d{2,5})x(\d{2,5})\b")
+_TAG_RE = re.compile(r"^\s+(title|artist)\s*:\s*(.+?)\s*$", re.IGNORECASE | re.MULTILINE)
+
+
+class MediaAnalysis:
+    """What one ffmpeg pass found out about a file (0/None for anything it couldn't read)
+
+    ok is False when ffmpeg couldn't be run, timed out, couldn't read the input or
+    failed to write the requested thumbnail - such results aren't cached.
+    """
+
+    __slots__ = ('duration', 'width', 'height', 'artist', 'title', 'thumb', 'thumb_attempted', 'ok')
+
+    def __init__(self, duration: int = 0, width: int = 0, height: int = 0, artist: Optional[str] = None,
+                 title: Optional[str] = None, thumb: Optional[str] = None, thumb_attempted: bool = False,
+                 ok: bool = False):
+        self.duration = duration
+        self.width = width
+        self.height = height
+        self.artist = artist
+        self.title = title
+        self.thumb = thumb
+        self.thumb_attempted = thumb_attempted
+        self.ok = ok
+
+
+def parse_ffmpeg_banner(stderr: str) -> MediaAnalysis:
+    """Parse the input description ffmpeg prints to stderr"""
+    analysis = MediaAnalysis()
+
+    match = _DURATION_RE.search(stderr)
+    if match:
+        hours, minutes, seconds = match.groups()
+        analysis.duration = round(int(hours) * 3600 + int(minutes) * 60 + float(seconds))
+
+    match = _VIDEO_RE.search(stderr)
+    if match:
+        analysis.width, analysis.height = int(match.group(1)), int(match.group(2))
+
+    # Container tags come before the first stream; stream-level tags would be e.g. "VideoHandler"
+    header = stderr.split("Stream #", 1)[0]
+    for key, value in _TAG_RE.findall(header):
+        key = key.lower()
+        if getattr(analysis, key) is None:
+            setattr(analysis, key, value)
+
+    return analysis
+
+
+class MediaAnalyzer:
+    """Per-file cache in front of a single ffmpeg pass
+
+    The thumbnail is written next to the media file (<path>.thumb.jpg) and is
+    removed together with it by cleanup_download.
+    """
+
+    def __init__(self, max_entries: int = ANALYSIS_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._results: "OrderedDict[Tuple, MediaAnalysis]" = OrderedDict()
+        self._running: Dict[Tuple, asyncio.Future] = {}
+        self.runs = 0
+        self.hits = 0
+
+    @staticmethod
+    def _key(path: str) -> Optional[Tuple]:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return os.path.abspath(path), stat.st_size, stat.st_mtime_ns
+
+    def _usable(self, analysis: MediaAnalysis, thumbnail: bool) -> bool:
+        if not thumbnail:
+            return True
+        if not analysis.thumb_attempted:
+            return False
+        return analysis.thumb is None or os.path.exists(analysis.thumb)
+
+    async def analyze(self, path: str, thumbnail: bool = True) -> MediaAnalysis:
+        """Analyze a local media file, at most one ffmpeg run per file
+
+        Args:
+            path: Local media file
+            thumbnail: Also extract a thumbnail frame (videos)
+
+        Returns:
+            MediaAnalysis (all zero/None if the file can't be read)
+        """
+        key = self._key(path)
+        if key is None:
+            LOGGER(__name__).warning(f"Media analysis: file not found - {path}")
+            return MediaAnalysis()
+
+        cached = self._results.get(key)
+        if cached is not None and self._usable(cached, thumbnail):
+            self._results.move_to_end(key)
+            self.hits += 1
+            return cached
+
+        running = self._running.get(key)
+        if running is not None:
+            analysis = await asyncio.shield(running)
+            if self._usable(analysis, thumbnail):
+                self.hits += 1
+                return analysis
+
+        future = asyncio.get_running_loop().create_future()
+        self._running[key] = future
+        try:
+            analysis = await self._run(path, thumbnail)
+            future.set_result(analysis)
+        except BaseException as e:
+            future.set_exception(e)
+            # Nobody else may be waiting on it; don't let asyncio log it as never retrieved
+            future.exception()
+            raise
+        finally:
+            # A caller that needed a thumbnail may have started a newer run for this key
+            if self._running.get(key) is future:
+                del self._running[key]
+
+        # A timeout or a missing ffmpeg is retried on the next call instead of being remembered
+        if not analysis.ok:
+            return analysis
+
+        self._results[key] = analysis
+        self._results.move_to_end(key)
+        while len(self._results) > self.max_entries:
+            self._results.popitem(last=False)
+        return analysis
+
+    async def _run(self, path: str, thumbnail: bool) -> MediaAnalysis:
+        self.runs += 1
+        thumb_path = f"{path}.thumb.jpg"
+        cmd = ["ffmpeg", "-hide_banner", "-nostdin", "-i", path]
+        if thumbnail:
+            # "thumbnail" picks the most representative of the first frames, skipping black intros
+            cmd += [
+                "-map", "0:v:0?", "-vf", "thumbnail,scale=320:320:force_original_aspect_ratio=decrease",
+                "-frames:v", "1", "-q:v", "2", "-threads", str((os.cpu_count() or 4) // 2),
+                "-y", thumb_path,
+            ]
+        # Without an output ffmpeg just describes the input and exits
+
+        try:
+            proc = await asyncio.create_subprocess_exec(*cmd, stdout=PIPE, stderr=PIPE)
+            try:
+                _, stderr = await asyncio.wait_for(proc.communicate(), ANALYSIS_TIMEOUT)
+            except asyncio.TimeoutError:
+                proc.kill()
+                await proc.communicate()
+                LOGGER(__name__).warning(f"Media analysis timed out: {path}")
+                return MediaAnalysis(thumb_attempted=thumbnail)
+        except Exception as e:
+            LOGGER(__name__).error(f"Media analysis failed: {e} - File: {path}")
+            return MediaAnalysis(thumb_attempted=thumbnail)
+
+        stderr = stderr.decode(errors="replace")
+        analysis = parse_ffmpeg_banner(stderr)
+        analysis.thumb_attempted = thumbnail
+        if thumbnail and os.path.exists(thumb_path) and os.path.getsize(thumb_path) > 0:
+            analysis.thumb = thumb_path
+
+        # Without an output file ffmpeg always exits non-zero, so a describe-only run
+        # counts once the input was read; a thumbnail run must also have succeeded
+        opened = "Input #0" in stderr
+        analysis.ok = opened and (proc.returncode == 0 or not thumbnail)
+        if not analysis.ok:
+            last_line = stderr.strip().splitlines()[-1] if stderr.strip() else ""
+            LOGGER(__name__).warning(f"Media analysis failed (exit {proc.returncode}): {last_line} - File: {path}")
+        return analysis
+
+    def get_stats(self) -> Dict[str, int]:
+        return {'cached': len(self._results), 'runs': self.runs, 'hits': self.hits}
+
+
+# Global analyzer instance
+media_analyzer = MediaAnalyzer()
@@ -0,0 +1,198 @@
+# Processed custom-thumbnail cache
+# Custom thumbnails are downloaded and resized once per file_id and kept on
+# disk, so repeat video uploads reuse the processed JPEG. Bounded by total
+# bytes with least-recently-used eviction; a file handed out to an upload is
+# only deleted once the upload has released it.
+
+import os
+import asyncio
+import hashlib
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional
+from logger import LOGGER
+
+IS_CONSTRAINED = bool(
+    os.getenv('RENDER') or os.getenv('RENDER_EXTERNAL_URL') or
+    os.getenv('REPLIT_DEPLOYMENT') or os.getenv('REPL_ID')
+)
+
+THUMB_CACHE_DIR = os.path.join("Assets", "thumbs", "cache")
+# Processed thumbnails are at most 200KB each
+THUMB_CACHE_MAX_BYTES = int(os.getenv("THUMB_CACHE_MAX_BYTES", str((5 if IS_CONSTRAINED else 20) * 1024 * 1024)))
+
+
+class ThumbnailCache:
+    """Disk cache of processed thumbnails keyed by Telegram file_id
+
+    get() leases the file to the caller, who must release() it when done.
+    Eviction and invalidate() drop a leased entry from the index at once but
+    leave the file on disk until its last lease is released.
+    """
+
+    def __init__(self, directory: str = THUMB_CACHE_DIR, max_bytes: int = THUMB_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, int]" = None  # name -> size, oldest first
+        self._building: Dict[str, asyncio.Future] = {}
+        self._leases: Dict[str, int] = {}  # name -> uploads still reading the file
+        self._doomed = set()  # dropped from the index while leased
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _name(file_id: str) -> str:
+        return hashlib.sha1(file_id.encode()).hexdigest()[:20] + ".jpg"
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _load_index(self):
+        # Pick up thumbnails cached before a restart, least recently used first
+        if self._entries is not None:
+            return
+        self._entries = OrderedDict()
+        self.total_bytes = 0
+        os.makedirs(self.directory, exist_ok=True)
+        files = []
+        for entry in os.scandir(self.directory):
+            if not entry.is_file():
+                continue
+            if not entry.name.endswith(".jpg"):
+                # Leftover of an interrupted build
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    pass
+                continue
+            stat = entry.stat()
+            files.append((stat.st_mtime, entry.name, stat.st_size))
+        for _, name, size in sorted(files):
+            self._entries[name] = size
+            self.total_bytes += size
+
+    def _discard(self, name: str):
+        # Delete now, or when the last upload using the file releases it
+        if self._leases.get(name):
+            self._doomed.add(name)
+            return
+        try:
+            os.remove(self._path(name))
+        except OSError:
+            pass
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes and len(self._entries) > 1:
+            name, size = self._entries.popitem(last=False)
+            self.total_bytes -= size
+            self._discard(name)
+
+    def _lease(self, name: str) -> str:
+        self._leases[name] = self._leases.get(name, 0) + 1
+        return self._path(name)
+
+    async def get(self, file_id: str, build: Callable[[str], Awaitable[bool]]) -> Optional[str]:
+        """Lease the processed thumbnail for file_id, built on first use
+
+        The returned file belongs to the cache - don't delete it, and pass it
+        to release() once the upload using it has finished.
+
+        Args:
+            file_id: Telegram file_id of the original thumbnail
+            build: Coroutine function that writes the processed thumbnail to the
+                given path and returns True on success
+
+        Returns:
+            str: Path of the cached thumbnail, None if it couldn't be built
+        """
+        self._load_index()
+        name = self._name(file_id)
+        path = self._path(name)
+
+        while True:
+            if name in self._entries:
+                if os.path.exists(path):
+                    self._entries.move_to_end(name)
+                    self.hits += 1
+                    try:
+                        # Keeps the LRU order across restarts
+                        os.utime(path)
+                    except OSError:
+                        pass
+                    return self._lease(name)
+                self.total_bytes -= self._entries.pop(name)
+
+            building = self._building.get(name)
+            if building is None:
+                break
+            # Someone else is building it; re-check the index afterwards, as it may
+            # already have been evicted again
+            if await asyncio.shield(building) is None:
+                return None
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._building[name] = future
+        result = None
+        try:
+            temp_path = f"{path}.{os.getpid()}.tmp"
+            try:
+                if await build(temp_path) and os.path.exists(temp_path):
+                    os.replace(temp_path, path)
+                    size = os.path.getsize(path)
+                    self._doomed.discard(name)
+                    self._entries[name] = size
+                    self.total_bytes += size
+                    result = self._lease(name)
+                    self._evict()
+            except Exception as e:
+                LOGGER(__name__).error(f"Failed to build cached thumbnail: {e}")
+            finally:
+                if os.path.exists(temp_path):
+                    try:
+                        os.remove(temp_path)
+                    except OSError:
+                        pass
+        finally:
+            future.set_result(result)
+            del self._building[name]
+        return result
+
+    def release(self, path: Optional[str]):
+        """Give back a path leased by get(), deleting it if it was dropped meanwhile"""
+        if not path:
+            return
+        name = os.path.basename(path)
+        refs = self._leases.get(name, 0) - 1
+        if refs > 0:
+            self._leases[name] = refs
+            return
+        self._leases.pop(name, None)
+        if name in self._doomed:
+            self._doomed.discard(name)
+            self._discard(name)
+
+    def invalidate(self, file_id: Optional[str]):
+        """Drop the cached thumbnail of file_id (e.g. after /setthumb or /delthumb)"""
+        if not file_id:
+            return
+        self._load_index()
+        name = self._name(file_id)
+        size = self._entries.pop(name, None)
+        if size is not None:
+            self.total_bytes -= size
+        self._discard(name)
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            'items': len(self._entries or ()),
+            'leased': len(self._leases),
+            'bytes': self.total_bytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses
+        }
+
+
+# Global cache instance
+thumb_cache = ThumbnailCache()
@@ -0,0 +1,633 @@
+# Copyright (C) @Wolfy004
+# Channel: https://t.me/Wolfy004
+
+"""
+Streaming transfers between the user session and the bot
+- Relay mode pipes a source file from the user client's stream_media straight
+  into a bot-side upload through a bounded buffer: the upload starts while the
+  download is still running and the file never touches the disk.
+- Parallel downloads fetch disjoint chunk ranges of one file concurrently and
+  write them at their offsets into a preallocated file.
+- Big-file uploads keep several parts in flight under an adaptive window that
+  backs off on FloodWait: the window halves and no part is sent until the
+  wait is over. measure_uploads() collects the MB/s of a job's uploads.
+
+Benchmarks against stubbed sources/connections: python -m helpers.transfer
+"""
+
+import os
+import math
+import time
+import asyncio
+import random
+import inspect
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import PurePath
+from typing import List, Optional
+
+from pyrogram import Client, raw
+from pyrogram.errors import FloodWait
+from pyrogram.session import Session
+from logger import LOGGER
+
+# Telegram upload part size (fixed by the API for big files)
+PART_SIZE = 512 * 1024
+# stream_media chunk size (pyrogram's get_file reads 1MB per request)
+CHUNK_SIZE = 1024 * 1024
+# Files up to this size must be uploaded as small files (with an md5 checksum)
+BIG_FILE_THRESHOLD = 10 * 1024 * 1024
+
+IS_CONSTRAINED = bool(
+    os.getenv('RENDER') or os.getenv('RENDER_EXTERNAL_URL') or
+    os.getenv('REPLIT_DEPLOYMENT') or os.getenv('REPL_ID')
+)
+
+RELAY_MODE = os.getenv("RELAY_MODE", "false").lower() in ("1", "true", "yes")
+# Smaller files are cheap to download first and can be shared between requests
+RELAY_MIN_SIZE = max(int(os.getenv("RELAY_MIN_SIZE", str(20 * 1024 * 1024))), BIG_FILE_THRESHOLD + 1)
+# Upload parts held in memory between the download and the upload
+RELAY_BUFFER_PARTS = int(os.getenv("RELAY_BUFFER_PARTS", "4" if IS_CONSTRAINED else "16"))
+
+# Concurrent range fetches per file, capped by the client's max_concurrent_transmissions
+DOWNLOAD_FAN_OUT = int(os.getenv("DOWNLOAD_FAN_OUT", "2" if IS_CONSTRAINED else "4"))
+PARALLEL_DOWNLOAD_MIN_SIZE = int(os.getenv("PARALLEL_DOWNLOAD_MIN_SIZE", str(20 * 1024 * 1024)))
+# Attempts per range before the whole download fails
+RANGE_ATTEMPTS = 3
+
+PARALLEL_UPLOADS = os.getenv("PARALLEL_UPLOADS", "true").lower() in ("1", "true", "yes")
+# Media connections per big-file upload; the adaptive window spreads parts over them
+UPLOAD_CONNECTIONS = int(os.getenv("UPLOAD_CONNECTIONS", "2" if IS_CONSTRAINED else "4"))
+# Parts in flight per upload: starts at UPLOAD_WINDOW_START, adapts up to UPLOAD_WINDOW_MAX
+UPLOAD_WINDOW_START = 4
+UPLOAD_WINDOW_MAX = int(os.getenv("UPLOAD_WINDOW_MAX", "8" if IS_CONSTRAINED else "16"))
+# Attempts per part (FloodWaits included) before the upload fails
+PART_ATTEMPTS = 5
+
+
+def should_relay(media_type: str, file_size: Optional[int]) -> bool:
+    """Check whether a source file goes through relay mode instead of a temp file"""
+    return RELAY_MODE and media_type in ("video", "document") and (file_size or 0) >= RELAY_MIN_SIZE
+
+
+def should_download_parallel(client: Client, media_type: str, file_size: Optional[int]) -> bool:
+    """Check whether a source file is worth fetching as parallel ranges"""
+    return (
+        media_type in ("video", "document")
+        and (file_size or 0) >= PARALLEL_DOWNLOAD_MIN_SIZE
+        and min(DOWNLOAD_FAN_OUT, client.max_concurrent_transmissions) > 1
+    )
+
+
+async def parallel_download(client: Client, message, file_name: str, file_size: int,
+                            fan_out: Optional[int] = None, progress=None, progress_args=()) -> Optional[str]:
+    """Download a file as concurrent chunk ranges written into a preallocated file
+
+    Each range is one stream_media(offset, limit) call, so every worker holds one
+    of the client's get_file slots; a fan-out above max_concurrent_transmissions
+    would only queue. A failed range resumes from its first missing chunk.
+
+    Args:
+        client: Client that can read the source message (user session)
+        message: Source message (or file_id) holding the media
+        file_name: Destination path
+        file_size: Source file size in bytes
+        fan_out: Concurrent ranges (default DOWNLOAD_FAN_OUT)
+        progress: Optional progress callback (current, total, *progress_args)
+        progress_args: Extra arguments for the progress callback
+
+    Returns:
+        str: Path of the downloaded file, None if the download failed
+    """
+    total_chunks = max(math.ceil(file_size / CHUNK_SIZE), 1)
+    fan_out = max(1, min(fan_out or DOWNLOAD_FAN_OUT, client.max_concurrent_transmissions, total_chunks))
+    per_range = math.ceil(total_chunks / fan_out)
+    ranges = [(first, min(per_range, total_chunks - first)) for first in range(0, total_chunks, per_range)]
+
+    temp_path = f"{file_name}.temp"
+    os.makedirs(os.path.dirname(os.path.abspath(file_name)), exist_ok=True)
+    done = 0
+
+    with open(temp_path, "wb") as f:
+        # Reserve the space up front so a full disk fails now, not mid-download
+        f.truncate(file_size)
+        if hasattr(os, "posix_fallocate") and file_size:
+            try:
+                os.posix_fallocate(f.fileno(), 0, file_size)
+            except OSError:
+                pass
+
+        async def fetch_range(first: int, count: int):
+            nonlocal done
+            next_chunk, end = first, first + count
+            for attempt in range(1, RANGE_ATTEMPTS + 1):
+                try:
+                    async for chunk in client.stream_media(message, limit=end - next_chunk, offset=next_chunk):
+                        # No await between seek and write, so workers can't interleave here
+                        f.seek(next_chunk * CHUNK_SIZE)
+                        f.write(chunk)
+                        next_chunk += 1
+                        done += len(chunk)
+                        await _report_progress(progress, min(done, file_size), file_size, progress_args)
+                        if next_chunk >= end:
+                            break
+                    if next_chunk >= end:
+                        return
+                    raise IOError(f"source ended at chunk {next_chunk} of {end}")
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    if attempt == RANGE_ATTEMPTS:
+                        raise
+                    LOGGER(__name__).warning(
+                        f"Range {first}-{end} failed at chunk {next_chunk} (attempt {attempt}): {e}, resuming"
+                    )
+                    await asyncio.sleep(attempt)
+
+        started = time.monotonic()
+        workers = [asyncio.ensure_future(fetch_range(first, count)) for first, count in ranges]
+        try:
+            await asyncio.gather(*workers)
+        except BaseException as e:
+            # Stop the other ranges before the file goes away under them
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            f.close()
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            LOGGER(__name__).error(f"Parallel download of {file_name} failed: {e}")
+            return None
+
+    os.replace(temp_path, file_name)
+    elapsed = max(time.monotonic() - started, 1e-6)
+    LOGGER(__name__).info(
+        f"Downloaded {file_name} in {len(ranges)} parallel ranges: {file_size / elapsed / 1024 / 1024:.1f} MB/s"
+    )
+    return file_name
+
+
+class RelayStream:
+    """Bounded pipe from a user session's stream_media to a bot upload
+
+    Pass it to reply_video/reply_document in place of a path; BotClient.save_file
+    recognises it and uploads parts as they arrive. A stream can be uploaded once.
+    """
+
+    def __init__(self, client: Client, message, name: str, size: int, buffer_parts: int = RELAY_BUFFER_PARTS):
+        """
+        Args:
+            client: User client that can read the source message
+            message: Source message holding the media
+            name: File name used for the upload (also drives the mime type)
+            size: Source file size in bytes
+            buffer_parts: Maximum number of 512KB parts buffered in memory
+        """
+        self.client = client
+        self.message = message
+        self.name = name
+        self.size = size
+        self.total_parts = math.ceil(size / PART_SIZE)
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max(buffer_parts, 1))
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is not None:
+            raise RuntimeError("Relay stream was already consumed")
+        self._task = asyncio.ensure_future(self._pump())
+
+    async def close(self):
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+
+    async def _pump(self):
+        # stream_media yields 1MB chunks; re-cut them into upload-sized parts
+        buffer = bytearray()
+        try:
+            async for chunk in self.client.stream_media(self.message):
+                buffer.extend(chunk)
+                while len(buffer) >= PART_SIZE:
+                    await self._queue.put(bytes(buffer[:PART_SIZE]))
+                    del buffer[:PART_SIZE]
+            if buffer:
+                await self._queue.put(bytes(buffer))
+            await self._queue.put(None)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            await self._queue.put(e)
+
+    async def parts(self):
+        """Yield (part_index, bytes) in order until the source is exhausted"""
+        index = 0
+        while True:
+            item = await self._queue.get()
+            if item is None:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield index, item
+            index += 1
+        if index != self.total_parts:
+            raise IOError(f"Relay source ended after {index} of {self.total_parts} parts")
+
+
+async def _report_progress(progress, current, total, progress_args):
+    if progress is None:
+        return
+    if inspect.iscoroutinefunction(progress):
+        await progress(current, total, *progress_args)
+    else:
+        progress(current, total, *progress_args)
+
+
+class UploadMeter:
+    """Bytes and time of the big-file uploads made during one job"""
+
+    __slots__ = ('bytes', 'seconds')
+
+    def __init__(self):
+        self.bytes = 0
+        self.seconds = 0.0
+
+    def add(self, size: int, seconds: float):
+        self.bytes += size
+        self.seconds += seconds
+
+    @property
+    def mb_per_sec(self) -> float:
+        return self.bytes / self.seconds / 1024 / 1024 if self.seconds else 0.0
+
+    def summary(self) -> Optional[str]:
+        """User-facing throughput line, None if nothing was measured"""
+        if not self.bytes:
+            return None
+        return f"⚡ **Uploaded** `{self.bytes / 1024 / 1024:.1f} MB` at `{self.mb_per_sec:.1f} MB/s`"
+
+
+# Meter of the job running in the current task (save_file runs inside reply_video's task)
+_upload_meter: ContextVar[Optional[UploadMeter]] = ContextVar("upload_meter", default=None)
+
+
+@contextmanager
+def measure_uploads():
+    """Measure the big-file uploads made inside the block
+
+    Yields:
+        UploadMeter: Filled in as uploads finish
+    """
+    meter = UploadMeter()
+    token = _upload_meter.set(meter)
+    try:
+        yield meter
+    finally:
+        _upload_meter.reset(token)
+
+
+class AdaptiveWindow:
+    """AIMD limit on parts in flight
+
+    Grows by one after a full window of clean acknowledgements and halves on a
+    FloodWait or a failed part, so the upload settles just under the rate
+    Telegram accepts. A FloodWait also pauses the whole upload: no part is
+    admitted or sent until the wait is over.
+    """
+
+    def __init__(self, start: int, maximum: int):
+        self.maximum = max(maximum, 1)
+        self.size = max(1, min(start, self.maximum))
+        self.peak = self.size
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self._streak = 0
+        self._cond = asyncio.Condition()
+
+    async def wait_if_paused(self):
+        """Sleep until a FloodWait pause (possibly extended meanwhile) is over"""
+        while True:
+            delay = self.paused_until - time.monotonic()
+            if delay <= 0:
+                return
+            await asyncio.sleep(delay)
+
+    async def acquire(self):
+        await self.wait_if_paused()
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.in_flight < self.size)
+            self.in_flight += 1
+
+    async def release(self):
+        async with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    def on_success(self):
+        self._streak += 1
+        if self._streak >= self.size and self.size < self.maximum:
+            self.size += 1
+            self.peak = max(self.peak, self.size)
+            self._streak = 0
+
+    def on_congestion(self):
+        self.size = max(1, self.size // 2)
+        self._streak = 0
+
+    def on_flood_wait(self, seconds: float):
+        self.on_congestion()
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+async def _open_upload_sessions(client: Client, count: int) -> List[Session]:
+    # Handshakes run concurrently; if one fails (or we're cancelled) none are left open
+    dc_id = await client.storage.dc_id()
+    auth_key = await client.storage.auth_key()
+    test_mode = await client.storage.test_mode()
+    sessions = [Session(client, dc_id, auth_key, test_mode, is_media=True) for _ in range(max(count, 1))]
+    starts = [asyncio.ensure_future(session.start()) for session in sessions]
+    try:
+        await asyncio.gather(*starts)
+    except BaseException:
+        for start in starts:
+            start.cancel()
+        await asyncio.gather(*starts, return_exceptions=True)
+        for session in sessions:
+            try:
+                await session.stop()
+            except Exception:
+                pass
+        raise
+    return sessions
+
+
+async def upload_parts(sessions, parts, total_parts: int, file_size: int, name: str,
+                       progress=None, progress_args=(), window_max: int = UPLOAD_WINDOW_MAX):
+    """Push big-file parts concurrently under an adaptive window
+
+    Args:
+        sessions: Started media sessions; parts are spread over them round-robin
+        parts: Async iterable of (part_index, bytes) in order
+        total_parts: Number of 512KB parts in the file
+        file_size: File size in bytes (for progress and throughput)
+        name: File name reported to Telegram
+        progress: Optional progress callback (current, total, *progress_args)
+        progress_args: Extra arguments for the progress callback
+        window_max: Upper bound for parts in flight
+
+    Returns:
+        raw.types.InputFileBig: Uploaded file, ready for InputMediaUploadedDocument
+    """
+    file_id = random.randint(-(2 ** 63), 2 ** 63 - 1)
+    window = AdaptiveWindow(UPLOAD_WINDOW_START, window_max)
+    pending = set()
+    uploaded = 0
+    failure: List[BaseException] = []
+    started = time.monotonic()
+
+    async def send_part(index: int, data: bytes):
+        nonlocal uploaded
+        session = sessions[index % len(sessions)]
+        rpc = raw.functions.upload.SaveBigFilePart(
+            file_id=file_id, file_part=index, file_total_parts=total_parts, bytes=data
+        )
+        try:
+            for attempt in range(1, PART_ATTEMPTS + 1):
+                # Parts already admitted hold back too while a FloodWait is running
+                await window.wait_if_paused()
+                try:
+                    await session.invoke(rpc)
+                    window.on_success()
+                    break
+                except FloodWait as e:
+                    window.on_flood_wait(e.value)
+                    LOGGER(__name__).warning(f"FloodWait {e.value}s on part {index} of {name}, window {window.size}")
+                except Exception as e:
+                    if attempt == PART_ATTEMPTS:
+                        raise
+                    window.on_congestion()
+                    LOGGER(__name__).warning(f"Part {index} of {name} failed (attempt {attempt}): {e}, retrying")
+                    await asyncio.sleep(min(2 ** attempt, 30))
+            else:
+                raise IOError(f"Part {index} of {name} still flood-waited after {PART_ATTEMPTS} attempts")
+            uploaded += len(data)
+            await _report_progress(progress, min(uploaded, file_size), file_size, progress_args)
+        except asyncio.CancelledError:
+            raise
+        except BaseException as e:
+            failure.append(e)
+        finally:
+            await window.release()
+
+    try:
+        count = 0
+        async for index, data in parts:
+            if failure:
+                break
+            await window.acquire()
+            task = asyncio.ensure_future(send_part(index, data))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+            count += 1
+        if pending:
+            await asyncio.gather(*pending)
+    except BaseException:
+        for task in list(pending):
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        raise
+
+    if failure:
+        raise failure[0]
+    if count != total_parts:
+        raise IOError(f"Upload of {name} stopped after {count} of {total_parts} parts")
+
+    elapsed = max(time.monotonic() - started, 1e-6)
+    meter = _upload_meter.get()
+    if meter is not None:
+        meter.add(file_size, elapsed)
+    LOGGER(__name__).info(
+        f"Uploaded {name}: {file_size / 1024 / 1024:.1f} MB in {elapsed:.1f}s "
+        f"({file_size / elapsed / 1024 / 1024:.1f} MB/s, {len(sessions)} connection(s), window peak {window.peak})"
+    )
+    return raw.types.InputFileBig(id=file_id, parts=total_parts, name=name)
+
+
+async def _file_parts(path: str):
+    with open(path, "rb") as f:
+        index = 0
+        while True:
+            data = f.read(PART_SIZE)
+            if not data:
+                return
+            yield index, data
+            index += 1
+
+
+async def parallel_save_file(client: Client, path: str, progress=None, progress_args=()):
+    """Upload a local big file with parts in flight concurrently
+
+    Args:
+        client: Bot client doing the upload
+        path: Local file path (over 10MB)
+        progress: Optional progress callback (current, total, *progress_args)
+        progress_args: Extra arguments for the progress callback
+
+    Returns:
+        raw.types.InputFileBig: Uploaded file
+    """
+    file_size = os.path.getsize(path)
+    file_size_limit_mib = 4000 if client.me.is_premium else 2000
+    if file_size > file_size_limit_mib * 1024 * 1024:
+        raise ValueError(f"Can't upload files bigger than {file_size_limit_mib} MiB")
+
+    async with client.save_file_semaphore:
+        sessions = await _open_upload_sessions(client, UPLOAD_CONNECTIONS)
+        try:
+            return await upload_parts(
+                sessions, _file_parts(path), math.ceil(file_size / PART_SIZE), file_size,
+                os.path.basename(path), progress, progress_args
+            )
+        finally:
+            for session in sessions:
+                await session.stop()
+
+
+async def relay_save_file(client: Client, stream: RelayStream, progress=None, progress_args=()):
+    """Upload a RelayStream as a big file while it is still being downloaded
+
+    Args:
+        client: Bot client doing the upload
+        stream: Relay stream to consume
+        progress: Optional progress callback (current, total, *progress_args)
+        progress_args: Extra arguments for the progress callback
+
+    Returns:
+        raw.types.InputFileBig: Uploaded file, ready for InputMediaUploadedDocument
+    """
+    if stream.size <= BIG_FILE_THRESHOLD:
+        raise ValueError("Relay mode only handles big files (over 10MB)")
+
+    async with client.save_file_semaphore:
+        sessions = await _open_upload_sessions(client, UPLOAD_CONNECTIONS)
+        stream.start()
+        try:
+            file = await upload_parts(
+                sessions, stream.parts(), stream.total_parts, stream.size, stream.name, progress, progress_args,
+                # Parts in flight come out of the relay buffer, don't outgrow it
+                window_max=min(UPLOAD_WINDOW_MAX, RELAY_BUFFER_PARTS)
+            )
+        finally:
+            await stream.close()
+            for session in sessions:
+                await session.stop()
+
+        LOGGER(__name__).info(f"Relayed {stream.name} ({stream.total_parts} parts) without a temp file")
+        return file
+
+
+class BotClient(Client):
+    """Bot client with concurrent big-file uploads that also accepts a RelayStream in place of a path
+
+    Every upload path (reply_video/reply_document in send_media, send_media_group
+    in processMediaGroup) goes through save_file, so they all get the parallel engine.
+    """
+
+    async def save_file(self, path, file_id: int = None, file_part: int = 0, progress=None, progress_args=()):
+        if isinstance(path, RelayStream):
+            if file_id is not None:
+                # Relayed parts are gone once uploaded, a FilePartMissing retry can't resend them
+                raise IOError(f"Relay upload lost part {file_part} of {path.name}")
+            return await relay_save_file(self, path, progress, progress_args)
+        if (
+            PARALLEL_UPLOADS and file_id is None and isinstance(path, (str, PurePath))
+            and os.path.isfile(path) and os.path.getsize(path) > BIG_FILE_THRESHOLD
+        ):
+            return await parallel_save_file(self, str(path), progress, progress_args)
+        # Small files (md5 checksum), in-memory files and FilePartMissing retries
+        return await super().save_file(path, file_id, file_part, progress, progress_args)
+
+if __name__ == "__main__":
+    # Throughput benchmarks: python -m helpers.transfer
+    import tempfile
+
+    class StubSource:
+        """Stands in for a user client: each 1MB chunk costs one round trip"""
+
+        def __init__(self, latency: float, max_concurrent_transmissions: int):
+            self.latency = latency
+            self.max_concurrent_transmissions = max_concurrent_transmissions
+            self.semaphore = asyncio.Semaphore(max_concurrent_transmissions)
+
+        async def stream_media(self, message, limit: int = 0, offset: int = 0):
+            async with self.semaphore:
+                total = math.ceil(message / CHUNK_SIZE)
+                end = min(offset + limit, total) if limit else total
+                for index in range(offset, end):
+                    await asyncio.sleep(self.latency)
+                    yield bytes([index % 256]) * min(CHUNK_SIZE, message - index * CHUNK_SIZE)
+
+    class StubUploadSession:
+        """Stands in for a media connection: parts share its bandwidth, each ack costs one round trip"""
+
+        def __init__(self, latency: float, bandwidth: float, flood_every: int = 0):
+            self.latency = latency
+            self.bandwidth = bandwidth
+            self.flood_every = flood_every
+            self.calls = 0
+            self.received = {}
+            self.link = asyncio.Lock()
+
+        async def invoke(self, rpc):
+            self.calls += 1
+            if self.flood_every and self.calls % self.flood_every == 0:
+                raise FloodWait(value=0)
+            async with self.link:
+                await asyncio.sleep(len(rpc.bytes) / self.bandwidth)
+            await asyncio.sleep(self.latency)
+            self.received[rpc.file_part] = len(rpc.bytes)
+
+    async def benchmark_upload():
+        size = 64 * PART_SIZE + 4321
+        total_parts = math.ceil(size / PART_SIZE)
+
+        async def parts():
+            for index in range(total_parts):
+                yield index, b"\0" * min(PART_SIZE, size - index * PART_SIZE)
+
+        cases = (("sequential", 1, 1, 0), ("window", 1, UPLOAD_WINDOW_MAX, 0),
+                 (f"window x{UPLOAD_CONNECTIONS} conn", UPLOAD_CONNECTIONS, UPLOAD_WINDOW_MAX, 0),
+                 ("window + FloodWaits", UPLOAD_CONNECTIONS, UPLOAD_WINDOW_MAX, 25))
+        for label, connections, window_max, flood_every in cases:
+            sessions = [StubUploadSession(0.05, 20 * 1024 * 1024, flood_every) for _ in range(connections)]
+            started = time.monotonic()
+            await upload_parts(sessions, parts(), total_parts, size, "bench.bin", window_max=window_max)
+            elapsed = time.monotonic() - started
+            received = {}
+            for session in sessions:
+                received.update(session.received)
+            ok = sorted(received) == list(range(total_parts)) and sum(received.values()) == size
+            print(f"upload {label:<22} {elapsed:5.2f}s  {size / elapsed / 1024 / 1024:7.1f} MB/s  {'ok' if ok else 'CORRUPT'}")
+
+    async def benchmark():
+        size = 48 * CHUNK_SIZE + 12345
+        source = StubSource(latency=0.02, max_concurrent_transmissions=8)
+        with tempfile.TemporaryDirectory() as tmp:
+            for fan_out in (1, 2, 4, 8):
+                path = os.path.join(tmp, f"bench_{fan_out}.bin")
+                started = time.monotonic()
+                await parallel_download(source, size, path, size, fan_out=fan_out)
+                elapsed = time.monotonic() - started
+                with open(path, "rb") as f:
+                    ok = all(f.read(CHUNK_SIZE)[:1] == bytes([i % 256]) for i in range(math.ceil(size / CHUNK_SIZE)))
+                print(f"fan-out {fan_out}: {elapsed:5.2f}s  {size / elapsed / 1024 / 1024:7.1f} MB/s  "
+                      f"{'ok' if ok and os.path.getsize(path) == size else 'CORRUPT'}")
+
+    asyncio.run(benchmark())
+    asyncio.run(benchmark_upload())
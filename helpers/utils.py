@@ -1,6 +1,7 @@
 # Copyright (C) @TheSmartBisnu
 
 import os
+import asyncio
 from time import time
 from logger import LOGGER
 from typing import Optional
@@ -27,6 +28,15 @@ from helpers.msg import (
     get_parsed_msg
 )
 
+from helpers.transfer import IS_CONSTRAINED, measure_uploads
+from helpers.cleanup import register_active_folder, unregister_active_folder
+from helpers.dump_queue import dump_dispatcher
+from helpers.media_analysis import media_analyzer
+from helpers.thumb_cache import thumb_cache
+
+# Album items downloaded concurrently (each one holds a get_file slot of the user session)
+MEDIA_GROUP_CONCURRENCY = int(os.getenv("MEDIA_GROUP_CONCURRENCY", "2" if IS_CONSTRAINED else "3"))
+
 # Try to import PIL for thumbnail processing (optional)
 try:
     from PIL import Image as PILImage
@@ -101,58 +111,9 @@ async def cmd_exec(cmd, shell=False):
 
 
 async def get_media_info(path):
-    try:
-        result = await cmd_exec([
-            "ffprobe", "-hide_banner", "-loglevel", "error",
-            "-print_format", "json", "-show_format", "-show_streams", path,
-        ])
-    except Exception as e:
-        print(f"Get Media Info: {e}. Mostly File not found! - File: {path}")
-        return 0, None, None
-    
-    if result[0] and result[2] == 0:
-        try:
-            import json
-            data = json.loads(result[0])
-        except json.JSONDecodeError as e:
-            LOGGER(__name__).error(f"Failed to parse ffprobe JSON: {e}")
-            return 0, None, None
-        
-        duration = 0
-        artist = None
-        title = None
-        
-        # Try to get duration from format first
-        format_info = data.get("format", {})
-        if format_info:
-            try:
-                duration_str = format_info.get("duration", "0")
-                if duration_str and duration_str != "N/A":
-                    duration = round(float(duration_str))
-            except (ValueError, TypeError):
-                pass
-            
-            # Get tags from format
-            tags = format_info.get("tags", {})
-            artist = tags.get("artist") or tags.get("ARTIST") or tags.get("Artist")
-            title = tags.get("title") or tags.get("TITLE") or tags.get("Title")
-        
-        # If format duration is 0 or missing, try to get from video stream
-        if duration == 0:
-            streams = data.get("streams", [])
-            for stream in streams:
-                if stream.get("codec_type") == "video":
-                    try:
-                        stream_duration = stream.get("duration")
-                        if stream_duration and stream_duration != "N/A":
-                            duration = round(float(stream_duration))
-                            LOGGER(__name__).info(f"Got duration from video stream: {duration}s")
-                            break
-                    except (ValueError, TypeError):
-                        continue
-        
-        return duration, artist, title
-    return 0, None, None
+    """Duration, artist and title of a local file (one cached ffmpeg pass, see helpers.media_analysis)"""
+    analysis = await media_analyzer.analyze(path, thumbnail=False)
+    return analysis.duration, analysis.artist, analysis.title
 
 
 async def get_video_thumbnail(video_file, duration):
@@ -195,19 +156,19 @@ async def safe_progress_callback(current, total, *args):
             LOGGER(__name__).warning(f"Progress callback error: {e}")
 
 
-async def send_to_dump_channel(bot, media_path, media_type, caption, user_id, thumb=None, duration=None):
+async def send_to_dump_channel(bot, file_id, media_type, caption, user_id):
     """
-    Send media to dump channel for monitoring (if configured).
-    This runs silently in the background and won't affect user downloads.
+    Mirror media we just sent to the user into the dump channel (if configured).
+    The file is referenced by its bot-side file_id, so nothing is uploaded again.
+    The send is queued on the background dump dispatcher (with retries), so this
+    returns at once and won't affect user downloads.
     
     Args:
         bot: Pyrogram Client instance
-        media_path: Path to the media file
+        file_id: Bot-side file_id of the sent media (see get_sent_file_id)
         media_type: Type of media (photo, video, audio, document)
         caption: Original caption
         user_id: User ID who downloaded this
-        thumb: Optional thumbnail path (for videos)
-        duration: Optional duration (for videos/audio)
     """
     from config import PyroConf
     
@@ -215,72 +176,176 @@ async def send_to_dump_channel(bot, media_path, media_type, caption, user_id, th
     if not PyroConf.DUMP_CHANNEL_ID:
         return
     
-    try:
-        # Add user info to caption
-        dump_caption = f"👤 User ID: `{user_id}`\n"
-        if caption:
-            dump_caption += f"\n📝 Original Caption:\n{caption[:800]}"  # Limit caption length
-        
-        # Convert channel ID to integer format
-        channel_id = int(PyroConf.DUMP_CHANNEL_ID)
-        
-        # Send based on media type
-        if media_type == "photo":
-            await bot.send_photo(
-                chat_id=channel_id,
-                photo=media_path,
-                caption=dump_caption
-            )
-        elif media_type == "video":
-            kwargs = {"caption": dump_caption}
-            if thumb and thumb != "none":
-                kwargs["thumb"] = thumb
-            if duration and duration > 0:
-                kwargs["duration"] = duration
-            await bot.send_video(
-                chat_id=channel_id,
-                video=media_path,
-                **kwargs
-            )
-        elif media_type == "audio":
-            kwargs = {"caption": dump_caption}
-            if duration and duration > 0:
-                kwargs["duration"] = duration
-            await bot.send_audio(
-                chat_id=channel_id,
-                audio=media_path,
-                **kwargs
-            )
-        elif media_type == "document":
-            await bot.send_document(
-                chat_id=channel_id,
-                document=media_path,
-                caption=dump_caption
-            )
-        
-        LOGGER(__name__).info(f"Sent {media_type} to dump channel for user {user_id}")
-    except Exception as e:
-        # Silently log errors - don't interrupt user's download
-        LOGGER(__name__).warning(f"Failed to send to dump channel: {e}")
+    if not file_id:
+        LOGGER(__name__).warning(f"No file_id to mirror {media_type} to dump channel for user {user_id}")
+        return
+    
+    # Add user info to caption
+    dump_caption = f"👤 User ID: `{user_id}`\n"
+    if caption:
+        dump_caption += f"\n📝 Original Caption:\n{caption[:800]}"  # Limit caption length
+    
+    # Convert channel ID to integer format
+    channel_id = int(PyroConf.DUMP_CHANNEL_ID)
+    
+    # file_id keeps the thumbnail, duration and dimensions of the original upload
+    dump_dispatcher.submit(
+        lambda: bot.send_cached_media(chat_id=channel_id, file_id=file_id, caption=dump_caption),
+        f"{media_type} for user {user_id}"
+    )
 
 # Generate progress bar for downloading/uploading
 def progressArgs(action: str, progress_message, start_time):
     return (action, progress_message, start_time, PROGRESS_BAR, "▓", "░")
 
 
+async def close_progress(progress_message, upload_meter=None):
+    """Replace a job's progress message with its upload speed, or delete it if none was measured
+    
+    Args:
+        progress_message: The job's progress message
+        upload_meter: UploadMeter from measure_uploads() (only big-file uploads are measured)
+    """
+    summary = upload_meter.summary() if upload_meter else None
+    if summary:
+        try:
+            await progress_message.edit(summary)
+            return
+        except Exception as e:
+            LOGGER(__name__).debug(f"Could not show upload speed: {e}")
+    await progress_message.delete()
+
+
+def get_file_unique_id(msg) -> Optional[str]:
+    """Get file_unique_id of a message's media (None for text/unsupported messages)"""
+    if not msg.media:
+        return None
+    media = getattr(msg, msg.media.value, None)
+    return getattr(media, "file_unique_id", None)
+
+
+def get_sent_file_id(sent_message, media_type) -> Optional[str]:
+    """Get the bot-side file_id of media we just sent (None if not available)"""
+    if not sent_message:
+        return None
+    media = getattr(sent_message, media_type, None) or sent_message.document
+    return getattr(media, "file_id", None)
+
+
+async def send_cached_file(bot, message, file_id, media_type, caption, user_id=None):
+    """Send a previously uploaded file by its bot-side file_id (no download/upload)
+    
+    Returns:
+        Message on success, None if Telegram rejected the file_id (caller should invalidate it)
+    """
+    try:
+        sent = await bot.send_cached_media(
+            chat_id=message.chat.id,
+            file_id=file_id,
+            caption=caption or "",
+            reply_to_message_id=message.id
+        )
+    except Exception as e:
+        LOGGER(__name__).warning(f"Cached file_id rejected, falling back to download: {e}")
+        return None
+    
+    if user_id:
+        await send_to_dump_channel(bot, file_id, media_type, caption, user_id)
+    return sent
+
+
+async def fetch_source_thumb(client, source_message):
+    """Download Telegram's own preview of the source video (small, kept in memory)
+    
+    Returns:
+        In-memory file, None if the source has no preview or it couldn't be fetched
+    """
+    video = getattr(source_message, "video", None)
+    if not (client and video and video.thumbs):
+        return None
+    try:
+        best = max(video.thumbs, key=lambda t: (t.width or 0) * (t.height or 0))
+        return await client.download_media(best.file_id, in_memory=True)
+    except Exception as e:
+        LOGGER(__name__).warning(f"Could not fetch source thumbnail: {e}")
+        return None
+
+
+async def resolve_video_meta(client, source_message, fetch_thumb=True):
+    """Video duration, dimensions and thumbnail from the source message, no subprocess
+    
+    Args:
+        client: Client that can read source_message (downloads the thumbnail)
+        source_message: Source message, None if unknown
+        fetch_thumb: Download the source thumbnail (skip it when a custom one will be used)
+    
+    Returns:
+        tuple: (duration, width, height, thumb) - 0/None for whatever the source lacks;
+        thumb is an in-memory file
+    """
+    video = getattr(source_message, "video", None)
+    if not video:
+        return 0, 0, 0, None
+
+    thumb = await fetch_source_thumb(client, source_message) if fetch_thumb else None
+    return video.duration or 0, video.width or 0, video.height or 0, thumb
+
+
+async def get_custom_thumb(bot, user_id) -> Optional[str]:
+    """Get a user's custom thumbnail, downloaded and processed once per file_id
+    
+    Returns:
+        Path of the cached thumbnail (owned by the cache - don't remove it; pass it to
+        thumb_cache.release() once the upload is done), None if unset or unusable
+    """
+    from database import db
+    custom_thumb_file_id = db.get_custom_thumbnail(user_id)
+    if not custom_thumb_file_id:
+        return None
+
+    async def build(path):
+        try:
+            # Download the thumbnail from Telegram
+            await bot.download_media(custom_thumb_file_id, file_name=path)
+            
+            # Process thumbnail to meet Telegram requirements
+            if await process_thumbnail(path):
+                return True
+            LOGGER(__name__).warning(f"Failed to process custom thumbnail for user {user_id}, will try fallback")
+        except Exception as e:
+            LOGGER(__name__).error(f"Failed to download custom thumbnail for user {user_id}: {e}")
+        return False
+
+    custom_thumb_path = await thumb_cache.get(custom_thumb_file_id, build)
+    if custom_thumb_path:
+        LOGGER(__name__).info(f"Using custom thumbnail for user {user_id}")
+    return custom_thumb_path
+
+
 async def send_media(
-    bot, message, media_path, media_type, caption, progress_message, start_time, user_id=None
+    bot, message, media_path, media_type, caption, progress_message, start_time, user_id=None,
+    source_message=None, source_client=None
 ):
+    """Upload a downloaded file to the user
+    
+    Args:
+        source_message: Source message of the file (its video metadata spares ffprobe/ffmpeg)
+        source_client: User client that can read source_message (for the source thumbnail)
+    
+    Returns:
+        Message: The sent message (its media file_id can be reused), None if not sent
+    """
     file_size = os.path.getsize(media_path)
 
     if not await fileSizeLimit(file_size, message, "upload"):
-        return
+        return None
 
     progress_args = progressArgs("📥 Uploading Progress", progress_message, start_time)
     LOGGER(__name__).info(f"Uploading media: {media_path} ({media_type})")
 
+    sent = None
     if media_type == "photo":
-        await message.reply_photo(
+        sent = await message.reply_photo(
             media_path,
             caption=caption or "",
             progress=safe_progress_callback,
@@ -288,158 +353,82 @@ async def send_media(
         )
         # Send to dump channel if configured
         if user_id:
-            await send_to_dump_channel(bot, media_path, media_type, caption, user_id)
+            await send_to_dump_channel(bot, get_sent_file_id(sent, media_type), media_type, caption, user_id)
     elif media_type == "video":
         # Check for custom thumbnail first
-        thumb = None
-        custom_thumb_path = None
-        fallback_thumb = None
-        
-        if user_id:
-            from database import db
-            custom_thumb_file_id = db.get_custom_thumbnail(user_id)
-            if custom_thumb_file_id:
-                try:
-                    # Use unique temp path to avoid race conditions
-                    import time as time_module
-                    timestamp = int(time_module.time() * 1000)
-                    os.makedirs("Assets/thumbs", exist_ok=True)
-                    custom_thumb_path = f"Assets/thumbs/user_{user_id}_{timestamp}.jpg"
-                    
-                    # Download the thumbnail from Telegram
-                    await bot.download_media(custom_thumb_file_id, file_name=custom_thumb_path)
-                    
-                    # Process thumbnail to meet Telegram requirements
-                    if await process_thumbnail(custom_thumb_path):
-                        thumb = custom_thumb_path
-                        LOGGER(__name__).info(f"Using custom thumbnail for user {user_id}")
-                    else:
-                        LOGGER(__name__).warning(f"Failed to process custom thumbnail for user {user_id}, will try fallback")
-                        thumb = None
-                except Exception as e:
-                    LOGGER(__name__).error(f"Failed to download custom thumbnail for user {user_id}: {e}")
-                    thumb = None
+        custom_thumb_path = await get_custom_thumb(bot, user_id) if user_id else None
         
-        # Get video duration
-        duration = (await get_media_info(media_path))[0]
+        try:
+            # Source message metadata first; one cached ffmpeg pass for whatever it lacks.
+            # The source thumbnail is only fetched when there is no custom one to use
+            duration, width, height, source_thumb = await resolve_video_meta(
+                source_client, source_message, fetch_thumb=not custom_thumb_path
+            )
+            analysis = None
+            if not (duration and width and height) or not (custom_thumb_path or source_thumb):
+                analysis = await media_analyzer.analyze(media_path, thumbnail=not (custom_thumb_path or source_thumb))
+                duration = duration or analysis.duration
+                width = width or analysis.width or 480
+                height = height or analysis.height or 320
         
-        # If no custom thumbnail, prepare unique fallback thumbnail
-        if not thumb:
-            import time as time_module
-            timestamp = int(time_module.time() * 1000)
-            os.makedirs("Assets/thumbs", exist_ok=True)
-            fallback_thumb = f"Assets/thumbs/fb_{user_id or 0}_{timestamp}.jpg"
-            
-            # Extract thumbnail from video to unique path
-            cmd = [
-                "ffmpeg", "-hide_banner", "-loglevel", "error",
-                "-ss", str(duration // 2 if duration else 3), "-i", media_path,
-                "-vf", "thumbnail", "-q:v", "1", "-frames:v", "1",
-                "-threads", str((os.cpu_count() or 4) // 2), fallback_thumb,
-            ]
-            try:
-                _, err, code = await wait_for(cmd_exec(cmd), timeout=60)
-                if code == 0 and os.path.exists(fallback_thumb):
-                    thumb = fallback_thumb
-                else:
-                    thumb = None
-            except:
-                thumb = None
+            thumb = custom_thumb_path or source_thumb or (analysis.thumb if analysis else None)
+
+            # Try uploading with thumbnail, fallback on error
+            # Only include duration if > 0, otherwise let Telegram compute it
+            video_kwargs = {
+                "width": width,
+                "height": height,
+                "thumb": thumb,
+                "caption": caption or "",
+                "progress": safe_progress_callback,
+                "progress_args": progress_args,
+            }
+            if duration > 0:
+                video_kwargs["duration"] = duration
         
-        # Get video dimensions
-        if thumb and thumb != "none" and os.path.exists(str(thumb)) and PIL_AVAILABLE and PILImage:
+            sent_successfully = False
             try:
-                with PILImage.open(thumb) as img:
-                    width, height = img.size
-            except:
-                width = 480
-                height = 320
-        else:
-            width = 480
-            height = 320
-
-        if thumb == "none":
-            thumb = None
-
-        # Try uploading with thumbnail, fallback on error
-        # Only include duration if > 0, otherwise let Telegram compute it
-        video_kwargs = {
-            "width": width,
-            "height": height,
-            "thumb": thumb,
-            "caption": caption or "",
-            "progress": safe_progress_callback,
-            "progress_args": progress_args,
-        }
-        if duration > 0:
-            video_kwargs["duration"] = duration
-        
-        sent_successfully = False
-        try:
-            await message.reply_video(media_path, **video_kwargs)
-            sent_successfully = True
-        except Exception as e:
-            # If thumbnail causes error, try with fallback or no thumb
-            LOGGER(__name__).error(f"Upload failed with thumbnail: {e}")
+                sent = await message.reply_video(media_path, **video_kwargs)
+                sent_successfully = True
+            except Exception as e:
+                # If thumbnail causes error, try with fallback or no thumb
+                LOGGER(__name__).error(f"Upload failed with thumbnail: {e}")
             
-            # If custom thumbnail was used, generate fallback now
-            if custom_thumb_path and not fallback_thumb:
-                LOGGER(__name__).info("Custom thumbnail failed, generating fallback thumbnail")
-                try:
-                    import time as time_module
-                    timestamp = int(time_module.time() * 1000)
-                    fallback_thumb = f"Assets/thumbs/fb_{user_id or 0}_{timestamp}.jpg"
-                    
-                    cmd = [
-                        "ffmpeg", "-hide_banner", "-loglevel", "error",
-                        "-ss", str(duration // 2 if duration else 3), "-i", media_path,
-                        "-vf", "thumbnail", "-q:v", "1", "-frames:v", "1",
-                        "-threads", str((os.cpu_count() or 4) // 2), fallback_thumb,
-                    ]
-                    _, err, code = await wait_for(cmd_exec(cmd), timeout=60)
-                    if code != 0 or not os.path.exists(fallback_thumb):
-                        fallback_thumb = None
-                except:
-                    fallback_thumb = None
+                # If custom thumbnail was used, fall back to the source's own, or the extracted one
+                # (analysis results are cached per file, so this never runs ffmpeg twice)
+                retry_thumb = None
+                if custom_thumb_path:
+                    retry_thumb = await fetch_source_thumb(source_client, source_message)
+                    if not retry_thumb:
+                        LOGGER(__name__).info("Custom thumbnail failed, using extracted thumbnail")
+                        retry_thumb = (await media_analyzer.analyze(media_path)).thumb
             
-            # Try with fallback thumbnail
-            if fallback_thumb:
-                LOGGER(__name__).info("Retrying with auto-extracted thumbnail")
-                try:
-                    video_kwargs["thumb"] = fallback_thumb
-                    await message.reply_video(media_path, **video_kwargs)
-                    sent_successfully = True
-                except Exception as e2:
-                    LOGGER(__name__).error(f"Upload failed with fallback: {e2}, trying without thumbnail")
+                # Try with fallback thumbnail
+                if retry_thumb:
+                    LOGGER(__name__).info("Retrying with fallback thumbnail")
+                    try:
+                        video_kwargs["thumb"] = retry_thumb
+                        sent = await message.reply_video(media_path, **video_kwargs)
+                        sent_successfully = True
+                    except Exception as e2:
+                        LOGGER(__name__).error(f"Upload failed with fallback: {e2}, trying without thumbnail")
+                        video_kwargs["thumb"] = None
+                        sent = await message.reply_video(media_path, **video_kwargs)
+                        sent_successfully = True
+                else:
+                    LOGGER(__name__).info("Retrying without thumbnail")
                     video_kwargs["thumb"] = None
-                    await message.reply_video(media_path, **video_kwargs)
+                    sent = await message.reply_video(media_path, **video_kwargs)
                     sent_successfully = True
-            else:
-                LOGGER(__name__).info("Retrying without thumbnail")
-                video_kwargs["thumb"] = None
-                await message.reply_video(media_path, **video_kwargs)
-                sent_successfully = True
+        finally:
+            thumb_cache.release(custom_thumb_path)
         
         # Send to dump channel if upload was successful
         if sent_successfully and user_id:
-            # Use the final thumbnail that worked (or None)
-            final_thumb = video_kwargs.get("thumb")
-            await send_to_dump_channel(bot, media_path, media_type, caption, user_id, thumb=final_thumb, duration=duration)
-        
-        # Clean up thumbnails after upload
-        if custom_thumb_path and os.path.exists(custom_thumb_path):
-            try:
-                os.remove(custom_thumb_path)
-            except:
-                pass
-        if fallback_thumb and os.path.exists(fallback_thumb):
-            try:
-                os.remove(fallback_thumb)
-            except:
-                pass
+            await send_to_dump_channel(bot, get_sent_file_id(sent, media_type), media_type, caption, user_id)
     elif media_type == "audio":
         duration, artist, title = await get_media_info(media_path)
-        await message.reply_audio(
+        sent = await message.reply_audio(
             media_path,
             duration=duration,
             performer=artist,
@@ -450,9 +439,9 @@ async def send_media(
         )
         # Send to dump channel if configured
         if user_id:
-            await send_to_dump_channel(bot, media_path, media_type, caption, user_id, duration=duration)
+            await send_to_dump_channel(bot, get_sent_file_id(sent, media_type), media_type, caption, user_id)
     elif media_type == "document":
-        await message.reply_document(
+        sent = await message.reply_document(
             media_path,
             caption=caption or "",
             progress=safe_progress_callback,
@@ -460,23 +449,94 @@ async def send_media(
         )
         # Send to dump channel if configured
         if user_id:
-            await send_to_dump_channel(bot, media_path, media_type, caption, user_id)
+            await send_to_dump_channel(bot, get_sent_file_id(sent, media_type), media_type, caption, user_id)
+    
+    return sent
+
+
+async def send_media_relay(
+    bot, user_client, chat_message, message, file_name, media_type, caption, progress_message, start_time, user_id=None
+):
+    """Relay a large video/document from the user session to the user without a temp file
+    
+    The upload runs while the source is still being streamed; duration, size and
+    thumbnail come from the source message instead of probing a local file.
+    
+    Args:
+        user_client: User client that can read chat_message
+        chat_message: Source message holding the media
+        file_name: Name for the uploaded file
+    
+    Returns:
+        Message: The sent message, None if not sent
+    """
+    from helpers.transfer import RelayStream
+
+    media = chat_message.video if media_type == "video" else chat_message.document
+    if not await fileSizeLimit(media.file_size, message, "upload"):
+        return None
+
+    stream = RelayStream(user_client, chat_message, file_name, media.file_size)
+    progress_args = progressArgs("📤 Relaying Progress", progress_message, start_time)
+    LOGGER(__name__).info(f"Relaying media: {stream.name} ({media_type}, {media.file_size} bytes)")
+
+    if media_type == "document":
+        sent = await message.reply_document(
+            stream,
+            caption=caption or "",
+            progress=safe_progress_callback,
+            progress_args=progress_args,
+        )
+        sent_file_id = get_sent_file_id(sent, media_type)
+        if sent_file_id and user_id:
+            await send_to_dump_channel(bot, sent_file_id, media_type, caption, user_id)
+        return sent
+
+    custom_thumb_path = await get_custom_thumb(bot, user_id) if user_id else None
+    try:
+        duration, width, height, source_thumb = await resolve_video_meta(
+            user_client, chat_message, fetch_thumb=not custom_thumb_path
+        )
+
+        video_kwargs = {
+            "width": width or 480,
+            "height": height or 320,
+            "thumb": custom_thumb_path or source_thumb,
+            "caption": caption or "",
+            "progress": safe_progress_callback,
+            "progress_args": progress_args,
+        }
+        if duration:
+            video_kwargs["duration"] = duration
+
+        sent = await message.reply_video(stream, **video_kwargs)
+    finally:
+        thumb_cache.release(custom_thumb_path)
+
+    sent_file_id = get_sent_file_id(sent, media_type)
+    if sent_file_id and user_id:
+        await send_to_dump_channel(bot, sent_file_id, media_type, caption, user_id)
+    return sent
 
 
-async def processMediaGroup(chat_message, bot, message, user_id=None):
+async def processMediaGroup(chat_message, bot, message, user_id=None, media_group_messages=None):
     """Process and download a media group (multiple files in one post)
     
+    Up to MEDIA_GROUP_CONCURRENCY items download at once and each one is probed
+    as soon as it lands, so an album takes about as long as its largest item.
+    
     Args:
         chat_message: The Telegram message containing the media group
         bot: Bot client
         message: User's message
         user_id: User ID for dump channel tracking
+        media_group_messages: The album, if the caller already fetched it
         
     Returns:
         int: Number of files successfully downloaded and sent (0 if failed)
     """
-    media_group_messages = await chat_message.get_media_group()
-    valid_media = []
+    if media_group_messages is None:
+        media_group_messages = await chat_message.get_media_group()
     temp_paths = []
     invalid_paths = []
 
@@ -486,95 +546,105 @@ async def processMediaGroup(chat_message, bot, message, user_id=None):
         f"Downloading media group with {len(media_group_messages)} items..."
     )
 
-    for msg in media_group_messages:
-        if msg.photo or msg.video or msg.document or msg.audio:
+    group_items = [msg for msg in media_group_messages if msg.photo or msg.video or msg.document or msg.audio]
+    # Own folder per item: concurrent items may share a file name
+    item_folders = [os.path.join("downloads", f"{message.id}_{msg.id}") for msg in group_items]
+    received = [0] * len(group_items)
+    # One progress bar for the whole album: the items' sizes are known before downloading;
+    # an item without one counts from its first progress report
+    sizes = [getattr(getattr(msg, msg.media.value, None), "file_size", 0) or 0 for msg in group_items]
+    progress_args = progressArgs("📥 Downloading Progress", progress_message, start_time)
+    download_slots = asyncio.Semaphore(MEDIA_GROUP_CONCURRENCY)
+
+    async def fetch_item(idx, msg):
+        async def item_progress(current, total, *args):
+            received[idx] = current
+            if not sizes[idx]:
+                sizes[idx] = total
+            await safe_progress_callback(sum(received), max(sum(sizes), 1), *args)
+
+        async with download_slots:
+            # Downloads can outlast the periodic cleanup's age limit
+            register_active_folder(item_folders[idx])
             try:
                 media_path = await msg.download(
-                    progress=safe_progress_callback,
-                    progress_args=progressArgs(
-                        "📥 Downloading Progress", progress_message, start_time
-                    ),
+                    file_name=os.path.join(item_folders[idx], ""),
+                    progress=item_progress,
+                    progress_args=progress_args,
                 )
-                temp_paths.append(media_path)
-
-                if msg.photo:
-                    valid_media.append(
-                        InputMediaPhoto(
-                            media=media_path,
-                            caption=await get_parsed_msg(
-                                msg.caption or "", msg.caption_entities
-                            ),
-                        )
-                    )
-                elif msg.video:
-                    duration = (await get_media_info(media_path))[0]
-                    valid_media.append(
-                        InputMediaVideo(
-                            media=media_path,
-                            duration=duration,
-                            caption=await get_parsed_msg(
-                                msg.caption or "", msg.caption_entities
-                            ),
-                        )
-                    )
-                elif msg.document:
-                    valid_media.append(
-                        InputMediaDocument(
-                            media=media_path,
-                            caption=await get_parsed_msg(
-                                msg.caption or "", msg.caption_entities
-                            ),
-                        )
-                    )
-                elif msg.audio:
-                    valid_media.append(
-                        InputMediaAudio(
-                            media=media_path,
-                            caption=await get_parsed_msg(
-                                msg.caption or "", msg.caption_entities
-                            ),
-                        )
-                    )
-
             except Exception as e:
                 LOGGER(__name__).info(f"Error downloading media: {e}")
-                media_path = None
-                continue
+                return None
+        if not media_path:
+            return None
+        temp_paths.append(media_path)
 
-    LOGGER(__name__).info(f"Valid media count: {len(valid_media)}")
+        # Probe as soon as this item lands, while the rest of the album keeps downloading
+        try:
+            caption = await get_parsed_msg(msg.caption or "", msg.caption_entities)
+            if msg.photo:
+                return InputMediaPhoto(media=media_path, caption=caption)
+            elif msg.video:
+                # The source message usually knows the duration; probe only when it doesn't
+                duration = msg.video.duration or (await get_media_info(media_path))[0]
+                return InputMediaVideo(
+                    media=media_path,
+                    width=msg.video.width or 0,
+                    height=msg.video.height or 0,
+                    duration=duration,
+                    caption=caption,
+                )
+            elif msg.document:
+                return InputMediaDocument(media=media_path, caption=caption)
+            elif msg.audio:
+                return InputMediaAudio(media=media_path, caption=caption)
+        except Exception as e:
+            LOGGER(__name__).info(f"Error preparing media: {e}")
+        return None
 
     try:
+        # Results come back in album order whatever order the downloads finish in
+        results = await asyncio.gather(*(fetch_item(idx, msg) for idx, msg in enumerate(group_items)))
+        valid_media = [media for media in results if media is not None]
+
+        LOGGER(__name__).info(f"Valid media count: {len(valid_media)}")
+
         if valid_media:
             try:
-                await bot.send_media_group(chat_id=message.chat.id, media=valid_media)
+                with measure_uploads() as upload_meter:
+                    sent_messages = await bot.send_media_group(chat_id=message.chat.id, media=valid_media)
                 
                 # Send to dump channel if configured
                 if user_id:
                     from config import PyroConf
                     if PyroConf.DUMP_CHANNEL_ID:
                         try:
-                            # Prepare media group for dump channel with user info
+                            # Rebuild the album from the file_ids we just got back - no second upload
                             dump_media = []
-                            for idx, media in enumerate(valid_media):
-                                dump_caption = f"👤 User ID: `{user_id}`"
-                                if media.caption:
-                                    dump_caption += f"\n\n📝 Original Caption:\n{media.caption[:700]}"
+                            for idx, sent in enumerate(sent_messages):
+                                dump_caption = ""
+                                if idx == 0:
+                                    dump_caption = f"👤 User ID: `{user_id}`"
+                                    if valid_media[0].caption:
+                                        dump_caption += f"\n\n📝 Original Caption:\n{valid_media[0].caption[:700]}"
                                 
-                                if isinstance(media, InputMediaPhoto):
-                                    dump_media.append(InputMediaPhoto(media=media.media, caption=dump_caption if idx == 0 else ""))
-                                elif isinstance(media, InputMediaVideo):
-                                    dump_media.append(InputMediaVideo(media=media.media, caption=dump_caption if idx == 0 else ""))
-                                elif isinstance(media, InputMediaDocument):
-                                    dump_media.append(InputMediaDocument(media=media.media, caption=dump_caption if idx == 0 else ""))
-                                elif isinstance(media, InputMediaAudio):
-                                    dump_media.append(InputMediaAudio(media=media.media, caption=dump_caption if idx == 0 else ""))
+                                if sent.photo:
+                                    dump_media.append(InputMediaPhoto(media=sent.photo.file_id, caption=dump_caption))
+                                elif sent.video:
+                                    dump_media.append(InputMediaVideo(media=sent.video.file_id, caption=dump_caption))
+                                elif sent.document:
+                                    dump_media.append(InputMediaDocument(media=sent.document.file_id, caption=dump_caption))
+                                elif sent.audio:
+                                    dump_media.append(InputMediaAudio(media=sent.audio.file_id, caption=dump_caption))
                             
-                            await bot.send_media_group(chat_id=PyroConf.DUMP_CHANNEL_ID, media=dump_media)
-                            LOGGER(__name__).info(f"Sent media group to dump channel for user {user_id}")
+                            dump_dispatcher.submit(
+                                lambda: bot.send_media_group(chat_id=PyroConf.DUMP_CHANNEL_ID, media=dump_media),
+                                f"media group for user {user_id}"
+                            )
                         except Exception as e:
-                            LOGGER(__name__).warning(f"Failed to send media group to dump channel: {e}")
+                            LOGGER(__name__).warning(f"Failed to queue media group for dump channel: {e}")
                 
-                await progress_message.delete()
+                await close_progress(progress_message, upload_meter)
             except Exception:
                 await message.reply(
                     "**❌ Failed to send media group, trying individual uploads**"
@@ -628,3 +698,5 @@ async def processMediaGroup(chat_message, bot, message, user_id=None):
         # CRITICAL: Always cleanup all downloaded files, even if errors occur during upload
         for path in temp_paths + invalid_paths:
             cleanup_download(path)
+        for folder in item_folders:
+            unregister_active_folder(folder)
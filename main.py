@@ -17,7 +17,7 @@ except ImportError:
 
 from pyleaves import Leaves
 from pyrogram.enums import ParseMode
-from pyrogram import Client, filters
+from pyrogram import Client, filters, idle
 from pyrogram.errors import PeerIdInvalid, BadRequest
 from pyrogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery
 
@@ -25,17 +25,27 @@ from helpers.utils import (
     processMediaGroup,
     progressArgs,
     send_media,
-    safe_progress_callback
+    send_media_relay,
+    send_cached_file,
+    get_file_unique_id,
+    get_sent_file_id,
+    safe_progress_callback,
+    close_progress
 )
 
 from helpers.files import (
     get_download_path,
     fileSizeLimit,
     get_readable_file_size,
-    get_readable_time,
-    cleanup_download
+    get_readable_time
 )
 
+from helpers.inflight import inflight_downloads
+from helpers.dump_queue import dump_dispatcher
+from helpers.cleanup import start_periodic_cleanup
+from helpers.thumb_cache import thumb_cache
+from helpers.transfer import BotClient, should_relay, should_download_parallel, parallel_download, measure_uploads
+
 from helpers.msg import (
     getChatMsgID,
     get_file_name,
@@ -45,6 +55,7 @@ from helpers.msg import (
 from config import PyroConf
 from logger import LOGGER
 from database import db
+from cache import get_cache
 from phone_auth import PhoneAuthHandler
 from ad_monetization import ad_monetization, PREMIUM_DOWNLOADS
 from access_control import admin_only, paid_or_admin_only, check_download_limit, register_user, check_user_session, get_user_client, force_subscribe
@@ -59,6 +70,7 @@ from admin_commands import (
     broadcast_command,
     admin_stats_command,
     user_info_command,
+    db_stats_command,
     broadcast_callback_handler
 )
 from queue_manager import download_queue
@@ -73,7 +85,7 @@ IS_CONSTRAINED = IS_RENDER or IS_REPLIT  # Low RAM environments
 workers = 1 if IS_CONSTRAINED else 4
 concurrent = 2 if IS_CONSTRAINED else 4
 
-bot = Client(
+bot = BotClient(
     "media_bot",
     api_id=PyroConf.API_ID,
     api_hash=PyroConf.API_HASH,
@@ -315,12 +327,34 @@ async def help_command(_, message: Message):
     
     await message.reply(help_text, reply_markup=markup, disable_web_page_preview=True)
 
-async def handle_download(bot: Client, message: Message, post_url: str, user_client=None, increment_usage=True):
+async def finish_single_download(message: Message, increment_usage: bool):
+    """Count a delivered single file against the user's quota and show the completion message"""
+    if not increment_usage:
+        return
+    
+    db.increment_usage(message.from_user.id)
+    
+    # Show completion message with buttons for all free users
+    user_type = db.get_user_type(message.from_user.id)
+    if user_type == 'free':
+        from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+        upgrade_markup = InlineKeyboardMarkup([
+            [InlineKeyboardButton(f"🎁 Watch Ad & Get {PREMIUM_DOWNLOADS} Downloads", callback_data="watch_ad_now")],
+            [InlineKeyboardButton("💰 Upgrade to Premium", callback_data="upgrade_premium")]
+        ])
+        await message.reply(
+            "✅ **Download complete**",
+            reply_markup=upgrade_markup
+        )
+
+async def handle_download(bot: Client, message: Message, post_url: str, user_client=None, increment_usage=True, chat_message=None):
     """
     Handle downloading media from Telegram posts
     
     IMPORTANT: user_client is managed by SessionManager - DO NOT call .stop() on it!
     The SessionManager will automatically reuse and cleanup sessions to prevent memory leaks.
+    
+    chat_message: The post, if the caller already fetched it (saves a get_messages round trip)
     """
     # Cut off URL at '?' if present
     if "?" in post_url:
@@ -340,7 +374,8 @@ async def handle_download(bot: Client, message: Message, post_url: str, user_cli
                 )
                 return
 
-        chat_message = await client_to_use.get_messages(chat_id=chat_id, message_ids=message_id)
+        if chat_message is None:
+            chat_message = await client_to_use.get_messages(chat_id=chat_id, message_ids=message_id)
 
         LOGGER(__name__).info(f"Downloading media from URL: {post_url}")
 
@@ -355,8 +390,8 @@ async def handle_download(bot: Client, message: Message, post_url: str, user_cli
 
             # Check file size limit based on actual client being used
             try:
-                # Check if user's Telegram account has premium
-                me = await client_to_use.get_me()
+                # Check if user's Telegram account has premium (client.me is fetched once at session start)
+                me = client_to_use.me or await client_to_use.get_me()
                 is_premium = getattr(me, 'is_premium', False)
             except:
                 is_premium = False
@@ -391,7 +426,8 @@ async def handle_download(bot: Client, message: Message, post_url: str, user_cli
                     return
             
             # Download media group
-            files_sent = await processMediaGroup(chat_message, bot, message, message.from_user.id)
+            # Hand over the album we just fetched instead of fetching it again
+            files_sent = await processMediaGroup(chat_message, bot, message, message.from_user.id, media_group_messages)
             
             if files_sent == 0:
                 await message.reply("**Could not extract any valid media from the media group.**")
@@ -420,64 +456,114 @@ async def handle_download(bot: Client, message: Message, post_url: str, user_cli
             return
 
         elif chat_message.media:
+            media_type = (
+                "photo"
+                if chat_message.photo
+                else "video"
+                if chat_message.video
+                else "audio"
+                if chat_message.audio
+                else "document"
+            )
+            
+            # Popular posts: resend our earlier upload by file_id instead of downloading again.
+            # Videos carry the first uploader's thumbnail, so users with a custom one always re-upload
+            file_unique_id = get_file_unique_id(chat_message)
+            source_chat_id = chat_message.chat.id
+            use_file_cache = bool(file_unique_id) and not (
+                media_type == "video" and db.get_custom_thumbnail(message.from_user.id)
+            )
+            
+            if use_file_cache:
+                cached = db.get_cached_file(source_chat_id, message_id, file_unique_id)
+                if cached:
+                    sent = await send_cached_file(
+                        bot, message, cached['file_id'], cached['media_type'], parsed_caption, message.from_user.id
+                    )
+                    if sent:
+                        db.record_cached_file_hit(source_chat_id, message_id, file_unique_id)
+                        LOGGER(__name__).info(f"Served {post_url} from file cache")
+                        await finish_single_download(message, increment_usage)
+                        return
+                    db.delete_cached_file(source_chat_id, message_id, file_unique_id)
+            
             start_time = time()
             progress_message = await message.reply("**📥 Downloading Progress...**")
 
             filename = get_file_name(message_id, chat_message)
-            download_path = get_download_path(message.id, filename)
-
-            media_path = await chat_message.download(
-                file_name=download_path,
-                progress=safe_progress_callback,
-                progress_args=progressArgs(
-                    "📥 Downloading Progress", progress_message, start_time
-                ),
-            )
+            source_size = getattr(getattr(chat_message, media_type, None), "file_size", None)
+
+            # Big-file uploads report their MB/s in place of the progress message
+            with measure_uploads() as upload_meter:
+                if should_relay(media_type, source_size):
+                    # Large files stream from the user session straight into the upload,
+                    # nothing is written to disk
+                    sent = await send_media_relay(
+                        bot,
+                        client_to_use,
+                        chat_message,
+                        message,
+                        filename,
+                        media_type,
+                        parsed_caption,
+                        progress_message,
+                        start_time,
+                        message.from_user.id,
+                    )
+                else:
+                    download_path = get_download_path(message.id, filename)
+
+                    async def download(progress, progress_args):
+                        if should_download_parallel(client_to_use, media_type, source_size):
+                            # Big files: several ranges in flight instead of one chunk at a time
+                            return await parallel_download(
+                                client_to_use,
+                                chat_message,
+                                download_path,
+                                source_size,
+                                progress=progress,
+                                progress_args=progress_args,
+                            )
+                        return await chat_message.download(
+                            file_name=download_path,
+                            progress=progress,
+                            progress_args=progress_args,
+                        )
 
-            LOGGER(__name__).info(f"Downloaded media: {media_path}")
+                    # Concurrent requests for the same file share one download; the registry
+                    # cleans the file up after the last of them has uploaded it, and every
+                    # requester's progress message follows the shared download
+                    inflight_key = (source_chat_id, message_id, file_unique_id) if file_unique_id else None
+                    async with inflight_downloads.acquire(
+                        inflight_key,
+                        download,
+                        download_path,
+                        progress=safe_progress_callback,
+                        progress_args=progressArgs("📥 Downloading Progress", progress_message, start_time),
+                    ) as media_path:
+                        LOGGER(__name__).info(f"Downloaded media: {media_path}")
+
+                        sent = await send_media(
+                            bot,
+                            message,
+                            media_path,
+                            media_type,
+                            parsed_caption,
+                            progress_message,
+                            start_time,
+                            message.from_user.id,
+                            source_message=chat_message,
+                            source_client=client_to_use,
+                        )
 
-            try:
-                media_type = (
-                    "photo"
-                    if chat_message.photo
-                    else "video"
-                    if chat_message.video
-                    else "audio"
-                    if chat_message.audio
-                    else "document"
-                )
-                await send_media(
-                    bot,
-                    message,
-                    media_path,
-                    media_type,
-                    parsed_caption,
-                    progress_message,
-                    start_time,
-                    message.from_user.id,
-                )
+            sent_file_id = get_sent_file_id(sent, media_type)
+            if use_file_cache and sent_file_id:
+                db.save_cached_file(source_chat_id, message_id, file_unique_id, sent_file_id, media_type)
 
-                await progress_message.delete()
+            await close_progress(progress_message, upload_meter)
 
-                # Only increment usage after successful download
-                if increment_usage:
-                    db.increment_usage(message.from_user.id)
-                    
-                    # Show completion message with buttons for all free users
-                    user_type = db.get_user_type(message.from_user.id)
-                    if user_type == 'free':
-                        from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-                        upgrade_markup = InlineKeyboardMarkup([
-                            [InlineKeyboardButton(f"🎁 Watch Ad & Get {PREMIUM_DOWNLOADS} Downloads", callback_data="watch_ad_now")],
-                            [InlineKeyboardButton("💰 Upgrade to Premium", callback_data="upgrade_premium")]
-                        ])
-                        await message.reply(
-                            "✅ **Download complete**",
-                            reply_markup=upgrade_markup
-                        )
-            finally:
-                # CRITICAL: Always cleanup downloaded file, even if errors occur during upload
-                cleanup_download(media_path)
+            # Only increment usage after successful download
+            await finish_single_download(message, increment_usage)
 
         elif chat_message.text or chat_message.caption:
             await message.reply(parsed_text or parsed_caption)
@@ -601,7 +687,7 @@ async def download_range(bot: Client, message: Message):
                 skipped += 1
                 continue
 
-            task = track_task(handle_download(bot, message, url, client_to_use, False), message.from_user.id)
+            task = track_task(handle_download(bot, message, url, client_to_use, False, chat_msg), message.from_user.id)
             try:
                 await task
                 downloaded += 1
@@ -788,7 +874,7 @@ async def global_queue_status_command(client: Client, message: Message):
     status = await download_queue.get_global_status()
     await message.reply(status)
 
-@bot.on_message(filters.private & new_updates_only & ~filters.command(["start", "help", "dl", "stats", "logs", "killall", "bdl", "myinfo", "upgrade", "premiumlist", "getpremium", "verifypremium", "login", "verify", "password", "logout", "cancel", "canceldownload", "queue", "qstatus", "setthumb", "delthumb", "viewthumb", "addadmin", "removeadmin", "setpremium", "removepremium", "ban", "unban", "broadcast", "adminstats", "userinfo", "testdump"]))
+@bot.on_message(filters.private & new_updates_only & ~filters.command(["start", "help", "dl", "stats", "logs", "killall", "bdl", "myinfo", "upgrade", "premiumlist", "getpremium", "verifypremium", "login", "verify", "password", "logout", "cancel", "canceldownload", "queue", "qstatus", "setthumb", "delthumb", "viewthumb", "addadmin", "removeadmin", "setpremium", "removepremium", "ban", "unban", "broadcast", "adminstats", "dbstats", "userinfo", "testdump"]))
 @force_subscribe
 @check_download_limit
 async def handle_any_message(bot: Client, message: Message):
@@ -895,8 +981,11 @@ async def set_thumbnail(_, message: Message):
         # User replied to a photo
         photo = message.reply_to_message.photo
         file_id = photo.file_id
+        old_file_id = db.get_custom_thumbnail(message.from_user.id)
         
         if db.set_custom_thumbnail(message.from_user.id, file_id):
+            if old_file_id != file_id:
+                thumb_cache.invalidate(old_file_id)
             await message.reply(
                 "✅ **Custom thumbnail saved successfully!**\n\n"
                 "This thumbnail will be used for all your video downloads.\n\n"
@@ -917,7 +1006,9 @@ async def set_thumbnail(_, message: Message):
 @register_user
 async def delete_thumbnail(_, message: Message):
     """Delete custom thumbnail"""
+    old_file_id = db.get_custom_thumbnail(message.from_user.id)
     if db.delete_custom_thumbnail(message.from_user.id):
+        thumb_cache.invalidate(old_file_id)
         await message.reply(
             "✅ **Custom thumbnail removed!**\n\n"
             "Videos will now use auto-generated thumbnails from the video itself."
@@ -1020,6 +1111,10 @@ async def test_dump_channel(bot: Client, message: Message):
 async def admin_stats_handler(client: Client, message: Message):
     await admin_stats_command(client, message, queue_manager=download_queue)
 
+@bot.on_message(filters.command("dbstats") & filters.private)
+async def db_stats_handler(client: Client, message: Message):
+    await db_stats_command(client, message)
+
 @bot.on_message(filters.command("getpremium") & filters.private)
 @register_user
 async def get_premium_command(client: Client, message: Message):
@@ -1446,13 +1541,53 @@ async def verify_dump_channel():
         LOGGER(__name__).error(f"  3. Bot has permission to post messages")
         LOGGER(__name__).error(f"Dump channel feature will be disabled until fixed")
 
-# Note: Periodic cleanup task is started from server.py when bot initializes
-# This ensures downloaded files are cleaned up every 30 minutes to prevent memory/disk leaks
+def start_background_tasks():
+    """Start the periodic jobs the bot needs however it is launched (main.py or server.py)
+    
+    Call once the event loop is running and the bot has started.
+    """
+    # DatabaseManager connects lazily - open the connection (and build indexes)
+    # in the background so the first user request doesn't pay for it
+    def log_connect_result(task):
+        if not task.cancelled() and task.exception() is not None:
+            LOGGER(__name__).error(f"Background database connect failed: {task.exception()}")
+    
+    connect_task = asyncio.create_task(asyncio.to_thread(db.connect))
+    connect_task.add_done_callback(log_connect_result)
+    
+    # Start auth session cleanup task (prevents memory leaks)
+    phone_auth_handler.start_cleanup_task()
+    
+    # Start periodic download cleanup task (frees disk space)
+    asyncio.create_task(start_periodic_cleanup(interval_minutes=30))
+    LOGGER(__name__).info("Started periodic download cleanup task")
+    
+    # Downgrade expired premium subscriptions in bulk (keeps get_user_type read-only)
+    asyncio.create_task(db.periodic_expiry_sweep(interval=300))
+    LOGGER(__name__).info("Started periodic premium expiry sweeper")
+    
+    # Reclaim expired cache entries in small slices instead of waiting for LRU eviction
+    asyncio.create_task(get_cache().periodic_sweep(interval=30))
+    LOGGER(__name__).info("Started cache expiry sweeper")
+    
+    # Keep the warm-restart snapshot fresh in case the process is killed
+    asyncio.create_task(db.periodic_cache_snapshot())
+
+async def run_until_stopped():
+    """bot.run() equivalent that flushes the dump-channel queue before disconnecting"""
+    await bot.start()
+    start_background_tasks()
+    try:
+        await idle()
+    finally:
+        # Mirrors still queued can only go out while the bot is connected
+        await dump_dispatcher.drain(timeout=15)
+        await bot.stop()
 
 if __name__ == "__main__":
     try:
         LOGGER(__name__).info("Bot Started!")
-        bot.run()
+        bot.run(run_until_stopped())
     except KeyboardInterrupt:
         pass
     except Exception as err:
@@ -1469,4 +1604,7 @@ if __name__ == "__main__":
         except Exception as e:
             LOGGER(__name__).error(f"Error disconnecting sessions: {e}")
         
+        # Keep the cache warm for the next start
+        db.save_cache_snapshot()
+        
         LOGGER(__name__).info("Bot Stopped")
@@ -94,15 +94,19 @@ class MemoryMonitor:
         
         try:
             from database import db
-            cached_items = len(db.cache.cache) if hasattr(db, 'cache') and hasattr(db.cache, 'cache') else 0
+            cache_stats = db.cache.get_stats()
+            cached_items = cache_stats['size']
+            cache_kb = cache_stats['bytes'] / 1024
         except:
             cached_items = 0
+            cache_kb = 0
         
         return {
             'active_sessions': active_sessions,
             'queue_size': queue_size,
             'active_downloads': active_downloads,
             'cached_items': cached_items,
+            'cache_kb': cache_kb,
             'thread_count': self.process.num_threads(),
             'open_files': len(self.process.open_files()) if hasattr(self.process, 'open_files') else 0
         }
@@ -127,7 +131,7 @@ class MemoryMonitor:
             f"├─ RAM Usage: {mem['rss_mb']:.1f} MB (Virtual: {mem['vms_mb']:.1f} MB)\n"
             f"├─ System: {mem['system_percent']:.1f}% used ({mem['system_available_mb']:.1f} MB available)\n"
             f"├─ Sessions: {state['active_sessions']} | Queue: {state['queue_size']} | Active DLs: {state['active_downloads']}\n"
-            f"├─ Cache: {state['cached_items']} items | Threads: {state['thread_count']} | Open files: {state['open_files']}\n"
+            f"├─ Cache: {state['cached_items']} items ({state['cache_kb']:.0f} KB) | Threads: {state['thread_count']} | Open files: {state['open_files']}\n"
             f"└─ Context: {context or 'N/A'}"
         )
         
@@ -333,13 +333,8 @@ def run_bot():
             
             main.LOGGER(__name__).info("Bot started successfully, waiting for updates...")
             
-            # Start auth session cleanup task (prevents memory leaks)
-            main.phone_auth_handler.start_cleanup_task()
-            
-            # Start periodic download cleanup task (frees disk space)
-            from helpers.cleanup import start_periodic_cleanup
-            asyncio.create_task(start_periodic_cleanup(interval_minutes=30))
-            main.LOGGER(__name__).info("Started periodic download cleanup task")
+            # DB connect, expiry sweeps and cleanups - shared with a plain `python main.py` run
+            main.start_background_tasks()
             
             # Start periodic garbage collection for Render's 512MB RAM limit
             # This helps prevent memory buildup from completed downloads
@@ -361,6 +356,10 @@ def run_bot():
             # Keep the bot running without signal handlers (thread-safe alternative to idle())
             await asyncio.Event().wait()
         finally:
+            # Let queued dump-channel mirrors go out while the bot is still connected
+            from helpers.dump_queue import dump_dispatcher
+            await dump_dispatcher.drain(timeout=15)
+            
             # Gracefully disconnect all user sessions before shutdown
             try:
                 from helpers.session_manager import session_manager
@@ -371,6 +370,9 @@ def run_bot():
             
             await main.bot.stop()
             main.LOGGER(__name__).info("Bot stopped")
+            
+            # Keep the cache warm for the next start
+            main.db.save_cache_snapshot()
     
     # Run the async coroutine on this thread's event loop
     loop.run_until_complete(start_bot())
@@ -0,0 +1,505 @@
+# Copyright (C) @Wolfy004
+# Channel: https://t.me/Wolfy004
+
+"""
+Embedded SQLite storage backend for DatabaseManager
+Implements the subset of the pymongo Client/Database/Collection API that
+DatabaseManager uses, so single-node deployments (and offline benchmarks)
+can run without a remote MongoDB.
+
+Documents are stored as JSON, one table per collection, with WAL journaling.
+create_index() builds real SQLite expression indexes on json_extract(), so
+equality and range filters on indexed fields are index lookups, not scans.
+
+Supported:
+- Filters: equality, $gt/$gte/$lt/$lte/$ne/$in/$nin/$exists, $and/$or
+- Updates: $set, $unset, $inc, $setOnInsert, upsert
+- find() with projection/sort/limit, count_documents(), find_one_and_update()
+- aggregate() with $match, $group ($sum) and $sort
+- TTL indexes (expireAfterSeconds) purged on access
+"""
+
+import re
+import copy
+import json
+import time
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Optional, List, Dict, Any, Iterator
+from pymongo.errors import DuplicateKeyError, OperationFailure
+from pymongo.results import UpdateResult, InsertOneResult, DeleteResult
+from logger import LOGGER
+
+# datetimes are stored as tagged ISO strings so they sort correctly and round-trip
+DATE_PREFIX = "$date:"
+_FIELD_RE = re.compile(r'^[A-Za-z0-9_]+(\.[A-Za-z0-9_]+)*$')
+_COMPARISON_OPS = {"$gt": ">", "$gte": ">=", "$lt": "<", "$lte": "<="}
+TTL_PURGE_INTERVAL = 30  # seconds between TTL purges per collection
+
+
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return DATE_PREFIX + value.isoformat(timespec='microseconds')
+    if isinstance(value, dict):
+        return {k: _encode_value(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_encode_value(v) for v in value]
+    return value
+
+
+def _decode_value(value: Any) -> Any:
+    if isinstance(value, str) and value.startswith(DATE_PREFIX):
+        return datetime.fromisoformat(value[len(DATE_PREFIX):])
+    if isinstance(value, dict):
+        return {k: _decode_value(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_decode_value(v) for v in value]
+    return value
+
+
+def _json_path(field: str) -> str:
+    """SQL expression for a (dotted) document field - inlined so expression indexes match"""
+    if not _FIELD_RE.match(field):
+        raise OperationFailure(f"Unsupported field name for SQLite backend: {field!r}")
+    path = '.'.join(f'"{part}"' for part in field.split('.'))
+    return f"json_extract(doc, '$.{path}')"
+
+
+def _json_type(field: str) -> str:
+    """SQL expression that is NULL only when the field is missing (an explicit null gives 'null')"""
+    return _json_path(field).replace("json_extract(", "json_type(", 1)
+
+
+def _sql_param(value: Any) -> Any:
+    value = _encode_value(value)
+    if isinstance(value, bool):
+        return int(value)
+    return value
+
+
+def _type_guard(expr: str, value: Any) -> str:
+    """Restrict range comparisons to the same type bracket, like MongoDB does"""
+    if isinstance(value, datetime):
+        return f"substr({expr}, 1, {len(DATE_PREFIX)}) = '{DATE_PREFIX}'"
+    if isinstance(value, str):
+        return f"(typeof({expr}) = 'text' AND substr({expr}, 1, {len(DATE_PREFIX)}) != '{DATE_PREFIX}')"
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return f"typeof({expr}) IN ('integer', 'real')"
+    return "1"
+
+
+def _compile_filter(query: Dict[str, Any], params: List[Any]) -> str:
+    """Translate a MongoDB filter into a SQL WHERE clause"""
+    clauses = []
+    for field, condition in (query or {}).items():
+        if field in ("$and", "$or"):
+            parts = [f"({_compile_filter(sub, params)})" for sub in condition]
+            joiner = " AND " if field == "$and" else " OR "
+            clauses.append(f"({joiner.join(parts) or '1'})")
+            continue
+
+        expr = _json_path(field)
+        if isinstance(condition, dict) and condition and all(k.startswith("$") for k in condition):
+            for op, value in condition.items():
+                if op in _COMPARISON_OPS:
+                    clauses.append(f"({expr} {_COMPARISON_OPS[op]} ? AND {_type_guard(expr, value)})")
+                    params.append(_sql_param(value))
+                elif op == "$ne":
+                    if value is None:
+                        clauses.append(f"{expr} IS NOT NULL")
+                    else:
+                        clauses.append(f"({expr} IS NULL OR {expr} != ?)")
+                        params.append(_sql_param(value))
+                elif op in ("$in", "$nin"):
+                    values = [v for v in value if v is not None]
+                    in_sql = f"{expr} IN ({', '.join('?' * len(values))})" if values else "0"
+                    if None in value:
+                        in_sql = f"({in_sql} OR {expr} IS NULL)"
+                    clauses.append(in_sql if op == "$in" else f"NOT {in_sql}")
+                    params.extend(_sql_param(v) for v in values)
+                elif op == "$exists":
+                    # json_extract() is NULL for both a missing field and an explicit null
+                    clauses.append(f"{_json_type(field)} IS {'NOT ' if value else ''}NULL")
+                else:
+                    raise OperationFailure(f"Unsupported query operator for SQLite backend: {op}")
+        elif condition is None:
+            clauses.append(f"{expr} IS NULL")
+        else:
+            clauses.append(f"{expr} = ?")
+            params.append(_sql_param(condition))
+
+    return " AND ".join(clauses) or "1"
+
+
+def _get_field(doc: Dict[str, Any], field: str) -> Any:
+    for part in field.split('.'):
+        if not isinstance(doc, dict):
+            return None
+        doc = doc.get(part)
+    return doc
+
+
+def _set_field(doc: Dict[str, Any], field: str, value: Any):
+    parts = field.split('.')
+    for part in parts[:-1]:
+        doc = doc.setdefault(part, {})
+    doc[parts[-1]] = value
+
+
+def _unset_field(doc: Dict[str, Any], field: str):
+    parts = field.split('.')
+    for part in parts[:-1]:
+        doc = doc.get(part)
+        if not isinstance(doc, dict):
+            return
+    doc.pop(parts[-1], None)
+
+
+def _apply_update(doc: Dict[str, Any], update: Dict[str, Any], inserting: bool = False) -> Dict[str, Any]:
+    for op, fields in update.items():
+        if op == "$set" or (op == "$setOnInsert" and inserting):
+            for field, value in fields.items():
+                _set_field(doc, field, value)
+        elif op == "$unset":
+            for field in fields:
+                _unset_field(doc, field)
+        elif op == "$inc":
+            for field, amount in fields.items():
+                _set_field(doc, field, (_get_field(doc, field) or 0) + amount)
+        elif op != "$setOnInsert":
+            raise OperationFailure(f"Unsupported update operator for SQLite backend: {op}")
+    return doc
+
+
+def _apply_projection(doc: Dict[str, Any], projection: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    if not projection:
+        return doc
+    include = [f for f, v in projection.items() if v and f != "_id"]
+    if include:
+        result = {}
+        for field in include:
+            value = _get_field(doc, field)
+            if value is not None or field in doc:
+                _set_field(result, field, value)
+        if projection.get("_id", 1) and "_id" in doc:
+            result["_id"] = doc["_id"]
+        return result
+    result = dict(doc)
+    for field, value in projection.items():
+        if not value:
+            _unset_field(result, field)
+    return result
+
+
+def _index_keys(keys) -> List[tuple]:
+    if isinstance(keys, str):
+        return [(keys, 1)]
+    return list(keys)
+
+
+class SQLiteCursor:
+    """Minimal pymongo Cursor: iterable with chainable sort() and limit()"""
+
+    def __init__(self, collection: "SQLiteCollection", query: Dict[str, Any], projection: Optional[Dict[str, Any]] = None):
+        self._collection = collection
+        self._query = query
+        self._projection = projection
+        self._sort: List[tuple] = []
+        self._limit = 0
+
+    def sort(self, key, direction: int = 1) -> "SQLiteCursor":
+        self._sort = _index_keys(key) if not isinstance(key, str) else [(key, direction)]
+        return self
+
+    def limit(self, count: int) -> "SQLiteCursor":
+        self._limit = count
+        return self
+
+    def _sql(self, params: List[Any]) -> str:
+        sql = f'SELECT id, doc FROM "{self._collection.name}" WHERE {_compile_filter(self._query, params)}'
+        if self._sort:
+            sql += " ORDER BY " + ", ".join(
+                f"{_json_path(field)} {'DESC' if direction < 0 else 'ASC'}" for field, direction in self._sort
+            )
+        if self._limit:
+            sql += f" LIMIT {int(self._limit)}"
+        return sql
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        params: List[Any] = []
+        sql = self._sql(params)
+        # The connection is shared between threads: run the query under the database lock
+        with self._collection.database._lock:
+            rows = self._collection._execute(sql, params).fetchall()
+        for row_id, raw in rows:
+            yield _apply_projection(self._collection._load(row_id, raw), self._projection)
+
+    def explain(self) -> Dict[str, Any]:
+        """Report the SQLite plan in the shape IndexAdvisor expects from MongoDB"""
+        params: List[Any] = []
+        with self._collection.database._lock:
+            rows = self._collection._execute("EXPLAIN QUERY PLAN " + self._sql(params), params).fetchall()
+        details = [row[-1] for row in rows]
+        uses_index = any("USING INDEX" in d or "USING COVERING INDEX" in d for d in details)
+        return {
+            'queryPlanner': {
+                'winningPlan': {'stage': 'FETCH' if uses_index else 'COLLSCAN',
+                                'inputStage': {'stage': 'IXSCAN'} if uses_index else {}},
+                'sqlitePlan': details
+            }
+        }
+
+
+class SQLiteCollection:
+    """One collection stored as a table of JSON documents"""
+
+    def __init__(self, database: "SQLiteDatabase", name: str):
+        if not _FIELD_RE.match(name):
+            raise OperationFailure(f"Unsupported collection name for SQLite backend: {name!r}")
+        self.database = database
+        self.name = name
+        self._ttl_fields: Dict[str, int] = {}
+        self._last_purge = 0.0
+        self._execute(f'CREATE TABLE IF NOT EXISTS "{name}" (id INTEGER PRIMARY KEY AUTOINCREMENT, doc TEXT NOT NULL)')
+
+    def _execute(self, sql: str, params=()) -> sqlite3.Cursor:
+        return self.database._conn.execute(sql, params)
+
+    def _load(self, row_id: int, raw: str) -> Dict[str, Any]:
+        doc = _decode_value(json.loads(raw))
+        doc.setdefault("_id", row_id)
+        return doc
+
+    def _dump(self, doc: Dict[str, Any]) -> str:
+        return json.dumps(_encode_value(doc), separators=(',', ':'))
+
+    def _purge_expired(self):
+        if not self._ttl_fields or time.time() - self._last_purge < TTL_PURGE_INTERVAL:
+            return
+        self._last_purge = time.time()
+        for field, seconds in self._ttl_fields.items():
+            cutoff = datetime.now() - timedelta(seconds=seconds)
+            params: List[Any] = []
+            where = _compile_filter({field: {"$lt": cutoff}}, params)
+            self._execute(f'DELETE FROM "{self.name}" WHERE {where}', params)
+
+    def _select(self, query: Dict[str, Any], limit: int = 0) -> List[tuple]:
+        params: List[Any] = []
+        sql = f'SELECT id, doc FROM "{self.name}" WHERE {_compile_filter(query, params)}'
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        return self._execute(sql, params).fetchall()
+
+    def _write(self, row_id: int, doc: Dict[str, Any]):
+        stored = dict(doc)
+        if stored.get("_id") == row_id:
+            stored.pop("_id")
+        try:
+            self._execute(f'UPDATE "{self.name}" SET doc = ? WHERE id = ?', (self._dump(stored), row_id))
+        except sqlite3.IntegrityError as e:
+            raise DuplicateKeyError(str(e), code=11000)
+
+    def create_index(self, keys, unique: bool = False, expireAfterSeconds: Optional[int] = None, **kwargs) -> str:
+        keys = _index_keys(keys)
+        name = kwargs.get("name") or "_".join(f"{field}_{direction}" for field, direction in keys)
+        index_name = f"idx_{self.name}_{name}".replace(".", "_")
+        columns = ", ".join(f"{_json_path(field)}{' DESC' if direction == -1 else ''}" for field, direction in keys)
+        with self.database._lock:
+            self._execute(
+                f'CREATE {"UNIQUE " if unique else ""}INDEX IF NOT EXISTS "{index_name}" ON "{self.name}" ({columns})'
+            )
+        if expireAfterSeconds is not None:
+            self._ttl_fields[keys[0][0]] = expireAfterSeconds
+        return name
+
+    def find_one(self, query: Optional[Dict[str, Any]] = None, projection: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        with self.database._lock:
+            self._purge_expired()
+            rows = self._select(query or {}, limit=1)
+        if not rows:
+            return None
+        return _apply_projection(self._load(*rows[0]), projection)
+
+    def find(self, query: Optional[Dict[str, Any]] = None, projection: Optional[Dict[str, Any]] = None) -> SQLiteCursor:
+        with self.database._lock:
+            self._purge_expired()
+        return SQLiteCursor(self, query or {}, projection)
+
+    def count_documents(self, query: Dict[str, Any]) -> int:
+        params: List[Any] = []
+        with self.database._lock:
+            self._purge_expired()
+            row = self._execute(
+                f'SELECT COUNT(*) FROM "{self.name}" WHERE {_compile_filter(query, params)}', params
+            ).fetchone()
+        return row[0]
+
+    def insert_one(self, document: Dict[str, Any]) -> InsertOneResult:
+        doc = dict(document)
+        with self.database._lock:
+            try:
+                cursor = self._execute(f'INSERT INTO "{self.name}" (doc) VALUES (?)', (self._dump(doc),))
+            except sqlite3.IntegrityError as e:
+                raise DuplicateKeyError(str(e), code=11000)
+        inserted_id = doc.get("_id", cursor.lastrowid)
+        document.setdefault("_id", inserted_id)
+        return InsertOneResult(inserted_id, True)
+
+    def _update(self, query: Dict[str, Any], update: Dict[str, Any], upsert: bool, many: bool) -> UpdateResult:
+        with self.database._transaction():
+            rows = self._select(query, limit=0 if many else 1)
+            modified = 0
+            for row_id, raw in rows:
+                before = self._load(row_id, raw)
+                after = _apply_update(copy.deepcopy(before), update)
+                if after != before:
+                    self._write(row_id, after)
+                    modified += 1
+
+            if rows or not upsert:
+                return UpdateResult({"n": len(rows), "nModified": modified}, True)
+
+            doc = {f: v for f, v in query.items() if not f.startswith("$") and not isinstance(v, dict)}
+            doc = _apply_update(doc, update, inserting=True)
+            try:
+                cursor = self._execute(f'INSERT INTO "{self.name}" (doc) VALUES (?)', (self._dump(doc),))
+            except sqlite3.IntegrityError as e:
+                raise DuplicateKeyError(str(e), code=11000)
+            upserted_id = doc.get("_id", cursor.lastrowid)
+            return UpdateResult({"n": 1, "nModified": 0, "upserted": upserted_id}, True)
+
+    def update_one(self, query: Dict[str, Any], update: Dict[str, Any], upsert: bool = False) -> UpdateResult:
+        return self._update(query, update, upsert, many=False)
+
+    def update_many(self, query: Dict[str, Any], update: Dict[str, Any], upsert: bool = False) -> UpdateResult:
+        return self._update(query, update, upsert, many=True)
+
+    def find_one_and_update(self, query: Dict[str, Any], update: Dict[str, Any],
+                            return_document: bool = False, upsert: bool = False) -> Optional[Dict[str, Any]]:
+        """return_document=False returns the document before the update (pymongo ReturnDocument.BEFORE)"""
+        with self.database._transaction():
+            rows = self._select(query, limit=1)
+            if not rows:
+                if upsert:
+                    self._update(query, update, upsert=True, many=False)
+                    return self.find_one(query) if return_document else None
+                return None
+            before = self._load(*rows[0])
+            after = _apply_update(copy.deepcopy(before), update)
+            self._write(rows[0][0], after)
+            return after if return_document else before
+
+    def delete_one(self, query: Dict[str, Any]) -> DeleteResult:
+        with self.database._transaction():
+            rows = self._select(query, limit=1)
+            if rows:
+                self._execute(f'DELETE FROM "{self.name}" WHERE id = ?', (rows[0][0],))
+        return DeleteResult({"n": len(rows)}, True)
+
+    def delete_many(self, query: Dict[str, Any]) -> DeleteResult:
+        params: List[Any] = []
+        with self.database._lock:
+            cursor = self._execute(f'DELETE FROM "{self.name}" WHERE {_compile_filter(query, params)}', params)
+        return DeleteResult({"n": cursor.rowcount}, True)
+
+    def aggregate(self, pipeline: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        with self.database._lock:
+            return self._aggregate(pipeline)
+
+    def _aggregate(self, pipeline: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        docs: Optional[List[Dict[str, Any]]] = None
+        for stage in pipeline:
+            if "$match" in stage and docs is None:
+                docs = list(self.find(stage["$match"]))
+            elif "$match" in stage:
+                raise OperationFailure("SQLite backend only supports $match as the first pipeline stage")
+            elif "$group" in stage:
+                docs = self._group(docs if docs is not None else list(self.find({})), stage["$group"])
+            elif "$sort" in stage:
+                for field, direction in reversed(list(stage["$sort"].items())):
+                    docs.sort(key=lambda d: (_get_field(d, field) is None, _get_field(d, field)), reverse=direction < 0)
+            else:
+                raise OperationFailure(f"Unsupported aggregation stage for SQLite backend: {list(stage)}")
+        return docs if docs is not None else list(self.find({}))
+
+    @staticmethod
+    def _group(docs: List[Dict[str, Any]], spec: Dict[str, Any]) -> List[Dict[str, Any]]:
+        key_expr = spec["_id"]
+        groups: Dict[Any, Dict[str, Any]] = {}
+        for doc in docs:
+            key = _get_field(doc, key_expr[1:]) if isinstance(key_expr, str) and key_expr.startswith("$") else key_expr
+            group = groups.setdefault(key, {"_id": key})
+            for out_field, accumulator in spec.items():
+                if out_field == "_id":
+                    continue
+                if set(accumulator) != {"$sum"}:
+                    raise OperationFailure(f"Unsupported accumulator for SQLite backend: {accumulator}")
+                value = accumulator["$sum"]
+                if isinstance(value, str) and value.startswith("$"):
+                    value = _get_field(doc, value[1:])
+                group[out_field] = group.get(out_field, 0) + (value if isinstance(value, (int, float)) else 0)
+        return list(groups.values())
+
+
+class SQLiteDatabase:
+    """A SQLite file standing in for a MongoDB database"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._collections: Dict[str, SQLiteCollection] = {}
+
+    @contextmanager
+    def _transaction(self):
+        """Serialize read-modify-write operations (in-process lock + BEGIN IMMEDIATE across processes)"""
+        with self._lock:
+            if self._conn.in_transaction:
+                yield
+                return
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def __getitem__(self, name: str) -> SQLiteCollection:
+        with self._lock:
+            if name not in self._collections:
+                self._collections[name] = SQLiteCollection(self, name)
+            return self._collections[name]
+
+    def get_collection(self, name: str) -> SQLiteCollection:
+        return self[name]
+
+    def command(self, command: str, *args, **kwargs) -> Dict[str, Any]:
+        if command == "ping":
+            self._conn.execute("SELECT 1").fetchone()
+            return {"ok": 1.0}
+        raise OperationFailure(f"Unsupported command for SQLite backend: {command}")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class SQLiteClient:
+    """Drop-in for MongoClient: every database name maps to the same SQLite file"""
+
+    def __init__(self, path: str):
+        self.database = SQLiteDatabase(path)
+        self.admin = self.database
+        LOGGER(__name__).info(f"SQLite storage backend opened: {path} (WAL mode)")
+
+    def get_database(self, name: Optional[str] = None) -> SQLiteDatabase:
+        return self.database
+
+    def close(self):
+        self.database.close()
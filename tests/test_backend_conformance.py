@@ -0,0 +1,245 @@
+# Copyright (C) @Wolfy004
+# Channel: https://t.me/Wolfy004
+
+"""
+Backend conformance suite
+The same DatabaseManager cases run against every storage backend, so the
+SQLite backend can't drift from MongoDB semantics unnoticed.
+
+MongoDB runs against TEST_MONGODB_URI when set (a throwaway database - it is
+dropped), otherwise against mongomock. Run with: python -m pytest tests
+"""
+
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Importing database creates the global manager; keep it off MongoDB and off the real snapshot
+os.environ.setdefault("DATABASE_BACKEND", "sqlite")
+os.environ.setdefault("SQLITE_PATH", ":memory:")
+os.environ["CACHE_SNAPSHOT_PATH"] = ""
+os.environ.pop("CACHE_INVALIDATION_BUS", None)
+
+from database import DatabaseManager  # noqa: E402
+
+BACKENDS = ["sqlite", "mongodb"]
+
+
+@pytest.fixture(params=BACKENDS)
+def db(request, tmp_path, monkeypatch):
+    """A connected DatabaseManager with empty collections and an empty cache"""
+    if request.param == "sqlite":
+        manager = DatabaseManager(str(tmp_path / "bot.db"), backend="sqlite")
+    else:
+        uri = os.getenv("TEST_MONGODB_URI")
+        if not uri:
+            mongomock = pytest.importorskip("mongomock")
+            client = mongomock.MongoClient()
+            monkeypatch.setattr(DatabaseManager, "_create_mongo_client", lambda self, uri: client)
+            uri = "mongodb://mongomock"
+        manager = DatabaseManager(uri, backend="mongodb")
+
+    manager.connect()
+    # connect() builds indexes in the background; build them now so unique keys hold
+    manager.init_database()
+    manager.cache.clear()
+    yield manager
+
+    if request.param == "mongodb":
+        manager.client.drop_database("telegram_bot")
+    manager.client.close()
+    manager.cache.clear()
+
+
+def test_add_and_get_user(db):
+    assert db.get_user(1) is None
+    assert db.add_user(1, username="alice", first_name="Alice")
+    user = db.get_user(1)
+    assert user['username'] == "alice"
+    assert user['user_type'] == "free"
+    assert user['is_banned'] is False
+    assert isinstance(user['joined_date'], datetime)
+
+
+def test_add_user_keeps_existing_fields(db):
+    db.add_user(1, username="alice")
+    db.set_user_type(1, 'paid', days=30)
+    assert db.add_user(1, username="alice2")
+    user = db.get_user(1)
+    assert user['username'] == "alice2"
+    assert user['user_type'] == "paid"
+    assert db.users.count_documents({"user_id": 1}) == 1
+
+
+def test_user_types(db):
+    db.add_user(1)
+    assert db.get_user_type(1) == 'free'
+    db.set_user_type(1, 'paid', days=10)
+    assert db.get_user_type(1) == 'paid'
+    db.add_admin(1, added_by=0)
+    assert db.is_admin(1)
+    assert db.get_user_type(1) == 'admin'
+    assert db.remove_admin(1)
+    assert not db.is_admin(1)
+    assert db.get_user_type(1) == 'paid'
+
+
+def test_set_premium_does_not_overwrite_paid(db):
+    db.add_user(1)
+    db.set_user_type(1, 'paid', days=10)
+    expiry = (datetime.now() + timedelta(hours=1)).strftime('%Y-%m-%d %H:%M:%S')
+    assert not db.set_premium(1, expiry, source='ads')
+
+    db.add_user(2)
+    assert db.set_premium(2, expiry, source='ads')
+    assert db.get_user_type(2) == 'paid'
+
+
+def test_expire_subscriptions(db):
+    db.add_user(1)
+    db.add_user(2)
+    past = (datetime.now() - timedelta(hours=1)).strftime('%Y-%m-%d %H:%M:%S')
+    future = (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d %H:%M:%S')
+    db.set_premium(1, past)
+    db.set_premium(2, future)
+    assert db.expire_subscriptions() == 1
+    assert db.get_user_type(1) == 'free'
+    assert db.get_user_type(2) == 'paid'
+    assert [u['user_id'] for u in db.get_premium_users()] == [2]
+
+
+def test_ban_and_unban(db):
+    db.add_user(1)
+    db.add_user(2)
+    assert not db.is_banned(1)
+    assert db.ban_user(1)
+    assert db.is_banned(1)
+    assert db.get_all_users() == [2]
+    assert db.unban_user(1)
+    assert not db.is_banned(1)
+    assert sorted(db.get_all_users()) == [1, 2]
+
+
+def test_daily_quota(db):
+    db.add_user(1)
+    assert db.can_download(1) == (True, "")
+    assert db.increment_usage(1)
+    assert db.get_daily_usage(1) == 1
+    assert not db.can_download(1)[0]
+    assert not db.increment_usage(1)
+
+
+def test_ad_downloads(db):
+    db.add_user(1)
+    assert db.add_ad_downloads(1, 3)
+    assert db.get_ad_downloads(1) == 3
+    assert not db.can_download(1, count=4)[0]
+    assert db.increment_usage(1, count=2)
+    assert db.get_ad_downloads(1) == 1
+    assert db.get_daily_usage(1) == 0
+
+
+def test_session_and_thumbnail(db):
+    db.add_user(1)
+    assert db.get_user_session(1) is None
+    db.set_user_session(1, "session")
+    assert db.get_user_session(1) == "session"
+    db.set_user_session(1, None)
+    assert db.get_user_session(1) is None
+
+    assert db.set_custom_thumbnail(1, "thumb_id")
+    assert db.get_custom_thumbnail(1) == "thumb_id"
+    assert db.delete_custom_thumbnail(1)
+    assert db.get_custom_thumbnail(1) is None
+
+
+def test_ad_session_used_once(db):
+    assert db.create_ad_session("s1", 1)
+    assert db.get_ad_session("s1")['user_id'] == 1
+    assert db.mark_ad_session_used("s1")
+    assert not db.mark_ad_session_used("s1")
+    assert db.get_ad_session("s1")['code_generated'] is True
+    assert db.delete_ad_session("s1")
+    assert db.get_ad_session("s1") is None
+
+
+def test_verification_codes(db):
+    assert db.create_verification_code("ABC", 1)
+    assert db.get_verification_code("ABC")['user_id'] == 1
+    assert db.delete_verification_code("ABC")
+    assert not db.delete_verification_code("ABC")
+
+
+def test_file_cache(db):
+    assert db.get_cached_file(10, 20, "u1") is None
+    assert db.save_cached_file(10, 20, "u1", "file_a", "video")
+    assert db.get_cached_file(10, 20, "u1") == {'file_id': "file_a", 'media_type': "video"}
+    assert db.get_cached_file(10, 20, "u2") is None
+    db.save_cached_file(10, 20, "u1", "file_b", "video")
+    assert db.get_cached_file(10, 20, "u1")['file_id'] == "file_b"
+    # Lookups alone aren't hits - only sends that went through
+    assert db.file_cache.find_one({"message_id": 20})['hits'] == 0
+    assert db.record_cached_file_hit(10, 20, "u1")
+    assert db.record_cached_file_hit(10, 20, "u1")
+    db.save_cached_file(10, 21, "u3", "file_c", "audio")
+    db.record_cached_file_hit(10, 21, "u3")
+    stats = db.get_file_cache_stats()
+    assert [(entry['message_id'], entry['hits']) for entry in stats['top_files']] == [(20, 2), (21, 1)]
+    assert (stats['hits'], stats['misses']) == (3, 2)
+    assert db.delete_cached_file(10, 20, "u1")
+    assert db.get_cached_file(10, 20, "u1") is None
+    stats = db.get_file_cache_stats()
+    assert (stats['misses'], stats['invalidations']) == (4, 1)
+
+
+def test_stats(db):
+    db.add_user(1)
+    db.add_user(2)
+    db.set_user_type(2, 'paid')
+    db.add_admin(3, added_by=0)
+    db.increment_usage(1)
+    stats = db.get_stats()
+    assert stats == {
+        'total_users': 2,
+        'active_users': 2,
+        'paid_users': 1,
+        'admin_count': 1,
+        'today_downloads': 1,
+        'today_new_users': 2
+    }
+
+
+def test_filter_semantics(db):
+    collection = db.db["conformance"]
+    collection.insert_one({"k": 1, "a": None})
+    collection.insert_one({"k": 2, "a": 5})
+    collection.insert_one({"k": 3})
+
+    def keys(query):
+        return sorted(doc['k'] for doc in collection.find(query))
+
+    assert keys({"a": {"$exists": True}}) == [1, 2]
+    assert keys({"a": {"$exists": False}}) == [3]
+    assert keys({"a": None}) == [1, 3]
+    assert keys({"a": {"$ne": None}}) == [2]
+    assert keys({"a": {"$gt": 1}}) == [2]
+    assert keys({"$or": [{"k": 1}, {"a": 5}]}) == [1, 2]
+    assert keys({"k": {"$in": [1, 3]}}) == [1, 3]
+    assert [doc['k'] for doc in collection.find({}).sort("k", -1).limit(2)] == [3, 2]
+
+
+def test_aggregate_group(db):
+    collection = db.db["conformance"]
+    collection.insert_one({"g": "x", "n": 1})
+    collection.insert_one({"g": "x", "n": 2})
+    collection.insert_one({"g": "y", "n": 5})
+    result = list(collection.aggregate([
+        {"$match": {"n": {"$gte": 1}}},
+        {"$group": {"_id": "$g", "total": {"$sum": "$n"}}},
+        {"$sort": {"total": -1}}
+    ]))
+    assert result == [{"_id": "y", "total": 5}, {"_id": "x", "total": 3}]
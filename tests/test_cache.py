@@ -0,0 +1,159 @@
+# Copyright (C) @Wolfy004
+# Channel: https://t.me/Wolfy004
+
+"""
+Cache stack tests
+SingleFlight coalescing, stale-while-revalidate refreshes and cross-process
+invalidation over the bus. Run with: python -m pytest tests
+"""
+
+import os
+import sys
+import time
+import uuid
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cache import NamespacedCache, SingleFlight, WeightedLRUCache  # noqa: E402
+from cache_bus import InvalidationBus, LocalBus  # noqa: E402
+
+
+def wait_until(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not met in time"
+        time.sleep(0.005)
+
+
+def test_single_flight_coalesces_concurrent_calls():
+    flights = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        release.wait(2)
+        return "value"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flights.do("k", fetch))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    wait_until(lambda: flights.get_stats()['coalesced'] == 4)
+    release.set()
+    for thread in threads:
+        thread.join(2)
+
+    assert results == ["value"] * 5
+    assert len(calls) == 1
+    assert flights.get_stats() == {'calls': 1, 'coalesced': 4, 'in_flight': 0}
+
+
+def test_single_flight_shares_errors_and_forgets_finished_calls():
+    flights = SingleFlight()
+    release = threading.Event()
+
+    def failing():
+        release.wait(2)
+        raise ValueError("boom")
+
+    errors = []
+
+    def call():
+        try:
+            flights.do("k", failing)
+        except ValueError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    wait_until(lambda: flights.get_stats()['coalesced'] == 2)
+    release.set()
+    for thread in threads:
+        thread.join(2)
+
+    assert len(errors) == 3 and len({id(e) for e in errors}) == 1
+    # The next call runs again instead of replaying the failure
+    assert flights.do("k", lambda: "fresh") == "fresh"
+
+
+def test_stale_entry_served_while_refreshing():
+    region = WeightedLRUCache(default_ttl=0.05, stale_ttl=10, log=False)
+    region.set('k', "old")
+    time.sleep(0.1)
+    assert region.get('k', refresh=lambda: region.set('k', "new", ttl=10)) == "old"
+    wait_until(lambda: region.get('k') == "new")
+
+
+def test_refresh_does_not_undo_invalidation():
+    region = WeightedLRUCache(default_ttl=0.05, stale_ttl=10, log=False)
+    region.set('k', "old")
+    time.sleep(0.1)
+    started, proceed = threading.Event(), threading.Event()
+
+    def refresh():
+        # Read the old value, then lose the race against an invalidation
+        started.set()
+        proceed.wait(2)
+        region.set('k', "old", ttl=10)
+
+    assert region.get('k', refresh=refresh) == "old"
+    assert started.wait(2)
+    region.delete('k')
+    proceed.set()
+    wait_until(lambda: not region._refreshing)
+    assert region.get('k') is None
+
+
+@pytest.fixture
+def bus_pair():
+    """Two caches, each standing in for a separate process, joined by a LocalBus channel"""
+    channel = uuid.uuid4().hex
+    first, second = NamespacedCache(), NamespacedCache()
+    first.attach_bus(LocalBus(channel))
+    second.attach_bus(LocalBus(channel))
+    for cache in (first, second):
+        cache.register('user', ttl=60)
+        cache.register('admin', ttl=60)
+    yield first, second
+    first.bus.stop()
+    second.bus.stop()
+
+
+def test_bus_is_abstract():
+    with pytest.raises(TypeError):
+        InvalidationBus()
+
+
+def test_delete_reaches_other_process(bus_pair):
+    first, second = bus_pair
+    second.set('user', 1, {'name': "alice"})
+    second.set('user', 2, {'name': "bob"})
+    first.delete('user', 1)
+    assert second.get('user', 1) is None
+    assert second.get('user', 2) == {'name': "bob"}
+    assert first.bus.published == 1
+    assert second.bus.received == 1
+
+
+def test_invalidate_key_and_namespace_reach_other_process(bus_pair):
+    first, second = bus_pair
+    second.set('user', 1, "u")
+    second.set('admin', 1, True)
+    second.set('admin', 2, False)
+    first.invalidate_key(1, ['user', 'admin'])
+    assert second.get('user', 1) is None
+    assert second.get('admin', 1) is None
+    assert second.get('admin', 2) is False
+    first.invalidate_namespace('admin')
+    assert second.get('admin', 2) is None
+
+
+def test_own_messages_are_ignored(bus_pair):
+    first, _ = bus_pair
+    first.delete('user', 1)
+    assert first.bus.received == 0
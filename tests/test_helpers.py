@@ -0,0 +1,256 @@
+# Copyright (C) @Wolfy004
+# Channel: https://t.me/Wolfy004
+
+"""
+Download pipeline helper tests
+Thumbnail cache leases, the in-flight download registry, the dump-channel
+queue and ffmpeg banner parsing - none of them need Telegram or ffmpeg.
+Run with: python -m pytest tests
+"""
+
+import os
+import sys
+import asyncio
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pyrogram.errors import FloodWait  # noqa: E402
+
+import helpers.inflight as inflight  # noqa: E402
+from helpers.dump_queue import DumpDispatcher  # noqa: E402
+from helpers.media_analysis import parse_ffmpeg_banner  # noqa: E402
+from helpers.thumb_cache import ThumbnailCache  # noqa: E402
+
+
+def write_thumb(size):
+    async def build(path):
+        with open(path, "wb") as f:
+            f.write(b"x" * size)
+        return True
+    return build
+
+
+def test_thumb_cache_builds_once(tmp_path):
+    async def scenario():
+        cache = ThumbnailCache(str(tmp_path), max_bytes=1000)
+        first = await cache.get("file_a", write_thumb(100))
+        second = await cache.get("file_a", write_thumb(100))
+        assert first == second and os.path.exists(first)
+        assert (cache.hits, cache.misses) == (1, 1)
+        cache.release(first)
+        cache.release(second)
+        assert cache.get_stats()['leased'] == 0
+
+    asyncio.run(scenario())
+
+
+def test_thumb_eviction_waits_for_lease(tmp_path):
+    async def scenario():
+        cache = ThumbnailCache(str(tmp_path), max_bytes=150)
+        leased = await cache.get("file_a", write_thumb(100))
+        cache.release(await cache.get("file_b", write_thumb(100)))
+        # file_a was evicted from the index, but an upload is still reading it
+        assert cache.get_stats()['items'] == 1
+        assert os.path.exists(leased)
+        cache.release(leased)
+        assert not os.path.exists(leased)
+
+    asyncio.run(scenario())
+
+
+def test_thumb_invalidate_waits_for_lease(tmp_path):
+    async def scenario():
+        cache = ThumbnailCache(str(tmp_path), max_bytes=1000)
+        leased = await cache.get("file_a", write_thumb(100))
+        cache.invalidate("file_a")
+        assert os.path.exists(leased)
+        cache.release(leased)
+        assert not os.path.exists(leased)
+        # Rebuilt on the next use
+        rebuilt = await cache.get("file_a", write_thumb(100))
+        assert os.path.exists(rebuilt) and cache.misses == 2
+        cache.release(rebuilt)
+        assert os.path.exists(rebuilt)
+
+    asyncio.run(scenario())
+
+
+@pytest.fixture
+def cleaned(monkeypatch):
+    """Paths the in-flight registry cleaned up"""
+    paths = []
+    monkeypatch.setattr(inflight, "cleanup_download", paths.append)
+    return paths
+
+
+def test_inflight_shares_one_download(cleaned):
+    async def scenario():
+        registry = inflight.InFlightDownloads()
+        finish = asyncio.Event()
+        runs = []
+        reports = {'a': [], 'b': []}
+
+        async def download(progress, progress_args):
+            runs.append(1)
+            await progress(1, 2, *progress_args)
+            await finish.wait()
+            await progress(2, 2, *progress_args)
+            return "downloads/1/file.mp4"
+
+        def progress(current, total, who):
+            reports[who].append(current)
+
+        async def consumer(who, leave):
+            async with registry.acquire("key", download, "downloads/1/file.mp4",
+                                        progress=progress, progress_args=(who,)) as path:
+                await leave.wait()
+                return path
+
+        leave_a, leave_b = asyncio.Event(), asyncio.Event()
+        first = asyncio.ensure_future(consumer('a', leave_a))
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(consumer('b', leave_b))
+        await asyncio.sleep(0)
+        finish.set()
+        leave_a.set()
+        assert await first == "downloads/1/file.mp4"
+        # The file stays until the last consumer is done with it
+        assert cleaned == []
+        assert registry.active_folders() == {os.path.abspath("downloads/1")}
+        leave_b.set()
+        assert await second == "downloads/1/file.mp4"
+
+        assert len(runs) == 1
+        assert cleaned == ["downloads/1/file.mp4"]
+        # Progress went to both requesters, not just the one that started the download
+        assert reports == {'a': [1, 2], 'b': [2]}
+        assert registry.get_stats() == {'in_flight': 0, 'started': 1, 'shared': 1}
+
+    asyncio.run(scenario())
+
+
+def test_inflight_failure_is_not_reused(cleaned):
+    async def scenario():
+        registry = inflight.InFlightDownloads()
+        attempts = []
+
+        async def download(progress, progress_args):
+            attempts.append(1)
+            # Pyrogram returns None when it wrote nothing
+            return None if len(attempts) == 1 else "downloads/2/file.mp4"
+
+        with pytest.raises(IOError):
+            async with registry.acquire("key", download):
+                pass
+        async with registry.acquire("key", download) as path:
+            assert path == "downloads/2/file.mp4"
+        assert len(attempts) == 2
+        assert cleaned == ["downloads/2/file.mp4"]
+
+    asyncio.run(scenario())
+
+
+def test_inflight_cancelled_when_every_consumer_leaves(cleaned):
+    async def scenario():
+        registry = inflight.InFlightDownloads()
+        cancelled = asyncio.Event()
+
+        async def download(progress, progress_args):
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        async def consumer():
+            async with registry.acquire("key", download):
+                pass
+
+        task = asyncio.ensure_future(consumer())
+        await asyncio.sleep(0.01)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        await asyncio.wait_for(cancelled.wait(), 1)
+        assert registry.get_stats()['in_flight'] == 0
+
+    asyncio.run(scenario())
+
+
+def test_dump_queue_drain_waits_for_queued_sends():
+    async def scenario():
+        dispatcher = DumpDispatcher(max_queue=10, workers=1)
+        sent = []
+
+        def send(n):
+            async def go():
+                await asyncio.sleep(0.01)
+                sent.append(n)
+            return go
+
+        for n in range(3):
+            assert dispatcher.submit(send(n), f"item {n}")
+        await dispatcher.drain(timeout=2)
+        assert sent == [0, 1, 2]
+        assert dispatcher.get_stats()['queued'] == 0 and dispatcher.sent == 3
+
+    asyncio.run(scenario())
+
+
+def test_dump_queue_drain_gives_up_after_timeout():
+    async def scenario():
+        dispatcher = DumpDispatcher(max_queue=10, workers=1)
+
+        async def stuck():
+            await asyncio.sleep(10)
+
+        dispatcher.submit(stuck, "stuck")
+        dispatcher.submit(stuck, "queued behind it")
+        await dispatcher.drain(timeout=0.05)
+        assert dispatcher.get_stats()['queued'] == 1
+
+    asyncio.run(scenario())
+
+
+def test_dump_queue_drops_when_full_and_retries_flood_waits():
+    async def scenario():
+        dispatcher = DumpDispatcher(max_queue=1, workers=1)
+        calls = []
+
+        async def flaky():
+            calls.append(1)
+            if len(calls) == 1:
+                raise FloodWait(value=0)
+
+        assert dispatcher.submit(flaky, "first")
+        assert not dispatcher.submit(flaky, "second")
+        await dispatcher.drain(timeout=2)
+        assert len(calls) == 2
+        stats = dispatcher.get_stats()
+        assert (stats['sent'], stats['dropped'], stats['flood_waits']) == (1, 1, 1)
+
+    asyncio.run(scenario())
+
+
+def test_parse_ffmpeg_banner():
+    banner = (
+        "Input #0, mov,mp4,m4a,3gp,3g2,mj2, from 'clip.mp4':\n"
+        "  Metadata:\n"
+        "    title           : Some Title\n"
+        "    artist          : Someone\n"
+        "  Duration: 00:01:05.50, start: 0.000000, bitrate: 1205 kb/s\n"
+        "  Stream #0:0[0x1](und): Video: h264 (High) (avc1 / 0x31637661), yuv420p(progressive), "
+        "1280x720 [SAR 1:1 DAR 16:9], 1072 kb/s, 30 fps\n"
+        "    Metadata:\n"
+        "      title           : VideoHandler\n"
+    )
+    analysis = parse_ffmpeg_banner(banner)
+    assert (analysis.duration, analysis.width, analysis.height) == (66, 1280, 720)
+    assert (analysis.title, analysis.artist) == ("Some Title", "Someone")
+
+
+def test_parse_ffmpeg_banner_unreadable_input():
+    analysis = parse_ffmpeg_banner("clip.mp4: Invalid data found when processing input\n")
+    assert (analysis.duration, analysis.width, analysis.height) == (0, 0, 0)
+    assert analysis.title is None and not analysis.ok
@@ -0,0 +1,131 @@
+# Copyright (C) @Wolfy004
+# Channel: https://t.me/Wolfy004
+
+"""
+Compact cached user record
+A __slots__ object with subscription_end parsed once per fetch, instead of a
+raw Mongo dict that every caller re-parses
+"""
+
+from datetime import datetime
+from typing import Optional, Dict, Any
+
+
+def parse_subscription_end(value) -> Optional[datetime]:
+    """Parse subscription_end ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d' or datetime) into a datetime"""
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        return value
+    try:
+        return datetime.strptime(value, '%Y-%m-%d %H:%M:%S')
+    except ValueError:
+        return datetime.strptime(value, '%Y-%m-%d')
+
+
+class UserRecord:
+    """Typed, pre-parsed subset of a user document
+
+    Fields missing from the (projected) document keep their defaults, so a
+    record built from one projection only carries that projection's data.
+    """
+
+    __slots__ = (
+        'user_id', 'user_type', 'subscription_end', 'subscription_end_at', 'premium_source',
+        'ad_downloads', 'ad_downloads_reset_date', 'shortener_index', 'custom_thumbnail',
+        'session_string', 'is_banned'
+    )
+
+    def __init__(self, user_id: int, user_type: str = 'free', subscription_end=None,
+                 premium_source: Optional[str] = None, ad_downloads: int = 0,
+                 ad_downloads_reset_date: Optional[str] = None, shortener_index: int = 0,
+                 custom_thumbnail: Optional[str] = None, session_string: Optional[str] = None,
+                 is_banned: bool = False):
+        self.user_id = user_id
+        self.user_type = user_type
+        self.subscription_end = subscription_end
+        self.subscription_end_at = parse_subscription_end(subscription_end)
+        self.premium_source = premium_source
+        self.ad_downloads = ad_downloads
+        self.ad_downloads_reset_date = ad_downloads_reset_date
+        self.shortener_index = shortener_index
+        self.custom_thumbnail = custom_thumbnail
+        self.session_string = session_string
+        self.is_banned = is_banned
+
+    @classmethod
+    def from_doc(cls, user_id: int, doc: Dict[str, Any]) -> 'UserRecord':
+        """Build a record from a (possibly projected) user document"""
+        return cls(
+            user_id,
+            user_type=doc.get('user_type') or 'free',
+            subscription_end=doc.get('subscription_end'),
+            premium_source=doc.get('premium_source'),
+            ad_downloads=doc.get('ad_downloads') or 0,
+            ad_downloads_reset_date=doc.get('ad_downloads_reset_date'),
+            shortener_index=doc.get('shortener_index') or 0,
+            custom_thumbnail=doc.get('custom_thumbnail'),
+            session_string=doc.get('session_string'),
+            is_banned=bool(doc.get('is_banned', False))
+        )
+
+    def is_paid_active(self, now: Optional[datetime] = None) -> bool:
+        """Check for a paid subscription that hasn't expired yet"""
+        return (
+            self.user_type == 'paid'
+            and self.subscription_end_at is not None
+            and self.subscription_end_at > (now or datetime.now())
+        )
+
+    def __getstate__(self):
+        return tuple(getattr(self, slot) for slot in self.__slots__)
+
+    def __setstate__(self, state):
+        for slot, value in zip(self.__slots__, state):
+            setattr(self, slot, value)
+
+    def __repr__(self):
+        return f"UserRecord(user_id={self.user_id}, user_type={self.user_type!r}, subscription_end={self.subscription_end!r})"
+
+
+if __name__ == "__main__":
+    # Microbenchmark: python user_record.py
+    import timeit
+    import tracemalloc
+
+    N = 10000
+    docs = [{
+        'user_id': i, 'user_type': 'paid' if i % 3 else 'free',
+        'subscription_end': '2099-01-01 00:00:00' if i % 2 else '2099-01-01',
+        'premium_source': 'ads', 'ad_downloads': i % 5, 'ad_downloads_reset_date': '2025-01-01',
+        'shortener_index': i % 4, 'custom_thumbnail': None
+    } for i in range(N)]
+
+    def measure(build):
+        tracemalloc.start()
+        objects = build()
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        return objects, size
+
+    dicts, dict_bytes = measure(lambda: [dict(d) for d in docs])
+    records, record_bytes = measure(lambda: [UserRecord.from_doc(d['user_id'], d) for d in docs])
+
+    def check_dict():
+        # What get_user_type did per call on the raw dict
+        now = datetime.now()
+        for user in dicts:
+            if user.get('user_type') == 'paid' and user.get('subscription_end'):
+                parse_subscription_end(user['subscription_end']) > now
+
+    def check_record():
+        now = datetime.now()
+        for record in records:
+            record.is_paid_active(now)
+
+    dict_time = min(timeit.repeat(check_dict, number=1, repeat=5))
+    record_time = min(timeit.repeat(check_record, number=1, repeat=5))
+
+    print(f"{N} users")
+    print(f"memory  dict: {dict_bytes / N:7.0f} B/user   record: {record_bytes / N:7.0f} B/user")
+    print(f"expiry  dict: {dict_time / N * 1e6:7.2f} us/user  record: {record_time / N * 1e6:7.2f} us/user")